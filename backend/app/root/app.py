@@ -1,8 +1,14 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.root.app_routers import api
+from app.root.cpu_pool import cpu_pool
+from app.root.http_client import http_client
+from app.root.local_cache import listen_for_invalidations
+from app.root.redis_manager import close_redis
 from app.routers.mcp_router import mcp_app
+from app.services.cache_service import flush_stats, flush_stats_periodically
 import logging
 
 # Configure logging
@@ -54,7 +60,21 @@ async def root():
 # Startup event to log when the app starts
 @app.on_event("startup")
 async def startup_event():
+    # Keep the local cache coherent with the other workers
+    app.state.invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    app.state.stats_flusher = asyncio.create_task(flush_stats_periodically())
     logger.info("Asset Extractor API started")
     logger.info(
         "Available endpoints: /, /api, /api/extract, /api/extract/sse, /docs, /mcp"
     )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.invalidation_listener.cancel()
+    app.state.stats_flusher.cancel()
+    await flush_stats()
+    await close_redis()
+    await http_client.close()
+    cpu_pool.shutdown()
+    logger.info("Asset Extractor API stopped")
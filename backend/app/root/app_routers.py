@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from app.routers.asset_router import router as asset_router
 from app.routers.extractor_router import router as extractor_router
 
 
@@ -7,3 +8,4 @@ api = APIRouter(prefix="/api")
 
 
 api.include_router(extractor_router)
+api.include_router(asset_router)
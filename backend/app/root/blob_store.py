@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Iterable, Tuple, Union
+
+from app.root.redis_manager import RedisManager
+
+
+BLOB_STORE_BACKEND = os.environ.get("BLOB_STORE_BACKEND", "redis")  # redis | disk
+BLOB_STORE_PATH = os.environ.get(
+    "BLOB_STORE_PATH", os.path.join(tempfile.gettempdir(), "asset-extractor-blobs")
+)
+BLOB_TTL = int(os.environ.get("BLOB_TTL", 86400 * 10))  # 10 days by default
+
+
+def hash_blob(data: bytes) -> str:
+    """Content address of a blob: the hex SHA-256 of its bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class RedisBlobStore:
+    """Content-addressed blobs stored in Redis, shared by every worker"""
+
+    def __init__(self) -> None:
+        self.redis_manager = RedisManager()
+
+    async def put(self, data: bytes, media_type: str) -> str:
+        """
+        Stores a blob and returns its hash.
+
+        Storing the same content again only refreshes its expiry.
+        """
+        blob_hash = hash_blob(data)
+        key = f"blob:{blob_hash}"
+
+        async def operation():
+            pipeline = self.redis_manager.redis_client.pipeline(transaction=False)
+            pipeline.hset(key, mapping={"media_type": media_type, "data": data})
+            pipeline.expire(key, BLOB_TTL)
+            return await pipeline.execute()
+
+        if await self.redis_manager.run(operation) is None:
+            raise IOError("Blob could not be stored in Redis")
+
+        return blob_hash
+
+    async def touch(self, blob_hashes: Iterable[str], ttl: int = BLOB_TTL):
+        """Keeps stored blobs alive for ttl seconds from now"""
+        await self.redis_manager.expire_many(
+            [f"blob:{blob_hash}" for blob_hash in blob_hashes], ttl
+        )
+
+    async def get(self, blob_hash: str) -> Union[Tuple[bytes, str], None]:
+        value = await self.redis_manager.run(
+            lambda: self.redis_manager.redis_client.hgetall(f"blob:{blob_hash}")
+        )
+
+        if not value:
+            return None
+
+        return value[b"data"], value[b"media_type"].decode("utf-8")
+
+
+class DiskBlobStore:
+    """Content-addressed blobs on the local disk, for single-node deployments"""
+
+    def __init__(self, root: str = BLOB_STORE_PATH) -> None:
+        self.root = root
+
+    def _path(self, blob_hash: str) -> str:
+        # Fan out over sub directories so no single directory grows too large
+        return os.path.join(self.root, blob_hash[:2], blob_hash)
+
+    async def put(self, data: bytes, media_type: str) -> str:
+        return await asyncio.to_thread(self._put, data, media_type)
+
+    async def get(self, blob_hash: str) -> Union[Tuple[bytes, str], None]:
+        return await asyncio.to_thread(self._get, blob_hash)
+
+    async def touch(self, blob_hashes: Iterable[str], ttl: int = BLOB_TTL):
+        """Blobs on disk do not expire"""
+
+    def _put(self, data: bytes, media_type: str) -> str:
+        blob_hash = hash_blob(data)
+        path = self._path(blob_hash)
+
+        if os.path.exists(path):
+            return blob_hash
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as blob_file:
+            blob_file.write(media_type.encode("utf-8") + b"\n" + data)
+        os.replace(tmp_path, path)
+
+        return blob_hash
+
+    def _get(self, blob_hash: str) -> Union[Tuple[bytes, str], None]:
+        try:
+            with open(self._path(blob_hash), "rb") as blob_file:
+                content = blob_file.read()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        media_type, _, data = content.partition(b"\n")
+        return data, media_type.decode("utf-8")
+
+
+def create_blob_store() -> Union[RedisBlobStore, DiskBlobStore]:
+    if BLOB_STORE_BACKEND == "disk":
+        return DiskBlobStore()
+    return RedisBlobStore()
+
+
+blob_store = create_blob_store()
@@ -0,0 +1,82 @@
+import logging
+import os
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zlib is always there
+    zstandard = None
+
+
+# zstd | zlib | none. zstd falls back to zlib when zstandard is not installed.
+CACHE_COMPRESSION = os.environ.get("CACHE_COMPRESSION", "zstd").lower()
+CACHE_COMPRESSION_LEVEL = int(os.environ.get("CACHE_COMPRESSION_LEVEL", 3))
+# Smaller values are stored as they are, compressing them gains nothing
+CACHE_COMPRESSION_MIN_BYTES = int(os.environ.get("CACHE_COMPRESSION_MIN_BYTES", 256))
+
+# Encoded values start with a byte no JSON document or HTML page starts with,
+# then the format version and the codec. Values written before the format
+# existed have no header and are read as they are.
+MAGIC = b"\xc1"
+FORMAT_VERSION = 1
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+logger = logging.getLogger("cache-codec")
+
+if CACHE_COMPRESSION == "zstd" and zstandard is None:
+    logger.warning("zstandard is not installed, compressing cache values with zlib")
+    CACHE_COMPRESSION = "zlib"
+
+# zstandard contexts are not thread safe, values are only encoded on the event loop
+_zstd_compressor = (
+    zstandard.ZstdCompressor(level=CACHE_COMPRESSION_LEVEL) if zstandard else None
+)
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+DECODE_ERRORS = (ValueError, zlib.error) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def _header(codec: int) -> bytes:
+    return MAGIC + bytes((FORMAT_VERSION, codec))
+
+
+def encode_value(data: bytes) -> bytes:
+    """
+    Encode a value the way it is stored in Redis: compressed, behind a
+    header naming the format version and the codec.
+    """
+    if len(data) < CACHE_COMPRESSION_MIN_BYTES or CACHE_COMPRESSION == "none":
+        return _header(CODEC_NONE) + data
+    if CACHE_COMPRESSION == "zstd":
+        return _header(CODEC_ZSTD) + _zstd_compressor.compress(data)
+    return _header(CODEC_ZLIB) + zlib.compress(data, CACHE_COMPRESSION_LEVEL)
+
+
+def decode_value(stored: Optional[bytes]) -> Optional[bytes]:
+    """
+    Decode a value read from Redis, of any format version.
+
+    Returns:
+        The value, or None if it is missing or cannot be decoded, which
+        callers treat as a cache miss.
+    """
+    if stored is None or not stored.startswith(MAGIC):
+        return stored  # Missing, or written before values were encoded
+
+    version, codec = stored[1], stored[2]
+    payload = stored[3:]
+    try:
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unknown format version {version}")
+        if codec == CODEC_NONE:
+            return payload
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(payload)
+        if codec == CODEC_ZSTD and _zstd_decompressor is not None:
+            return _zstd_decompressor.decompress(payload)
+        raise ValueError(f"unsupported codec {codec}")
+    except DECODE_ERRORS as e:
+        logger.warning(f"Could not decode a cached value: {str(e)}")
+        return None
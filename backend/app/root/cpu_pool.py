@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+
+# Processes parsing documents, SVGs, stylesheets and images. 0 runs that work
+# inline on the event loop, as it was before the pool existed.
+CPU_POOL_SIZE = int(os.environ.get("CPU_POOL_SIZE", os.cpu_count() or 1))
+# Tasks a process runs before it is replaced, to give back what parsers leak
+CPU_POOL_MAX_TASKS_PER_CHILD = int(os.environ.get("CPU_POOL_MAX_TASKS_PER_CHILD", 500))
+
+logger = logging.getLogger("cpu-pool")
+
+
+def _timed(fn: Callable, args: tuple):
+    """Run a task in a pool process, with when it started and finished"""
+    started = time.time()
+    result = fn(*args)
+    return started, time.time(), result
+
+
+class CpuPool:
+    """
+    Process pool for the CPU-bound parts of an extraction, so that parsing a
+    heavy page does not stall the event loop and every request it serves.
+
+    Tasks are module-level functions taking and returning plain values
+    (strings, bytes, lists and dicts), which is all that crosses the process
+    boundary. The pool measures how long tasks wait for a process and how
+    long they run, per function.
+    """
+
+    def __init__(self, size: int) -> None:
+        """
+        Args:
+            size: Number of processes, 0 to run tasks inline.
+        """
+        self.size = size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.tasks: Counter = Counter()
+        self.failures: Counter = Counter()
+        self.wait_seconds: Counter = Counter()
+        self.run_seconds: Counter = Counter()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: the parent runs an event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=CPU_POOL_MAX_TASKS_PER_CHILD,
+            )
+        return self._executor
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Run a function in the pool.
+
+        Args:
+            fn: A module-level function, so that it can be pickled.
+            *args: Its arguments.
+
+        Returns:
+            What the function returned. What it raised is raised here.
+        """
+        name = fn.__name__
+        if self.size <= 0:
+            started = time.time()
+            try:
+                return fn(*args)
+            finally:
+                self.tasks[name] += 1
+                self.run_seconds[name] += time.time() - started
+
+        submitted = time.time()
+        self.in_flight += 1
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed, fn, args
+            )
+        except BrokenProcessPool:
+            # A process died (killed, out of memory): the next task gets a new pool
+            logger.warning(f"CPU pool broke while running {name}, restarting it")
+            self.failures[name] += 1
+            self._executor = None
+            raise
+        except Exception:
+            self.failures[name] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.tasks[name] += 1
+        self.wait_seconds[name] += started - submitted
+        self.run_seconds[name] += finished - started
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        What the pool did since it started: tasks, failures, and seconds
+        spent waiting for a process and running, by function.
+        """
+        return {
+            "size": self.size,
+            "in_flight": self.in_flight,
+            # Tasks beyond the number of processes wait in the queue
+            "queue_depth": max(0, self.in_flight - self.size),
+            "functions": {
+                name: {
+                    "tasks": self.tasks[name],
+                    "failures": self.failures[name],
+                    "wait_seconds": round(self.wait_seconds[name], 3),
+                    "run_seconds": round(self.run_seconds[name], 3),
+                }
+                for name in sorted(set(self.tasks) | set(self.failures))
+            },
+        }
+
+    def shutdown(self):
+        """Stop the processes, cancelling the tasks that did not start"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+cpu_pool = CpuPool(CPU_POOL_SIZE)
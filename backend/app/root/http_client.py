@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # Falls back to HTTP/1.1
+    h2 = None
+
+
+# Connections kept open by the process, and the idle time after which one closes
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 30.0))  # Seconds
+# Requests in flight to one host, which bounds the connections opened to it.
+# Over HTTP/2 they share a single connection.
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", 6))
+# Timeouts of every request, callers with a deadline pass shorter ones
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 10.0))  # Seconds
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30.0))  # Seconds
+# Largest response body read, once decompressed
+HTTP_MAX_RESPONSE_BYTES = int(os.environ.get("HTTP_MAX_RESPONSE_BYTES", 20 * 1024 * 1024))
+# How long resolved host addresses are reused
+HTTP_DNS_CACHE_TTL = float(os.environ.get("HTTP_DNS_CACHE_TTL", 300))  # Seconds
+
+logger = logging.getLogger("http-client")
+
+
+class ResponseTooLarge(Exception):
+    """A response body went over the byte cap of its request"""
+
+
+class CachingResolverBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend resolving host names once per HTTP_DNS_CACHE_TTL, instead
+    of once per connection. Connections try the addresses of a host in turn.
+    TLS still verifies the host name, not the address.
+    """
+
+    def __init__(self, ttl: float = HTTP_DNS_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._backend = httpcore.AnyIOBackend()
+        self._addresses: Dict[str, Tuple[float, List[str]]] = {}
+
+    async def _resolve(self, host: str) -> List[str]:
+        cached = self._addresses.get(host)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                host, None, type=socket.SOCK_STREAM
+            )
+        except OSError as e:
+            raise httpcore.ConnectError(f"Could not resolve {host}: {str(e)}")
+
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._addresses[host] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(
+        self, host, port, timeout=None, local_address=None, socket_options=None
+    ):
+        error = None
+        for address in await self._resolve(host):
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout, local_address, socket_options
+                )
+            except httpcore.ConnectError as e:
+                error = e
+        # The addresses may have changed since they were cached
+        self._addresses.pop(host, None)
+        raise error or httpcore.ConnectError(f"No address for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+# httpcore errors and the httpx errors they surface as, the most specific
+# class of an error wins
+HTTPCORE_ERRORS = {
+    httpcore.ConnectTimeout: httpx.ConnectTimeout,
+    httpcore.ReadTimeout: httpx.ReadTimeout,
+    httpcore.WriteTimeout: httpx.WriteTimeout,
+    httpcore.PoolTimeout: httpx.PoolTimeout,
+    httpcore.TimeoutException: httpx.TimeoutException,
+    httpcore.ConnectError: httpx.ConnectError,
+    httpcore.ReadError: httpx.ReadError,
+    httpcore.WriteError: httpx.WriteError,
+    httpcore.NetworkError: httpx.NetworkError,
+    httpcore.ProxyError: httpx.ProxyError,
+    httpcore.UnsupportedProtocol: httpx.UnsupportedProtocol,
+    httpcore.RemoteProtocolError: httpx.RemoteProtocolError,
+    httpcore.LocalProtocolError: httpx.LocalProtocolError,
+    httpcore.ProtocolError: httpx.ProtocolError,
+}
+
+
+@contextmanager
+def _map_httpcore_errors(request: httpx.Request):
+    """Raise the errors of httpcore as the httpx errors callers expect"""
+    try:
+        yield
+    except Exception as e:
+        for error_class in type(e).__mro__:
+            if error_class in HTTPCORE_ERRORS:
+                raise HTTPCORE_ERRORS[error_class](str(e), request=request) from e
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    """The body of an httpcore response, read as an httpx stream"""
+
+    def __init__(self, stream, request: httpx.Request) -> None:
+        self._stream = stream
+        self._request = request
+
+    async def __aiter__(self):
+        with _map_httpcore_errors(self._request):
+            async for chunk in self._stream:
+                yield chunk
+
+    async def aclose(self):
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class CachingResolverTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport on an httpcore connection pool that connects through
+    CachingResolverBackend, which httpx's own transport cannot be given.
+    """
+
+    def __init__(self, limits: httpx.Limits, http2: bool = False) -> None:
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=CachingResolverBackend(),
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _map_httpcore_errors(request):
+            core_response = await self._pool.handle_async_request(core_request)
+
+        return httpx.Response(
+            status_code=core_response.status,
+            headers=core_response.headers,
+            stream=_ResponseStream(core_response.stream, request),
+            extensions=core_response.extensions,
+        )
+
+    async def aclose(self):
+        await self._pool.aclose()
+
+
+class HttpClient:
+    """
+    The HTTP client of the process, shared by every extraction so that
+    connections, TLS sessions and resolved addresses are reused across
+    stages and requests.
+
+    Speaks HTTP/2 when the h2 package is installed. Requests to a host are
+    bounded by HTTP_MAX_CONNECTIONS_PER_HOST, and response bodies by a byte
+    cap. The client is created on first use, on the running event loop, and
+    closed by close().
+    """
+
+    def __init__(self) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+        # Semaphores live as long as requests to their host hold them
+        self._host_slots = weakref.WeakValueDictionary()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            )
+            transport = CachingResolverTransport(limits, http2=h2 is not None)
+            self._client = httpx.AsyncClient(
+                transport=transport,
+                follow_redirects=True,
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str):
+        host = (urlsplit(url).hostname or "").lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+            self._host_slots[host] = slot
+        async with slot:
+            yield
+
+    async def get(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        max_bytes: int = HTTP_MAX_RESPONSE_BYTES,
+    ) -> httpx.Response:
+        """
+        GET a URL, following redirects.
+
+        Args:
+            url: The URL to fetch.
+            headers: Request headers.
+            timeout: Seconds the request may take, the client timeouts if None.
+            max_bytes: Largest body to read.
+
+        Returns:
+            The response, its body read.
+
+        Raises:
+            ResponseTooLarge: The body is larger than max_bytes.
+            httpx.HTTPError: The request failed.
+        """
+        request_timeout = httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+        async with self._host_slot(url):
+            async with self._get_client().stream(
+                "GET", url, headers=headers, timeout=request_timeout
+            ) as response:
+                length = response.headers.get("content-length", "")
+                if length.isdigit() and int(length) > max_bytes:
+                    raise ResponseTooLarge(f"{url} is {length} bytes")
+
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > max_bytes:
+                        raise ResponseTooLarge(f"{url} is over {max_bytes} bytes")
+
+        # The body is decompressed already, the response must not decode it again
+        return httpx.Response(
+            response.status_code,
+            headers=[
+                (name, value)
+                for name, value in response.headers.multi_items()
+                if name.lower() not in ("content-encoding", "content-length")
+            ],
+            content=bytes(body),
+            request=response.request,
+            extensions=response.extensions,
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+http_client = HttpClient()
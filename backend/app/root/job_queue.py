@@ -0,0 +1,336 @@
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import redis
+
+from app.root.redis_manager import RedisManager
+from app.schemas.extractor_schema import JobStatus
+
+
+# A claimed job not heard from for this long is handed to another worker.
+# Workers running a job renew their claim well within it.
+JOB_VISIBILITY_TIMEOUT = float(os.environ.get("JOB_VISIBILITY_TIMEOUT", 120))  # Seconds
+# Runs of a job, retries included, before it is dead-lettered
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+# How long the state and events of a job are kept
+JOB_TTL = int(os.environ.get("JOB_TTL", 86400))  # 24 hours by default
+JOB_EVENTS_MAXLEN = 1000
+
+# Events that end the event log of a job
+TERMINAL_EVENTS = ("completed", "failed")
+
+# Count an attempt and mark the job running, unless its hash expired: then
+# return -1 without recreating a hash that has no payload
+START_SCRIPT = """
+if redis.call('hexists', KEYS[1], 'payload') == 0 then
+    return -1
+end
+local attempts = redis.call('hincrby', KEYS[1], 'attempts', 1)
+redis.call('hset', KEYS[1], 'status', ARGV[1], 'updated_at', ARGV[2])
+return attempts
+"""
+
+logger = logging.getLogger("job-queue")
+
+# A claimed job: its stream message ID and job ID
+Claim = Tuple[str, str]
+
+
+class JobQueue:
+    """
+    Durable job queue on Redis Streams.
+
+    Jobs are stream messages read through a consumer group. A worker acks a
+    job once it is done; jobs left pending by a worker that died are claimed
+    again after JOB_VISIBILITY_TIMEOUT. Every run counts as an attempt, and
+    a job that failed JOB_MAX_ATTEMPTS times goes to the dead-letter stream.
+
+    The state of a job lives in a hash next to the stream, and its events in
+    a stream of their own that anyone can read from the start.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        Args:
+            name: Namespace of the stream keys.
+        """
+        self.stream = f"jobs:{name}"
+        self.dead_letter_stream = f"jobs:{name}:dead"
+        self.group = "workers"
+        self.redis_manager = RedisManager()
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    @staticmethod
+    def _events_key(job_id: str) -> str:
+        return f"job:{job_id}:events"
+
+    async def enqueue(self, payload: dict) -> Optional[str]:
+        """
+        Queue a job.
+
+        Args:
+            payload: What the job is about, as JSON.
+
+        Returns:
+            The ID of the job, None while Redis is unavailable.
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+
+        async def operation():
+            pipeline = self.redis_manager.redis_client.pipeline(transaction=True)
+            pipeline.hset(
+                self._job_key(job_id),
+                mapping={
+                    "status": JobStatus.QUEUED,
+                    "payload": json.dumps(payload),
+                    "attempts": 0,
+                    "created_at": now,
+                    "updated_at": now,
+                },
+            )
+            pipeline.expire(self._job_key(job_id), JOB_TTL)
+            pipeline.xadd(self.stream, {"job_id": job_id})
+            return await pipeline.execute()
+
+        if await self.redis_manager.run(operation) is None:
+            return None
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The state of a job, None if it does not exist or expired"""
+        fields = await self.redis_manager.run(
+            lambda: self.redis_manager.redis_client.hgetall(self._job_key(job_id))
+        )
+        if not fields or b"payload" not in fields:
+            return None  # A hash left without its payload is no job either
+
+        job = {key.decode("utf-8"): value.decode("utf-8") for key, value in fields.items()}
+        job["job_id"] = job_id
+        job["attempts"] = int(job["attempts"])
+        job["payload"] = json.loads(job["payload"])
+        if "result" in job:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    async def ensure_group(self):
+        """Create the consumer group of the workers, and the stream, if needed"""
+        try:
+            await self.redis_manager.redis_client.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def claim(self, consumer: str, count: int = 1, block: float = 1.0) -> List[Claim]:
+        """
+        Claim jobs for a worker: first the ones other workers left pending for
+        longer than the visibility timeout, then new ones.
+
+        Args:
+            consumer: Name of the worker.
+            count: Maximum number of jobs to claim.
+            block: How long to wait for new jobs, in seconds. Must stay under
+                the socket timeout of the pool.
+
+        Returns:
+            The claimed jobs.
+        """
+        client = self.redis_manager.redis_client
+
+        _, abandoned, *_ = await client.xautoclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=int(JOB_VISIBILITY_TIMEOUT * 1000),
+            start_id="0-0",
+            count=count,
+        )
+        messages = [message for message in abandoned if message[1]]
+
+        if not messages:
+            streams = await client.xreadgroup(
+                self.group, consumer, {self.stream: ">"}, count=count, block=int(block * 1000)
+            )
+            messages = [message for _, stream_messages in streams or [] for message in stream_messages]
+
+        return [
+            (message_id.decode("utf-8"), fields[b"job_id"].decode("utf-8"))
+            for message_id, fields in messages
+        ]
+
+    async def start(self, claim: Claim) -> Optional[Dict[str, Any]]:
+        """
+        Mark a claimed job as running, counting the attempt.
+
+        Returns:
+            The job, or None if it expired or ran out of attempts, in which
+            case it is acked or dead-lettered here, or while Redis is
+            unavailable, in which case it stays pending to be claimed again.
+        """
+        message_id, job_id = claim
+
+        attempts = await self.redis_manager.run(
+            lambda: self.redis_manager.redis_client.eval(
+                START_SCRIPT, 1, self._job_key(job_id), JobStatus.RUNNING, time.time()
+            )
+        )
+        if attempts is None:
+            return None
+
+        job = await self.get_job(job_id) if attempts >= 0 else None
+        if job is None:
+            # Its hash expired while the message was pending, it cannot run
+            logger.warning(f"Job {job_id} expired before it ran, dropping it")
+            await self.redis_manager.run(
+                lambda: self.redis_manager.redis_client.xadd(
+                    self.dead_letter_stream, {"job_id": job_id, "error": "Job expired"}
+                )
+            )
+            await self.ack(message_id)
+            return None
+
+        if attempts > JOB_MAX_ATTEMPTS:
+            # The workers that ran it before died or timed out
+            await self.dead_letter(claim, "Job was abandoned by its workers")
+            return None
+
+        await self.emit(job_id, {"event": "started", "attempt": attempts})
+        return job
+
+    async def renew(self, claim: Claim, consumer: str):
+        """Reset the idle time of a claimed job, so no other worker takes it"""
+        message_id, _ = claim
+        await self.redis_manager.run(
+            lambda: self.redis_manager.redis_client.xclaim(
+                self.stream, self.group, consumer, 0, [message_id], justid=True
+            )
+        )
+
+    async def ack(self, message_id: str):
+        await self.redis_manager.run(
+            lambda: self.redis_manager.redis_client.xack(self.stream, self.group, message_id)
+        )
+
+    async def complete(self, claim: Claim, result: dict):
+        """Record the result of a job and ack it"""
+        message_id, job_id = claim
+        await self._finish(job_id, JobStatus.COMPLETED, {"result": json.dumps(result)})
+        await self.emit(job_id, {"event": "completed", "result": result})
+        await self.ack(message_id)
+
+    async def fail(self, claim: Claim, error: str, attempts: int):
+        """
+        Record a failed run of a job: queue it again while it has attempts
+        left, dead-letter it otherwise.
+        """
+        message_id, job_id = claim
+        if attempts >= JOB_MAX_ATTEMPTS:
+            await self.dead_letter(claim, error)
+            return
+
+        async def operation():
+            pipeline = self.redis_manager.redis_client.pipeline(transaction=True)
+            pipeline.hset(
+                self._job_key(job_id),
+                mapping={"status": JobStatus.QUEUED, "error": error, "updated_at": time.time()},
+            )
+            pipeline.xadd(self.stream, {"job_id": job_id})
+            pipeline.xack(self.stream, self.group, message_id)
+            return await pipeline.execute()
+
+        await self.emit(job_id, {"event": "retrying", "attempt": attempts, "message": error})
+        await self.redis_manager.run(operation)
+
+    async def dead_letter(self, claim: Claim, error: str):
+        """Move a job that will not be run again to the dead-letter stream"""
+        message_id, job_id = claim
+        logger.warning(f"Job {job_id} dead-lettered: {error}")
+
+        await self._finish(job_id, JobStatus.FAILED, {"error": error})
+        await self.redis_manager.run(
+            lambda: self.redis_manager.redis_client.xadd(
+                self.dead_letter_stream, {"job_id": job_id, "error": error}
+            )
+        )
+        await self.emit(job_id, {"event": "failed", "message": error})
+        await self.ack(message_id)
+
+    async def _finish(self, job_id: str, status: str, fields: dict):
+        await self.redis_manager.run(
+            lambda: self.redis_manager.redis_client.hset(
+                self._job_key(job_id),
+                mapping={"status": status, "updated_at": time.time(), **fields},
+            )
+        )
+
+    async def emit(self, job_id: str, event: dict):
+        """Append an event to the event log of a job"""
+
+        async def operation():
+            pipeline = self.redis_manager.redis_client.pipeline(transaction=False)
+            pipeline.xadd(
+                self._events_key(job_id),
+                {"data": json.dumps(event)},
+                maxlen=JOB_EVENTS_MAXLEN,
+                approximate=True,
+            )
+            pipeline.expire(self._events_key(job_id), JOB_TTL)
+            return await pipeline.execute()
+
+        await self.redis_manager.run(operation)
+
+    async def follow(
+        self, job_id: str, last_id: str = "0-0", poll: float = 1.0
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Read the events of a job, until it completes or fails. Any number of
+        readers, on any worker, can follow the same job.
+
+        Args:
+            job_id: The job to follow.
+            last_id: Read the events after this one, all of them by default.
+            poll: How long to wait for new events at once, in seconds. Must
+                stay under the socket timeout of the pool.
+
+        Yields:
+            The ID and the event of every event of the job, ending with a
+            "completed" or "failed" one.
+        """
+        while True:
+            streams = await self.redis_manager.run(
+                lambda: self.redis_manager.redis_client.xread(
+                    {self._events_key(job_id): last_id}, block=int(poll * 1000)
+                ),
+                default=None,
+            )
+
+            if not streams:
+                # Nothing new, make sure the job did not end without its event
+                job = await self.get_job(job_id)
+                if job is None:
+                    yield last_id, {"event": "failed", "message": "Job not found"}
+                    return
+                if job["status"] == JobStatus.COMPLETED:
+                    yield last_id, {"event": "completed", "result": job["result"]}
+                    return
+                if job["status"] == JobStatus.FAILED:
+                    yield last_id, {"event": "failed", "message": job.get("error")}
+                    return
+                continue
+
+            for _, messages in streams:
+                for message_id, fields in messages:
+                    last_id = message_id.decode("utf-8")
+                    event = json.loads(fields[b"data"])
+                    yield last_id, event
+                    if event["event"] in TERMINAL_EVENTS:
+                        return
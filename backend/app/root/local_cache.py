@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+import redis
+
+from app.root.redis_manager import REDIS_RETRY_AFTER, RedisManager
+
+
+# In-process tier in front of Redis, bounded by the bytes it holds
+LOCAL_CACHE_MAX_BYTES = int(os.environ.get("LOCAL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Upper bound on how stale an entry can get if an invalidation is missed
+LOCAL_CACHE_TTL = float(os.environ.get("LOCAL_CACHE_TTL", 60))  # Seconds
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+logger = logging.getLogger("local-cache")
+
+# Tells this worker's own invalidations apart from the other workers' ones
+WORKER_ID = uuid.uuid4().hex
+
+
+class LocalCache:
+    """
+    Size-bounded LRU with a TTL, holding hot Redis values in the worker.
+
+    Every entry is given a size in bytes when set; the least recently used
+    entries are evicted once the total goes over max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = LOCAL_CACHE_MAX_BYTES, ttl: float = LOCAL_CACHE_TTL) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, _, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self.delete(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, size: int) -> None:
+        self.delete(key)
+
+        if size > self.max_bytes:
+            return  # Would evict everything else, leave it to Redis
+
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.size += size
+
+        while self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+
+local_cache = LocalCache()
+redis_manager = RedisManager()
+
+
+async def publish_invalidation(*keys: str):
+    """Tell the other workers to drop their local copy of some keys"""
+    if not keys:
+        return
+
+    await redis_manager.run(
+        lambda: redis_manager.redis_client.publish(
+            INVALIDATION_CHANNEL, f"{WORKER_ID}:" + "\n".join(keys)
+        )
+    )
+
+
+async def listen_for_invalidations():
+    """
+    Drop the keys other workers overwrite from the local cache. Runs for the
+    lifetime of the application.
+    """
+    while True:
+        pubsub = redis_manager.redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything overwritten while unsubscribed may have been missed
+            local_cache.clear()
+
+            while True:
+                # Bounded waits, listen() would trip the pool's socket timeout
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is None:
+                    continue
+
+                worker_id, _, keys = message["data"].decode("utf-8").partition(":")
+                if worker_id != WORKER_ID:
+                    for key in keys.split("\n"):
+                        local_cache.delete(key)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Invalidation listener disconnected: {str(e)}")
+            await asyncio.sleep(REDIS_RETRY_AFTER)
+        finally:
+            await pubsub.aclose()
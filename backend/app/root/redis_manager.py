@@ -1,40 +1,115 @@
 import json
+import logging
 import os
-from typing import Union
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Union
 import redis
+import redis.asyncio as aioredis
+
+from app.root.cache_codec import decode_value, encode_value
 
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 REDIS_DB = int(os.environ.get("REDIS_DB", 0))
 REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", None)
-# CACHE_EXPIRATION = int(os.environ.get("CACHE_EXPIRATION", 86400))  # 24 hours by default
-CACHE_EXPIRATION = 86400 * 10  # 10 days by default
+# Default expiry of cached results
+CACHE_EXPIRATION = int(os.environ.get("CACHE_EXPIRATION", 86400 * 7))  # 7 days by default
+
+# Connection pool shared by every RedisManager of the process
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 2.0))  # Seconds
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 2.0))  # Seconds
+# How long to skip Redis after it failed, instead of waiting on timeouts
+REDIS_RETRY_AFTER = float(os.environ.get("REDIS_RETRY_AFTER", 5.0))  # Seconds
+
+logger = logging.getLogger("redis-manager")
+
+
+def create_connection_pool() -> aioredis.BlockingConnectionPool:
+    """
+    Create a sized connection pool. When every connection is in use, callers
+    wait up to REDIS_POOL_TIMEOUT for one instead of opening more.
+
+    Responses are not decoded: stored results are served as raw bytes and
+    blobs may be binary. String getters decode what they return.
+    """
+    return aioredis.BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        password=REDIS_PASSWORD,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+    )
+
+
+connection_pool = create_connection_pool()
+
+
+def _is_pool_exhausted(error: redis.exceptions.RedisError) -> bool:
+    """
+    Whether an error is the pool running out of connections rather than
+    Redis being unreachable. BlockingConnectionPool raises a ConnectionError
+    for both, once REDIS_POOL_TIMEOUT passed without a free connection.
+    """
+    return isinstance(error, redis.exceptions.ConnectionError) and (
+        "No connection available" in str(error)
+    )
 
 
 class RedisManager:
-    def __init__(self) -> None:
-        self.redis_client = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            db=REDIS_DB,
-            password=REDIS_PASSWORD,
-            decode_responses=True,  # Automatically decode responses to strings
-        )
-
-    def cache_json_item(self, key: str, value: dict, ttl: int = 3600):
+    """
+    asyncio Redis client on the shared connection pool.
+
+    When Redis is unreachable the manager degrades instead of failing the
+    request: reads behave as cache misses and writes are dropped. After a
+    failure Redis is skipped for REDIS_RETRY_AFTER seconds.
+    """
+
+    # Shared by every manager, Redis is either reachable or not
+    _unavailable_until = 0.0
+
+    def __init__(self, pool: aioredis.ConnectionPool = connection_pool) -> None:
+        self.redis_client = aioredis.Redis(connection_pool=pool)
+
+    async def run(self, operation: Callable[[], Awaitable[Any]], default: Any = None):
+        """Run a Redis operation, returning default while Redis is unavailable"""
+        if time.monotonic() < RedisManager._unavailable_until:
+            return default
+
+        try:
+            return await operation()
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            if _is_pool_exhausted(e):
+                # Redis is up, this process is busy: only this operation is dropped
+                logger.warning(f"No Redis connection free, skipping the operation: {str(e)}")
+                return default
+            RedisManager._unavailable_until = time.monotonic() + REDIS_RETRY_AFTER
+            logger.warning(f"Redis unavailable, running without cache: {str(e)}")
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Redis error: {str(e)}")
+
+        return default
+
+    async def cache_json_item(self, key: str, value: dict, ttl: int = 3600):
         """
         Caches a JSON Item for some time set with the ttl- time to live.
 
         After the TTL, it is cleared from the Redis Db.
         Its Expiration date is 3600s (1 Hr) by default
         """
-        value_as_string = json.dumps(value)
+        value_as_bytes = encode_value(json.dumps(value, separators=(",", ":")).encode("utf-8"))
 
-        resp = self.redis_client.set(name=key, value=value_as_string, ex=ttl)
+        await self.run(
+            lambda: self.redis_client.set(name=key, value=value_as_bytes, ex=ttl)
+        )
 
-    def get_cached_json_item(self, key: str) -> Union[dict, None]:
-        value = self.redis_client.get(name=key)
+    async def get_cached_json_item(self, key: str) -> Union[dict, None]:
+        value = decode_value(await self.run(lambda: self.redis_client.get(name=key)))
 
         if value is None:
             return None
@@ -43,7 +118,7 @@ class RedisManager:
 
         return value_decoded
 
-    def cache_string_item(self, key: str, value: dict, ttl: int | None = None):
+    async def cache_string_item(self, key: str, value: str, ttl: int | None = None):
         """
         Caches a String Item for some time set with the ttl- time to live.
 
@@ -51,10 +126,10 @@ class RedisManager:
         Its Expiration date is 3600s (1 Hr) by default
         """
 
-        self.redis_client.set(name=key, value=value, ex=ttl)
+        await self.run(lambda: self.redis_client.set(name=key, value=value, ex=ttl))
 
-    def get_cached_string_item(self, key: str) -> Union[str, None]:
-        value = self.redis_client.get(name=key)
+    async def get_cached_string_item(self, key: str) -> Union[str, None]:
+        value = await self.run(lambda: self.redis_client.get(name=key))
 
         if value is None:
             return None
@@ -66,19 +141,65 @@ class RedisManager:
         # If it's not bytes, just return the string
         return value
 
-    def delete_key(self, key: str):
-        self.redis_client.delete(key)
+    async def cache_many(self, items: Dict[str, Any], ttl: int | None = None):
+        """
+        Caches several items in a single round trip.
+
+        Dict values are encoded as cache_json_item does, anything else is
+        stored as is.
+        """
+
+        async def operation():
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                if isinstance(value, dict):
+                    value = json.dumps(value, separators=(",", ":")).encode("utf-8")
+                    value = encode_value(value)
+                pipeline.set(name=key, value=value, ex=ttl)
+            return await pipeline.execute()
+
+        await self.run(operation)
 
-    def delete_key(self, key: str):
-        self.redis_client.delete(key)
+    async def get_many(self, keys: List[str]) -> List[Any]:
+        """Gets several items in a single round trip, None for missing ones"""
+        if not keys:
+            return []
+
+        values = await self.run(lambda: self.redis_client.mget(keys))
+        return values if values is not None else [None] * len(keys)
+
+    async def expire_many(self, keys: List[str], ttl: int):
+        """Sets the expiry of several items in a single round trip"""
+        if not keys:
+            return
+
+        async def operation():
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.expire(key, ttl)
+            return await pipeline.execute()
+
+        await self.run(operation)
+
+    async def delete_key(self, key: str):
+        await self.run(lambda: self.redis_client.delete(key))
+
+    async def delete_keys(self, keys: List[str]):
+        if keys:
+            await self.run(lambda: self.redis_client.delete(*keys))
 
 
 redis_manager = RedisManager()
 
 
-def ping_redis() -> bool:
+async def ping_redis() -> bool:
     """Check if Redis is available"""
     try:
-        return redis_manager.redis_client.ping()
-    except redis.exceptions.ConnectionError:
+        return await redis_manager.redis_client.ping()
+    except redis.exceptions.RedisError:
         return False
+
+
+async def close_redis():
+    """Close the shared connection pool, on application shutdown"""
+    await connection_pool.disconnect()
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import redis
+
+from app.root.redis_manager import RedisManager
+
+
+# Leaders hold their lock for this long and renew it while they run, so the
+# lock of a crashed worker frees up quickly
+FLIGHT_LEASE = float(os.environ.get("FLIGHT_LEASE", 15))  # Seconds
+# How long the outcome of a flight stays readable by followers that missed
+# its completion notice
+FLIGHT_OUTCOME_TTL = int(os.environ.get("FLIGHT_OUTCOME_TTL", 60))  # Seconds
+
+# Only delete or extend a lock that still belongs to the caller
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+logger = logging.getLogger("single-flight")
+
+Event = Dict[str, Any]
+Work = Callable[[Callable[[Event], None]], Awaitable[dict]]
+
+
+def get_flight_event_id(flight_id: str, position: int) -> str:
+    """The ID of the event of a flight at a position, 1 for the first"""
+    return f"{flight_id}:{position}"
+
+
+def parse_flight_event_id(event_id: Any) -> Tuple[Optional[str], int]:
+    """The flight and the position of an event ID, (None, 0) for other IDs"""
+    if not isinstance(event_id, str):
+        return None, 0
+    flight_id, _, position = event_id.rpartition(":")
+    if not flight_id or not position.isdigit():
+        return None, 0
+    return flight_id, int(position)
+
+
+class FlightFailed(Exception):
+    """The leader of a flight, on another worker, failed"""
+
+
+class _Flight:
+    """A unit of work in progress in this worker, and the callers waiting on it"""
+
+    def __init__(self) -> None:
+        self.task: Optional[asyncio.Task] = None
+        self.callers = 0
+        self.events: List[Event] = []
+        self.listeners: List[Callable[[Event], None]] = []
+
+    def emit(self, event: Event):
+        self.events.append(event)
+        for listener in list(self.listeners):
+            listener(event)
+
+    def attach(self, listener: Callable[[Event], None]):
+        # Late followers first catch up on the events they missed
+        for event in self.events:
+            listener(event)
+        self.listeners.append(listener)
+
+    def detach(self, listener: Callable[[Event], None]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+
+class SingleFlight:
+    """
+    Runs a given unit of work once at a time across every worker.
+
+    Within a worker, callers of a key in flight await the same task. Across
+    workers, a Redis lock with a short lease elects the leader; the others
+    follow its events over pub/sub until it publishes a completion notice,
+    which they turn back into a result. The notice is also stored for
+    FLIGHT_OUTCOME_TTL, for followers that subscribed too late to get it.
+    Progress events emitted by the work reach every follower, wherever it
+    runs. The leader numbers them in an "id" naming its run, see
+    get_flight_event_id, so followers resuming a stream of the same run can
+    skip what they received.
+
+    A flight is cancelled once every caller in its worker went away. The
+    followers on other workers then see its lock released and take over.
+
+    When Redis is unavailable each worker runs its own flights.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        to_notice: Callable[[dict], dict],
+        from_notice: Callable[[dict], Awaitable[dict]],
+    ) -> None:
+        """
+        Args:
+            name: Namespace of the lock and channel keys.
+            to_notice: Turns the leader's result into the small JSON notice
+                published to remote followers.
+            from_notice: Turns a notice back into a result, on the followers.
+        """
+        self.name = name
+        self.to_notice = to_notice
+        self.from_notice = from_notice
+        self.redis_manager = RedisManager()
+        self._flights: Dict[str, _Flight] = {}
+
+    def _lock_key(self, key: str) -> str:
+        return f"flight:{self.name}:{key}"
+
+    def _channel(self, key: str) -> str:
+        return f"flight:{self.name}:{key}:events"
+
+    def _outcome_key(self, key: str) -> str:
+        return f"flight:{self.name}:{key}:outcome"
+
+    async def run(
+        self, key: str, work: Work, on_event: Optional[Callable[[Event], None]] = None
+    ) -> dict:
+        """
+        Run work for key, or join the run already in flight.
+
+        Args:
+            key: Identifies the unit of work.
+            work: Called with an emit function for progress events.
+            on_event: Receives the progress events of the flight.
+
+        Returns:
+            The result of the flight.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.create_task(self._fly(key, flight, work))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._land(key, task))
+
+        if on_event:
+            flight.attach(on_event)
+        flight.callers += 1
+
+        try:
+            # Callers going away must not cancel the flight for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.callers -= 1
+            if on_event:
+                flight.detach(on_event)
+            if flight.callers == 0 and not flight.task.done():
+                # The last caller went away, nobody here waits for the result
+                flight.task.cancel()
+
+    def _land(self, key: str, task: asyncio.Task):
+        self._flights.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved, even if every caller left
+
+    async def _fly(self, key: str, flight: _Flight, work: Work) -> dict:
+        while True:
+            token = uuid.uuid4().hex
+            acquired = await self.redis_manager.run(
+                lambda: self.redis_manager.redis_client.set(
+                    self._lock_key(key), token, nx=True, px=int(FLIGHT_LEASE * 1000)
+                ),
+                default=True,  # Without Redis every worker leads its own flights
+            )
+
+            if acquired:
+                return await self._lead(key, token, flight, work)
+
+            result = await self._follow(key, flight)
+            if result is not None:
+                return result
+            # The leader went away without a notice, take over
+
+    async def _lead(self, key: str, token: str, flight: _Flight, work: Work) -> dict:
+        outbox: asyncio.Queue = asyncio.Queue()
+        publisher = asyncio.create_task(self._publish_all(key, outbox))
+        renewal = asyncio.create_task(self._renew(key, token))
+
+        # Not the token, which would let clients release the lock
+        flight_id = uuid.uuid4().hex[:16]
+
+        def emit(event: Event):
+            position = len(flight.events) + 1
+            event = {**event, "id": get_flight_event_id(flight_id, position)}
+            flight.emit(event)
+            outbox.put_nowait(event)
+
+        outcome = None
+        try:
+            result = await work(emit)
+            outcome = {"event": "landed", "notice": self.to_notice(result), "token": token}
+            return result
+        except Exception as e:
+            outcome = {"event": "failed", "message": str(e), "token": token}
+            raise
+        finally:
+            renewal.cancel()
+            if outcome is not None:
+                outbox.put_nowait(outcome)
+            outbox.put_nowait(None)
+            await publisher
+            if outcome is not None:
+                # Stored before the lock goes, for followers that miss the notice
+                await self.redis_manager.run(
+                    lambda: self.redis_manager.redis_client.set(
+                        self._outcome_key(key), json.dumps(outcome), ex=FLIGHT_OUTCOME_TTL
+                    )
+                )
+            await self.redis_manager.run(
+                lambda: self.redis_manager.redis_client.eval(
+                    RELEASE_SCRIPT, 1, self._lock_key(key), token
+                )
+            )
+
+    async def _publish_all(self, key: str, outbox: asyncio.Queue):
+        """Publish the events of a flight in order, until None is queued"""
+        while True:
+            event = await outbox.get()
+            if event is None:
+                return
+
+            await self.redis_manager.run(
+                lambda: self.redis_manager.redis_client.publish(
+                    self._channel(key), json.dumps(event)
+                )
+            )
+
+    async def _renew(self, key: str, token: str):
+        while True:
+            await asyncio.sleep(FLIGHT_LEASE / 3)
+            await self.redis_manager.run(
+                lambda: self.redis_manager.redis_client.eval(
+                    RENEW_SCRIPT, 1, self._lock_key(key), token, int(FLIGHT_LEASE * 1000)
+                )
+            )
+
+    async def _follow(self, key: str, flight: _Flight) -> Optional[dict]:
+        """
+        Follow the leader of key on another worker.
+
+        Returns:
+            The result of the flight, or None once the lock is gone without an
+            outcome (the leader crashed or was cancelled).
+        """
+        lock_key = self._lock_key(key)
+        redis_client = self.redis_manager.redis_client
+        pubsub = redis_client.pubsub()
+        try:
+            # Subscribed before looking at the lock, so that nothing the
+            # leader publishes after the look is missed
+            await pubsub.subscribe(self._channel(key))
+            leader = await redis_client.get(lock_key)
+
+            while True:
+                # Bounded waits, so a vanished leader is noticed
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None:
+                    event = json.loads(message["data"])
+                    if event["event"] in ("landed", "failed"):
+                        return await self._land_from(event)
+                    flight.emit(event)
+                    continue
+
+                if await redis_client.exists(lock_key):
+                    continue
+
+                # The leader is gone: it landed before the subscription, or
+                # crashed. Outcomes of earlier leaders only count when this
+                # one was gone already.
+                stored = await redis_client.get(self._outcome_key(key))
+                if stored is not None:
+                    outcome = json.loads(stored)
+                    if leader is None or outcome.get("token") == leader.decode("utf-8"):
+                        return await self._land_from(outcome)
+                return None
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Lost the leader of {key}: {str(e)}")
+            return None
+        finally:
+            await pubsub.aclose()
+
+    async def _land_from(self, outcome: Event) -> dict:
+        """The result of a flight from its outcome, published or stored"""
+        if outcome["event"] == "failed":
+            raise FlightFailed(outcome["message"])
+        return await self.from_notice(outcome["notice"])
@@ -0,0 +1,30 @@
+from typing import Optional
+from fastapi import APIRouter, Header, Path
+
+from app.schemas.extractor_schema import ErrorResponse
+
+from app.services import asset_service
+
+
+router = APIRouter(
+    tags=["Assets"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get(
+    "/assets/{blob_hash}",
+    responses={404: {"model": ErrorResponse}},
+    summary="Get a stored asset by its content hash",
+)
+async def get_asset(
+    blob_hash: str = Path(
+        ..., pattern="^[0-9a-f]{64}$", description="SHA-256 hash of the asset"
+    ),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Serve an inline asset (SVG markup, data URI payload) referenced by an
+    extraction result. Assets are immutable, so clients may cache them forever.
+    """
+    return await asset_service.get_asset_response(blob_hash, if_none_match)
@@ -1,13 +1,22 @@
+from typing import List, Optional
 from fastapi import APIRouter, Request, Query, Path
+from fastapi.responses import StreamingResponse
 
 from app.root.redis_manager import ping_redis
 from app.schemas.extractor_schema import (
+    BatchRequest,
+    CachedResultsList,
+    CacheStats,
+    CpuPoolStats,
+    MAX_DEADLINE_MS,
     ErrorResponse,
+    ExtractionStage,
     ExtractorResponse,
+    JobInfo,
     URLRequest,
 )
 
-from app.services import extractor_service
+from app.services import crawl_service, extractor_service
 
 import logging
 
@@ -27,7 +36,7 @@ async def api_index():
     This serves as a simple health check and documentation entry point.
     """
     # Check if Redis is available
-    redis_available = ping_redis()
+    redis_available = await ping_redis()
 
     return {
         "status": "ok",
@@ -36,8 +45,15 @@ async def api_index():
         "endpoints": {
             "extract": "/api/extract",
             "stream": "/api/extract/sse",
+            "batch": "/api/extract/batch",
+            "crawl": "/api/crawl/sse",
+            "jobs": "/api/jobs",
+            "job_by_id": "/api/jobs/{job_id}",
             "cache": "/api/cache",
+            "cache_stats": "/api/cache/stats",
             "cache_by_id": "/api/cache/{result_id}",
+            "cpu_pool_stats": "/api/cpu-pool/stats",
+            "asset_by_hash": "/api/assets/{hash}",
         },
         "documentation": "/docs",
     }
@@ -48,13 +64,26 @@ async def api_index():
     response_model=ExtractorResponse,
     responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
 )
-async def extract_assets(url_request: URLRequest):
+async def extract_assets(
+    request: Request,
+    url_request: URLRequest,
+    fields: Optional[str] = Query(
+        None, description="Comma separated fields to return, e.g. colors.from_css,fonts"
+    ),
+    limit: Optional[int] = Query(
+        None, ge=1, description="Maximum number of items per asset category"
+    ),
+    cursor: Optional[str] = Query(None, description="Cursor of the page of assets"),
+):
     """
     Extract colors, fonts and assets from a web URL.
 
     If the URL has been extracted before and cached, returns the cached result
     unless force_refresh is set to True.
 
+    Use fields to return only part of the result, and limit/cursor to page
+    through large asset lists.
+
     Returns:
         ExtractorResponse: A structured response containing colors, fonts, and assets from the web page
 
@@ -62,43 +91,184 @@ async def extract_assets(url_request: URLRequest):
         HTTPException: If the URL is invalid or if there's an error during extraction
     """
 
-    return await extractor_service.extract_assets(url_request)
+    return await extractor_service.extract_assets(
+        url_request,
+        fields=fields,
+        limit=limit,
+        cursor=cursor,
+        zero_copy=True,
+        request=request,
+    )
+
+
+@router.post(
+    "/extract/batch",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "One JSON line per URL, in the order they finish",
+        }
+    },
+)
+async def extract_batch(batch_request: BatchRequest):
+    """
+    Extract colors, fonts and assets from several URLs.
+
+    Cached results are reused, the others extracted a few at a time, with
+    hosts taking turns. Every result is streamed as a line of NDJSON as soon
+    as it is ready: {"index", "url", "result"}, or {"index", "url", "error"}.
+    """
+    return await extractor_service.extract_batch(batch_request)
 
 
 @router.get("/extract/sse")
 async def extract_assets_sse(
     request: Request,
-    url: str = Query(..., description="URL to extract assets from"),
+    url: Optional[str] = Query(None, description="URL to extract assets from"),
     force_refresh: bool = Query(False, description="Force a refresh even if cached"),
+    include: Optional[List[ExtractionStage]] = Query(
+        None, description="Stages to extract, repeat the parameter for several"
+    ),
+    job_id: Optional[str] = Query(
+        None, description="Stream the progress of this extraction job instead"
+    ),
+    deadline_ms: Optional[int] = Query(
+        None,
+        ge=1,
+        le=MAX_DEADLINE_MS,
+        description="Time budget of the extraction, what is done by then is returned as partial",
+    ),
+    last_event_id: Optional[str] = Query(
+        None, description="Resume after this event, like the Last-Event-ID header"
+    ),
 ):
     """
     Stream extraction progress and results using Server-Sent Events (SSE)
+
+    Progress events carry an ID. Reconnecting with the last one received, in
+    the Last-Event-ID header as EventSource does, resumes the stream after it.
     """
     return await extractor_service.extract_assets_sse(
-        # request=request,
         url=url,
         force_refresh=force_refresh,
+        include=include,
+        job_id=job_id,
+        deadline_ms=deadline_ms,
+        last_event_id=request.headers.get("Last-Event-ID") or last_event_id,
     )
 
 
-# @router.get(
-#     "/cache", response_model=CachedResultsList, summary="List cached extraction results"
-# )
-# async def list_cache(
-#     limit: int = Query(20, description="Maximum number of results to return"),
-#     offset: int = Query(0, description="Number of results to skip"),
-# ):
-#     """
-#     List available cached extraction results with pagination.
-#     """
-#     try:
-#         results = list_cached_results(limit=limit, offset=offset)
-#         return results
-#     except Exception as e:
-#         logger.error(f"Error listing cached results: {str(e)}")
-#         raise HTTPException(
-#             status_code=500, detail=f"Failed to list cached results: {str(e)}"
-#         )
+@router.get("/crawl/sse")
+async def crawl_site_sse(
+    url: str = Query(..., description="URL to start crawling from"),
+    max_depth: int = Query(
+        1,
+        ge=0,
+        le=crawl_service.CRAWL_MAX_DEPTH,
+        description="Number of links to follow from the start URL",
+    ),
+    max_pages: int = Query(
+        10,
+        ge=1,
+        le=crawl_service.CRAWL_MAX_PAGES,
+        description="Number of pages to crawl at most",
+    ),
+    force_refresh: bool = Query(False, description="Force a refresh even if cached"),
+    include: Optional[List[ExtractionStage]] = Query(
+        None, description="Stages to extract, repeat the parameter for several"
+    ),
+):
+    """
+    Crawl a site from a URL, following same-site links, and stream every page
+    with Server-Sent Events (SSE) as it completes. The last event holds the
+    colors, fonts and assets of all pages, merged, with the number of pages
+    each was found on.
+    """
+    return await crawl_service.crawl_site_sse(
+        url=url,
+        max_depth=max_depth,
+        max_pages=max_pages,
+        force_refresh=force_refresh,
+        include=include,
+    )
+
+
+@router.post(
+    "/jobs",
+    response_model=JobInfo,
+    status_code=202,
+    responses={400: {"model": ErrorResponse}, 503: {"model": ErrorResponse}},
+    summary="Queue an extraction job",
+)
+async def submit_job(url_request: URLRequest):
+    """
+    Queue the extraction of a URL for the extraction workers and return at
+    once. Follow the job with /api/jobs/{job_id} or /api/extract/sse?job_id=,
+    and get its result with /api/cache/{job_id}.
+    """
+    return await extractor_service.submit_job(url_request)
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobInfo,
+    responses={404: {"model": ErrorResponse}},
+    summary="Get the state of an extraction job",
+)
+async def get_job(
+    job_id: str = Path(..., description="ID of the job"),
+):
+    """
+    Retrieve the state of an extraction job.
+    """
+    return await extractor_service.get_job(job_id)
+
+
+@router.get(
+    "/cache",
+    response_model=CachedResultsList,
+    responses={500: {"model": ErrorResponse}},
+    summary="List cached extraction results",
+)
+async def list_cache(
+    limit: int = Query(20, ge=1, description="Maximum number of results to return"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    host: Optional[str] = Query(None, description="Only list results of this host"),
+):
+    """
+    List available cached extraction results with pagination, most recently
+    stored first.
+    """
+    return await extractor_service.list_cached_results(
+        limit=limit, offset=offset, host=host
+    )
+
+
+@router.get(
+    "/cache/stats",
+    response_model=CacheStats,
+    responses={500: {"model": ErrorResponse}},
+    summary="Get cache statistics",
+)
+async def get_cache_stats():
+    """
+    Entry count, size, hit ratio and age distribution of the cached results.
+    """
+    return await extractor_service.get_cache_stats()
+
+
+@router.get(
+    "/cpu-pool/stats",
+    response_model=CpuPoolStats,
+    summary="Get CPU pool statistics",
+)
+async def get_cpu_pool_stats():
+    """
+    Queue depth of the CPU pool of the serving process, and the tasks it ran
+    with the time they waited and ran, by function.
+    """
+    return extractor_service.get_cpu_pool_stats()
 
 
 @router.get(
@@ -108,12 +278,21 @@ async def extract_assets_sse(
     summary="Get cached extraction result by ID",
 )
 async def get_cached_result(
-    result_id: str = Path(..., description="ID of the cached result to retrieve")
+    result_id: str = Path(..., description="ID of the cached result to retrieve"),
+    fields: Optional[str] = Query(
+        None, description="Comma separated fields to return, e.g. colors.from_css,fonts"
+    ),
+    limit: Optional[int] = Query(
+        None, ge=1, description="Maximum number of items per asset category"
+    ),
+    cursor: Optional[str] = Query(None, description="Cursor of the page of assets"),
 ):
     """
     Retrieve a cached extraction result by its ID.
     """
-    return await extractor_service.get_cached_result_by_id(result_id=result_id)
+    return await extractor_service.get_cached_result_by_id(
+        result_id=result_id, fields=fields, limit=limit, cursor=cursor
+    )
 
 
 # async def stream_cached_result(result):
@@ -1,6 +1,8 @@
+from typing import List, Optional
 from mcp.server.fastmcp import FastMCP
 
 from app.schemas.extractor_schema import (
+    ExtractionStage,
     ExtractorResponse,
     URLRequest,
 )
@@ -21,10 +23,18 @@ mcp_app = FastMCP(
 )
 async def extract_all_assets(
     url: str,
+    include: Optional[List[ExtractionStage]] = None,
+    deadline_ms: Optional[int] = None,
 ) -> ExtractorResponse:
     """
     Automatically analyzes any website URL and extracts key visual and design elements such as colors, fonts, images, and other assets used on the site..
+
+    Use include to pick the stages to extract (assets, css_colors, image_colors, fonts).
+    Use deadline_ms to get what was extracted within that many milliseconds,
+    flagged as partial, instead of waiting for every stage.
     """
 
-    url_request = URLRequest(url=url)
+    url_request = URLRequest(url=url, deadline_ms=deadline_ms)
+    if include:
+        url_request.include = include
     return await extractor_service.extract_assets(url_request)
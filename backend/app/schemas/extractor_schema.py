@@ -7,6 +7,8 @@ from datetime import datetime
 class ProgressStage(StrEnum):
     """Enum representing the different stages of the extraction process"""
 
+    REVALIDATING = "revalidating"
+    PAGE_UNCHANGED = "page_unchanged"
     FETCHING_PAGE = "fetching_page"
     LOADING_PAGE = "loading_page"
     PAGE_LOADED = "page_loaded"
@@ -29,10 +31,51 @@ class ProgressStage(StrEnum):
     ASSETS_EXTRACTED = "assets_extracted"
     EXTRACTION_COMPLETE = "extraction_complete"
     EXTRACTION_FAILED = "extraction_failed"
+    DEADLINE_REACHED = "deadline_reached"
     EXTRACTING_COLORS = "extracting_colors"
     COLORS_EXTRACTED = "colors_extracted"
 
 
+class ItemBatchEvent(StrEnum):
+    """Enum representing the events streaming the items of a result as they are found"""
+
+    ASSET_BATCH = "asset_batch"
+    COLOR_BATCH = "color_batch"
+    FONT_BATCH = "font_batch"
+
+
+class ExtractionStage(StrEnum):
+    """Enum representing the parts of a result a client can ask for"""
+
+    ASSETS = "assets"
+    CSS_COLORS = "css_colors"
+    IMAGE_COLORS = "image_colors"
+    FONTS = "fonts"
+
+
+# Stages extracted when a request does not choose any
+DEFAULT_EXTRACTION_STAGES = [
+    ExtractionStage.ASSETS,
+    ExtractionStage.CSS_COLORS,
+    ExtractionStage.FONTS,
+]
+
+# Most URLs a batch extraction accepts
+MAX_BATCH_URLS = 1000
+
+# Longest time budget a request can give its extraction, 10 minutes
+MAX_DEADLINE_MS = 600_000
+
+
+class JobStatus(StrEnum):
+    """Enum representing the states of an extraction job"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class ColorInfo(BaseModel):
     """Model for color information"""
 
@@ -72,6 +115,18 @@ class FontInfo(BaseModel):
     url: Optional[str] = Field(None, description="The URL of the font if available")
 
 
+class AssetBlobInfo(BaseModel):
+    """Model for an inline asset moved to the blob store"""
+
+    hash: str = Field(..., description="SHA-256 hash of the asset content")
+    media_type: str = Field(..., description="The media type of the asset")
+    size: int = Field(..., description="The size of the asset in bytes")
+    preview: Optional[str] = Field(
+        None,
+        description="The SVG markup or data URI of the asset, only for small assets",
+    )
+
+
 class AssetCollection(BaseModel):
     """Model for asset collections"""
 
@@ -89,11 +144,15 @@ class AssetCollection(BaseModel):
     )
     icons: List[str] = Field(
         default_factory=list,
-        description="SVG icons found on the page (typically smaller vector graphics)",
+        description="SVG icons found on the page (typically smaller vector graphics), as /api/assets references",
     )
     svgs: List[str] = Field(
         default_factory=list,
-        description="Regular SVG images found on the page (typically larger vector graphics)",
+        description="Regular SVG images found on the page (typically larger vector graphics), as /api/assets references",
+    )
+    blobs: Dict[str, AssetBlobInfo] = Field(
+        default_factory=dict,
+        description="Inline assets referenced as /api/assets/{hash}, keyed by hash",
     )
 
 
@@ -124,6 +183,10 @@ class ExtractorResponse(BaseModel):
     result_id: Optional[str] = Field(
         None, description="Unique identifier for this extraction result"
     )
+    stages: List[ExtractionStage] = Field(
+        default_factory=lambda: list(DEFAULT_EXTRACTION_STAGES),
+        description="Stages this result contains",
+    )
     timestamp: Optional[datetime] = Field(
         default_factory=datetime.now,
         description="Time when the extraction was performed",
@@ -131,6 +194,90 @@ class ExtractorResponse(BaseModel):
     cached: Optional[bool] = Field(
         False, description="Whether this result was retrieved from cache"
     )
+    stale: Optional[bool] = Field(
+        False,
+        description="Whether this cached result is past its freshness window, a refresh then runs in the background",
+    )
+    counts: Optional[Dict[str, int]] = Field(
+        None, description="Number of items in every asset, color and font list"
+    )
+    partial: Optional[bool] = Field(
+        False,
+        description="Whether the deadline of the request passed before every stage finished",
+    )
+    unfinished_stages: List[ExtractionStage] = Field(
+        default_factory=list,
+        description="Stages the deadline cut short, with what they found so far",
+    )
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page of assets, when paginated"
+    )
+
+
+class CrawledColor(ColorInfo):
+    """Model for a color found while crawling a site"""
+
+    pages: int = Field(..., description="Number of pages the color was found on")
+
+
+class CrawledFont(FontInfo):
+    """Model for a font found while crawling a site"""
+
+    pages: int = Field(..., description="Number of pages the font was found on")
+
+
+class CrawledAsset(BaseModel):
+    """Model for an asset found while crawling a site"""
+
+    url: str = Field(..., description="URL of the asset, or its /api/assets reference")
+    pages: int = Field(..., description="Number of pages the asset was found on")
+
+
+class CrawledColorCollection(BaseModel):
+    """Model for the colors of a crawled site"""
+
+    from_css: List[CrawledColor] = Field(default_factory=list)
+    from_images: List[CrawledColor] = Field(default_factory=list)
+
+
+class CrawledAssetCollection(BaseModel):
+    """Model for the assets of a crawled site"""
+
+    images: List[CrawledAsset] = Field(default_factory=list)
+    videos: List[CrawledAsset] = Field(default_factory=list)
+    scripts: List[CrawledAsset] = Field(default_factory=list)
+    stylesheets: List[CrawledAsset] = Field(default_factory=list)
+    icons: List[CrawledAsset] = Field(default_factory=list)
+    svgs: List[CrawledAsset] = Field(default_factory=list)
+    blobs: Dict[str, AssetBlobInfo] = Field(
+        default_factory=dict,
+        description="Inline assets referenced as /api/assets/{hash}, keyed by hash",
+    )
+
+
+class CrawledPage(BaseModel):
+    """Model for one page of a crawl"""
+
+    url: str = Field(..., description="The URL of the page")
+    depth: int = Field(..., description="Number of links followed from the start URL")
+    result_id: Optional[str] = Field(None, description="ID of the result of the page")
+    cached: bool = Field(False, description="Whether the page came from the cache")
+    error: Optional[str] = Field(None, description="Why the page could not be extracted")
+
+
+class CrawlResponse(BaseModel):
+    """Model for the colors, fonts and assets of a site, merged across its pages"""
+
+    url: str = Field(..., description="The URL the crawl started from")
+    stages: List[ExtractionStage] = Field(
+        default_factory=list, description="Stages extracted from every page"
+    )
+    pages: List[CrawledPage] = Field(
+        default_factory=list, description="The pages crawled, in the order they finished"
+    )
+    colors: CrawledColorCollection = Field(default_factory=CrawledColorCollection)
+    fonts: List[CrawledFont] = Field(default_factory=list)
+    assets: CrawledAssetCollection = Field(default_factory=CrawledAssetCollection)
 
 
 class ErrorResponse(BaseModel):
@@ -155,6 +302,10 @@ class CachedResultInfo(BaseModel):
     timestamp: Optional[datetime] = Field(
         None, description="Time when the extraction was performed"
     )
+    stages: List[ExtractionStage] = Field(
+        default_factory=list, description="Stages the cache holds for the URL"
+    )
+    size: Optional[int] = Field(None, description="Bytes the cached stages take")
 
 
 class CachedResultsList(BaseModel):
@@ -166,11 +317,106 @@ class CachedResultsList(BaseModel):
     results: List[CachedResultInfo] = Field(..., description="List of cached results")
 
 
+class CacheStats(BaseModel):
+    """Model for the statistics of the result cache"""
+
+    entries: int = Field(..., description="Number of cached URLs")
+    total_bytes: int = Field(..., description="Bytes the cached stages take")
+    hits: int = Field(0, description="Lookups served from the cache")
+    stale_hits: int = Field(
+        0, description="Lookups served from the cache while a refresh ran"
+    )
+    misses: int = Field(0, description="Lookups that needed an extraction")
+    hit_ratio: Optional[float] = Field(
+        None, description="Share of lookups served from the cache, stale ones included"
+    )
+    age_distribution: Dict[str, int] = Field(
+        default_factory=dict, description="Number of entries by time since last stored"
+    )
+
+
+class CpuPoolFunctionStats(BaseModel):
+    """Model for what one function did in the CPU pool"""
+
+    tasks: int = Field(..., description="Tasks that completed")
+    failures: int = Field(..., description="Tasks that raised")
+    wait_seconds: float = Field(..., description="Time tasks waited for a process")
+    run_seconds: float = Field(..., description="Time tasks ran in a process")
+
+
+class CpuPoolStats(BaseModel):
+    """Model for the statistics of the CPU pool"""
+
+    size: int = Field(..., description="Processes in the pool, 0 when tasks run inline")
+    in_flight: int = Field(..., description="Tasks submitted and not finished")
+    queue_depth: int = Field(..., description="Tasks waiting for a process")
+    functions: Dict[str, CpuPoolFunctionStats] = Field(
+        default_factory=dict, description="What the pool did by function"
+    )
+
+
 class URLRequest(BaseModel):
     url: str
     force_refresh: bool = False  # Option to force a new extraction even if cached
+    include: List[ExtractionStage] = Field(
+        default_factory=lambda: list(DEFAULT_EXTRACTION_STAGES),
+        min_length=1,
+        description="Stages to extract, only their work is done",
+    )
+    deadline_ms: Optional[int] = Field(
+        None,
+        ge=1,
+        le=MAX_DEADLINE_MS,
+        description="Time budget of the extraction, what is done by then is returned as partial",
+    )
 
     class Config: 
         schema_extra = {
             "example": {"url": "https://example.com", "force_refresh": False}
         }
+
+
+class BatchRequest(BaseModel):
+    urls: List[str] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_URLS, description="URLs to extract"
+    )
+    force_refresh: bool = False  # Option to force a new extraction even if cached
+    include: List[ExtractionStage] = Field(
+        default_factory=lambda: list(DEFAULT_EXTRACTION_STAGES),
+        min_length=1,
+        description="Stages to extract for every URL",
+    )
+    deadline_ms: Optional[int] = Field(
+        None,
+        ge=1,
+        le=MAX_DEADLINE_MS,
+        description="Time budget of the extraction of every URL",
+    )
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "urls": ["https://example.com", "https://example.org"],
+                "force_refresh": False,
+            }
+        }
+
+
+class JobInfo(BaseModel):
+    """Model for the state of an extraction job"""
+
+    job_id: str = Field(..., description="Unique identifier of the job")
+    status: JobStatus = Field(..., description="Where the job is at")
+    url: str = Field(..., description="The URL the job extracts")
+    stages: List[ExtractionStage] = Field(
+        default_factory=list, description="Stages the job extracts"
+    )
+    attempts: int = Field(0, description="Number of times the job was started")
+    result_id: Optional[str] = Field(
+        None, description="ID of the result, once the job completed"
+    )
+    error: Optional[str] = Field(None, description="Why the last attempt failed")
+    created_at: Optional[datetime] = Field(None, description="Time the job was queued")
+    updated_at: Optional[datetime] = Field(
+        None, description="Time the state of the job last changed"
+    )
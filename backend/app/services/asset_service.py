@@ -0,0 +1,161 @@
+import base64
+import logging
+from typing import Iterable, Tuple, Union
+from urllib.parse import unquote
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from app.root.blob_store import BLOB_TTL, blob_store
+
+
+logger = logging.getLogger("asset-service")
+
+# Payloads up to this size are also inlined as the preview of their reference
+BLOB_PREVIEW_MAX_BYTES = 1024
+
+# Blobs are content addressed, so a given URL can never change
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Blobs are scraped content served from the API origin: nothing in them may
+# run there, whatever media type the page claimed
+ASSET_SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "Content-Security-Policy": "sandbox; default-src 'none'",
+}
+# Media types served inline, the others are downloaded
+INLINE_MEDIA_TYPES = {
+    "image/png",
+    "image/jpeg",
+    "image/gif",
+    "image/webp",
+    "image/avif",
+    "image/bmp",
+    "image/x-icon",
+    "image/vnd.microsoft.icon",
+}
+
+
+def get_asset_url(blob_hash: str) -> str:
+    """
+    Generate the API URL a stored blob is served from.
+
+    Args:
+        blob_hash: The content hash of the blob.
+
+    Returns:
+        The path of the blob under /api/assets.
+    """
+    return f"/api/assets/{blob_hash}"
+
+
+def decode_data_uri(data_uri: str) -> Union[Tuple[bytes, str], None]:
+    """Split a data: URI into its raw bytes and media type"""
+    header, separator, payload = data_uri.partition(",")
+    if not separator:
+        return None
+
+    params = header[len("data:") :].split(";")
+    media_type = params[0] or "text/plain"
+
+    try:
+        if "base64" in params[1:]:
+            return base64.b64decode(payload), media_type
+        return unquote(payload).encode("utf-8"), media_type
+    except ValueError:
+        return None
+
+
+async def _store_inline_asset(asset: str, blobs: dict) -> str:
+    """Move one inline payload into the blob store, returning its reference URL"""
+    if asset.startswith("<svg"):
+        data, media_type, preview = asset.encode("utf-8"), "image/svg+xml", asset
+    elif asset.startswith("data:"):
+        decoded = decode_data_uri(asset)
+        if not decoded:
+            return asset
+        data, media_type = decoded
+        preview = asset
+    else:
+        return asset  # Already a plain URL
+
+    blob_hash = await blob_store.put(data, media_type)
+    blobs[blob_hash] = {
+        "hash": blob_hash,
+        "media_type": media_type,
+        "size": len(data),
+        "preview": preview if len(preview) <= BLOB_PREVIEW_MAX_BYTES else None,
+    }
+
+    return get_asset_url(blob_hash)
+
+
+async def store_inline_assets(assets: dict) -> dict:
+    """
+    Replace inline SVG markup and data URIs in an asset collection by
+    references to the blob store.
+
+    Args:
+        assets: The asset collection produced by the extractor.
+
+    Returns:
+        The same collection, with inline payloads replaced by /api/assets URLs
+        and their metadata listed under "blobs".
+    """
+    blobs = assets.setdefault("blobs", {})
+
+    for category in ("images", "icons", "svgs"):
+        references = []
+        for asset in assets.get(category, []):
+            try:
+                reference = await _store_inline_asset(asset, blobs)
+            except Exception as e:
+                # Keep the payload inline rather than losing the asset
+                logger.error(f"Error storing inline asset: {str(e)}")
+                reference = asset
+
+            if reference not in references:
+                references.append(reference)
+        assets[category] = references
+
+    return assets
+
+
+async def refresh_blobs(blob_hashes: Iterable[str], ttl: int):
+    """Keep stored blobs alive for at least ttl seconds from now"""
+    await blob_store.touch(blob_hashes, max(ttl, BLOB_TTL))
+
+
+async def get_asset_response(
+    blob_hash: str, if_none_match: Union[str, None]
+) -> Response:
+    """
+    Serve a stored blob with a strong ETag and long-lived cache headers.
+
+    Raster images are served inline. Anything else, SVG and HTML included,
+    is sent as an attachment, and every blob is sandboxed by its CSP.
+
+    Args:
+        blob_hash: The content hash of the blob.
+        if_none_match: The If-None-Match header sent by the client, if any.
+
+    Returns:
+        The blob, or an empty 304 response when the client already has it.
+    """
+    etag = f'"{blob_hash}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": ASSET_CACHE_CONTROL,
+        **ASSET_SECURITY_HEADERS,
+    }
+
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    blob = await blob_store.get(blob_hash)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+
+    data, media_type = blob
+    if media_type.split(";")[0].strip().lower() not in INLINE_MEDIA_TYPES:
+        headers["Content-Disposition"] = f'attachment; filename="{blob_hash}"'
+    return Response(content=data, media_type=media_type, headers=headers)
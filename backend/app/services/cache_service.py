@@ -0,0 +1,792 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.root.cache_codec import decode_value, encode_value
+from app.root.local_cache import local_cache, publish_invalidation
+from app.root.redis_manager import CACHE_EXPIRATION, RedisManager
+from app.schemas.extractor_schema import ExtractionStage
+from app.services import asset_service
+from app.services.utils import extractor, projection
+from app.services.utils.canonical_url import canonicalize_url
+
+
+logger = logging.getLogger("cache-service")
+
+# Every stage is cached on its own and served as it is for its soft TTL, then
+# served flagged as stale while a background refresh runs
+STAGE_SOFT_TTLS = {
+    ExtractionStage.ASSETS: int(os.environ.get("ASSETS_SOFT_TTL", 3600 * 6)),
+    ExtractionStage.CSS_COLORS: int(os.environ.get("CSS_COLORS_SOFT_TTL", 3600 * 12)),
+    ExtractionStage.IMAGE_COLORS: int(os.environ.get("IMAGE_COLORS_SOFT_TTL", 3600 * 6)),
+    ExtractionStage.FONTS: int(os.environ.get("FONTS_SOFT_TTL", 86400 * 3)),
+}
+# Times in a row a stage is kept by revalidation before it is extracted again
+# anyway, as validators do not see the content of stylesheets and scripts
+STAGE_MAX_REVALIDATIONS = int(os.environ.get("STAGE_MAX_REVALIDATIONS", 3))
+# Cached stages expire after RESULT_HARD_TTL, only then does a request wait
+RESULT_HARD_TTL = int(os.environ.get("RESULT_HARD_TTL", CACHE_EXPIRATION))
+# The document as served, stages that need no browser are extracted from it
+HTML_SNAPSHOT_TTL = int(os.environ.get("HTML_SNAPSHOT_TTL", 3600 * 12))  # 12 hours
+
+EMPTY_ASSETS = {category: [] for category in projection.ASSET_CATEGORIES}
+
+# Cached URLs by time of last write, overall and per host, and their size.
+# Maintained on every write so listings and statistics never scan keys.
+INDEX_KEY = "index:recent"
+INDEX_SIZES_KEY = "index:sizes"
+STATS_KEY = "stats:cache"
+# How often workers add their hit and miss counts to the shared ones
+CACHE_STATS_FLUSH_INTERVAL = float(os.environ.get("CACHE_STATS_FLUSH_INTERVAL", 10))
+
+# Bytes the cached results may take in Redis, 0 for no limit. Over it the
+# largest and oldest entries are evicted until the cache is back under
+# CACHE_EVICTION_TARGET of the budget.
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 512 * 1024 * 1024))
+CACHE_EVICTION_TARGET = float(os.environ.get("CACHE_EVICTION_TARGET", 0.9))
+# Oldest entries weighed against each other per eviction round
+CACHE_EVICTION_SAMPLE = int(os.environ.get("CACHE_EVICTION_SAMPLE", 100))
+
+# Upper bounds of the age buckets reported by get_cache_stats
+AGE_BUCKETS = [("under_1h", 3600), ("1h_to_6h", 3600 * 6), ("6h_to_24h", 86400), ("1d_to_7d", 86400 * 7)]
+
+# Record the size of an entry, keeping the total of all entries in step
+SET_SIZE_SCRIPT = """
+local previous = tonumber(redis.call('hget', KEYS[1], ARGV[1]) or '0')
+redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+return redis.call('hincrby', KEYS[2], 'bytes', tonumber(ARGV[2]) - previous)
+"""
+REMOVE_SIZES_SCRIPT = """
+local total = 0
+for _, member in ipairs(ARGV) do
+    total = total + tonumber(redis.call('hget', KEYS[1], member) or '0')
+    redis.call('hdel', KEYS[1], member)
+end
+return redis.call('hincrby', KEYS[2], 'bytes', -total)
+"""
+
+redis_manager = RedisManager()
+
+# Lookups counted by this worker and not added to the shared counts yet
+pending_stats: Counter = Counter()
+
+# The cache entry of a URL: its metadata and the serialized value of the
+# stages that were read, by stage
+CacheEntry = Tuple[Optional[dict], Dict[str, bytes]]
+
+
+def generate_result_id() -> str:
+    """Generate a unique ID for extraction results"""
+    return str(uuid.uuid4())
+
+
+def get_result_key(result_id: str) -> str:
+    """
+    Generate a Redis key for the given result ID.
+
+    Args:
+        result_id: The result ID to generate a key for.
+
+    Returns:
+        A string representing the Redis key.
+    """
+    return f"result:{result_id}"
+
+
+def get_meta_key(url: str) -> str:
+    """
+    Generate the Redis key of the metadata of the stages cached for a URL.
+
+    The metadata holds the result ID and, for every stage, when it was
+    extracted, from what and how many items it holds. Spellings of the same
+    URL share a key, see canonicalize_url.
+
+    Args:
+        url: The URL to generate a key for.
+
+    Returns:
+        A string representing the Redis key.
+    """
+    return f"meta:{canonicalize_url(url)}"
+
+
+def get_stage_key(url: str, stage: str) -> str:
+    """
+    Generate the Redis key of one stage of the result cached for a URL.
+
+    Args:
+        url: The URL to generate a key for.
+        stage: The extraction stage.
+
+    Returns:
+        A string representing the Redis key.
+    """
+    return f"stage:{stage}:{canonicalize_url(url)}"
+
+
+def get_snapshot_key(url: str) -> str:
+    """
+    Generate the Redis key of the HTML snapshot of a URL.
+
+    Args:
+        url: The URL to generate a key for.
+
+    Returns:
+        A string representing the Redis key.
+    """
+    return f"html:{canonicalize_url(url)}"
+
+
+def get_alias_key(url: str) -> str:
+    """
+    Generate the Redis key pointing a redirecting URL to the URL it led to.
+
+    Args:
+        url: The redirecting URL.
+
+    Returns:
+        A string representing the Redis key.
+    """
+    return f"alias:{canonicalize_url(url)}"
+
+
+def get_host_index_key(host: str) -> str:
+    """
+    Generate the Redis key of the index of the URLs cached for a host.
+
+    Args:
+        host: The host name, as in the URL.
+
+    Returns:
+        A string representing the Redis key.
+    """
+    return f"index:host:{host.lower()}"
+
+
+def serialize_value(value) -> bytes:
+    """Serialize a value the way it is stored and served on cache hits"""
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def mark_cached(serialized: bytes, stale: bool = False) -> bytes:
+    """
+    Set the cached and stale flags on a serialized result without decoding it.
+
+    Stored results never hold the flags, and JSON parsers keep the last value
+    of a duplicated key, so appending them is enough.
+    """
+    if stale:
+        return serialized[:-1] + b',"cached":true,"stale":true}'
+    return serialized[:-1] + b',"cached":true}'
+
+
+def get_stage_value(result: dict, stage: str):
+    """The part of an extraction result a stage produced"""
+    if stage == ExtractionStage.ASSETS:
+        return result["assets"]
+    if stage == ExtractionStage.CSS_COLORS:
+        return result["colors"]["from_css"]
+    if stage == ExtractionStage.IMAGE_COLORS:
+        return result["colors"]["from_images"]
+    return result["fonts"]
+
+
+def set_stage_value(result: dict, stage: str, value):
+    """Put the part a stage produced in an extraction result"""
+    if stage == ExtractionStage.ASSETS:
+        result["assets"] = value
+    elif stage in (ExtractionStage.CSS_COLORS, ExtractionStage.IMAGE_COLORS):
+        colors = result.setdefault("colors", {"from_css": [], "from_images": []})
+        source = "from_css" if stage == ExtractionStage.CSS_COLORS else "from_images"
+        colors[source] = value
+    else:
+        result["fonts"] = value
+
+
+def count_stage(stage: str, value) -> Dict[str, int]:
+    """The entries of the counts of a result a stage contributes"""
+    if stage == ExtractionStage.ASSETS:
+        return {
+            category: len(value.get(category, []))
+            for category in projection.ASSET_CATEGORIES
+        }
+    if stage == ExtractionStage.CSS_COLORS:
+        return {"colors_from_css": len(value)}
+    if stage == ExtractionStage.IMAGE_COLORS:
+        return {"colors_from_images": len(value)}
+    return {"fonts": len(value)}
+
+
+def get_stage_blobs(stage: str, value) -> Dict[str, int]:
+    """The sizes of the stored blobs a stage references, by hash"""
+    if stage != ExtractionStage.ASSETS:
+        return {}
+    return {blob_hash: blob["size"] for blob_hash, blob in value.get("blobs", {}).items()}
+
+
+def get_stage_validators(validators: Optional[dict], stage: str) -> Optional[dict]:
+    """The part of the page validators a stage was extracted from"""
+    if not validators:
+        return None
+
+    field = extractor.STAGE_INPUTS[stage]
+    return {"document_hash": validators.get("document_hash"), field: validators.get(field)}
+
+
+async def _get_values(keys: List[str]) -> List[Optional[bytes]]:
+    """Read keys from the local cache, and the ones it misses from Redis in one round trip"""
+    values = [local_cache.get(key) for key in keys]
+
+    missing = [key for key, value in zip(keys, values) if value is None]
+    if missing:
+        fetched = {
+            key: decode_value(value)
+            for key, value in zip(missing, await redis_manager.get_many(missing))
+        }
+        for key, value in fetched.items():
+            if value is not None:
+                local_cache.set(key, value, size=len(value))
+        values = [value if value is not None else fetched[key] for key, value in zip(keys, values)]
+
+    return values
+
+
+async def get_cached_entry(url: str, stages: Optional[Iterable[str]] = None) -> CacheEntry:
+    """
+    Get the metadata and the cached stages of a URL.
+
+    Hot entries are served from the worker's local cache, anything else
+    from Redis in one round trip, or two for URLs that redirect.
+
+    Args:
+        url: The URL of the result.
+        stages: The stages to read, all of them by default.
+
+    Returns:
+        The metadata, or None on a miss, and the serialized value of the
+        requested stages the cache holds.
+    """
+    stages = sorted(stages or ExtractionStage)
+    meta_key = get_meta_key(url)
+
+    keys = [meta_key] + [get_stage_key(url, stage) for stage in stages]
+    if local_cache.get(meta_key) is None:
+        keys.append(get_alias_key(url))  # Only needed when the URL has no entry
+
+    meta, *values = await _get_values(keys)
+    target = values.pop() if len(values) > len(stages) else None
+
+    if meta is None and target is not None:
+        # The URL redirects, its stages are cached under the URL it led to
+        target = target.decode("utf-8")
+        meta, *values = await _get_values(
+            [get_meta_key(target)] + [get_stage_key(target, stage) for stage in stages]
+        )
+
+    if meta is None:
+        return None, {}
+
+    meta = json.loads(meta)
+    pieces = {
+        stage: value
+        for stage, value in zip(stages, values)
+        if value is not None and stage in meta["stages"]
+    }
+    return meta, pieces
+
+
+def get_stale_stages(meta: dict, stages: Iterable[str]) -> set:
+    """The cached stages among stages that are past their soft TTL"""
+    now = time.time()
+    return {
+        stage
+        for stage in stages
+        if stage in meta["stages"]
+        and now - meta["stages"][stage]["stored_at"] >= STAGE_SOFT_TTLS[stage]
+    }
+
+
+def can_revalidate(record: dict) -> bool:
+    """Whether a cached stage may be kept again without extracting it"""
+    return record.get("revalidations", 0) < STAGE_MAX_REVALIDATIONS
+
+
+def assemble_result(meta: dict, pieces: Dict[str, bytes]) -> bytes:
+    """
+    Build the serialized result holding the given stages, by splicing their
+    stored bytes together without decoding them.
+    """
+    stages = sorted(pieces)
+
+    counts = projection.count_categories({})
+    for stage in stages:
+        counts.update(meta["stages"][stage]["counts"])
+
+    head = {
+        "url": meta["url"],
+        "result_id": meta["result_id"],
+        "stages": stages,
+        "timestamp": meta["timestamp"],
+        "counts": counts,
+    }
+    if meta.get("extraction_time") is not None:
+        head["extraction_time"] = meta["extraction_time"]
+
+    return (
+        serialize_value(head)[:-1]
+        + b',"assets":'
+        + pieces.get(ExtractionStage.ASSETS, serialize_value(EMPTY_ASSETS))
+        + b',"colors":{"from_css":'
+        + pieces.get(ExtractionStage.CSS_COLORS, b"[]")
+        + b',"from_images":'
+        + pieces.get(ExtractionStage.IMAGE_COLORS, b"[]")
+        + b'},"fonts":'
+        + pieces.get(ExtractionStage.FONTS, b"[]")
+        + b"}"
+    )
+
+
+def load_result(meta: dict, pieces: Dict[str, bytes]) -> dict:
+    """Decode the result holding the given stages, to merge or project it"""
+    return json.loads(assemble_result(meta, pieces))
+
+
+async def get_result_url(result_id: str) -> Optional[str]:
+    """The URL a result ID was stored under, if it has not expired"""
+    return await redis_manager.get_cached_string_item(get_result_key(result_id))
+
+
+async def get_snapshot(url: str, document_hash: Optional[str] = None) -> Optional[bytes]:
+    """
+    Get the HTML snapshot of a URL.
+
+    Args:
+        url: The URL of the page.
+        document_hash: If given, the snapshot is only returned if it is
+            this version of the document.
+
+    Returns:
+        The document as served, or None.
+    """
+    (snapshot,) = await redis_manager.get_many([get_snapshot_key(url)])
+    snapshot = decode_value(snapshot)
+
+    if snapshot is None:
+        return None
+    if document_hash and hashlib.sha256(snapshot).hexdigest() != document_hash:
+        return None
+    return snapshot
+
+
+async def store_result(
+    url: str,
+    meta: Optional[dict],
+    pieces: Dict[str, bytes],
+    fresh: dict,
+    extraction_time: Optional[float] = None,
+    revalidated: Iterable[str] = (),
+    validators: Optional[dict] = None,
+) -> dict:
+    """
+    Cache the stages of a fresh extraction next to the cached ones of its URL.
+
+    Only the fresh stages are written. Revalidated stages keep their value
+    and are stamped as up to date.
+
+    Args:
+        url: The extracted URL.
+        meta: The metadata cached for the URL, if any.
+        pieces: The cached stages to return along with the fresh ones.
+        fresh: The result returned by the extractor.
+        extraction_time: How long the extraction took, in seconds.
+        revalidated: Cached stages found up to date without extracting them.
+        validators: The page validators of the revalidation, if one ran.
+
+    Returns:
+        The result holding the fresh stages and pieces, with its new result_id.
+    """
+    # Results are stored under the URL redirects led to
+    page_url = fresh.get("final_url") or (meta or {}).get("url") or url
+
+    records, pieces = {}, dict(pieces)
+    if meta and canonicalize_url(meta["url"]) == canonicalize_url(page_url):
+        records = dict(meta["stages"])
+    else:
+        pieces = {}  # Stored under another URL
+
+    # Move inline SVG markup and data URIs out of the result
+    if ExtractionStage.ASSETS in fresh["stages"]:
+        fresh["assets"] = await asset_service.store_inline_assets(fresh["assets"])
+
+    page_validators = fresh.get("validators") or validators or (meta or {}).get("validators")
+
+    now = time.time()
+    written, encoded = {}, {}
+    for stage in fresh["stages"]:
+        value = get_stage_value(fresh, stage)
+        key = get_stage_key(page_url, stage)
+        written[key] = pieces[stage] = serialize_value(value)
+        encoded[key] = encode_value(written[key])
+        records[stage] = {
+            "stored_at": now,
+            "validators": get_stage_validators(page_validators, stage),
+            "counts": count_stage(stage, value),
+            "size": len(encoded[key]),
+        }
+        if stage == ExtractionStage.ASSETS:
+            records[stage]["blobs"] = get_stage_blobs(stage, value)
+
+    for stage in set(revalidated) & set(records):
+        records[stage] = dict(
+            records[stage],
+            stored_at=now,
+            validators=get_stage_validators(page_validators, stage),
+            revalidations=records[stage].get("revalidations", 0) + 1,
+        )
+
+    # Blobs must outlive the assets that reference them, kept or rewritten
+    assets_record = records.get(ExtractionStage.ASSETS)
+    if assets_record and "blobs" not in assets_record and ExtractionStage.ASSETS in pieces:
+        # Stored before records listed their blobs
+        value = json.loads(pieces[ExtractionStage.ASSETS])
+        records[ExtractionStage.ASSETS] = assets_record = dict(
+            assets_record, blobs=get_stage_blobs(ExtractionStage.ASSETS, value)
+        )
+    if assets_record and assets_record.get("blobs"):
+        await asset_service.refresh_blobs(assets_record["blobs"], RESULT_HARD_TTL)
+
+    result_id = generate_result_id()
+    new_meta = {
+        "url": page_url,
+        "result_id": result_id,
+        "timestamp": datetime.now().isoformat(),
+        "extraction_time": extraction_time,
+        "validators": page_validators,
+        "stages": records,
+    }
+
+    meta_key = get_meta_key(page_url)
+    written[meta_key] = serialize_value(new_meta)
+    encoded[meta_key] = encode_value(written[meta_key])
+    items = dict(encoded)
+    items[get_result_key(result_id)] = page_url
+
+    redirected = canonicalize_url(url) != canonicalize_url(page_url)
+    if redirected:
+        items[get_alias_key(url)] = canonicalize_url(page_url)
+
+    # Cache the stages, their metadata, the result ID and any alias until
+    # they expire, and keep the stages that were not rewritten alive as long
+    await redis_manager.cache_many(items, ttl=RESULT_HARD_TTL)
+    await redis_manager.expire_many(
+        [get_stage_key(page_url, stage) for stage in records if stage not in fresh["stages"]],
+        ttl=RESULT_HARD_TTL,
+    )
+    snapshot_size = 0
+    if fresh.get("html"):
+        snapshot = encode_value(fresh["html"])
+        snapshot_size = len(snapshot)
+        await redis_manager.cache_many(
+            {get_snapshot_key(page_url): snapshot}, ttl=HTML_SNAPSHOT_TTL
+        )
+
+    # The other workers may hold the values this one replaces
+    for key, value in written.items():
+        local_cache.set(key, value, size=len(value))
+    invalidated = list(written)
+
+    if redirected:
+        # Stages the URL had before it redirected would shadow its alias
+        shadowing_keys = [get_meta_key(url)] + [
+            get_stage_key(url, stage) for stage in ExtractionStage
+        ]
+        await redis_manager.delete_keys(shadowing_keys)
+        for key in shadowing_keys:
+            local_cache.delete(key)
+        invalidated += shadowing_keys
+
+    await publish_invalidation(*invalidated)
+
+    # Sizes are the bytes stored in Redis, once encoded, and the blobs the
+    # entry keeps alive
+    size = len(encoded[meta_key]) + snapshot_size + sum(
+        record.get("size", 0) + sum(record.get("blobs", {}).values())
+        for record in records.values()
+    )
+    # Expired entries would count against the budget until evicted
+    await prune_index()
+    total_bytes = await index_entry(page_url, size)
+    if redirected:
+        await remove_from_index([url])
+    if total_bytes is not None:
+        await enforce_memory_budget(total_bytes)
+
+    result = load_result(new_meta, pieces)
+    result["cached"] = False
+    return result
+
+
+async def index_entry(url: str, size: int) -> Optional[int]:
+    """
+    Record a write of the entry of a URL in the indexes.
+
+    Returns:
+        The bytes all entries take, None while Redis is unavailable.
+    """
+    canonical_url = canonicalize_url(url)
+    now = time.time()
+
+    async def operation():
+        pipeline = redis_manager.redis_client.pipeline(transaction=False)
+        pipeline.zadd(INDEX_KEY, {canonical_url: now})
+        pipeline.zadd(
+            get_host_index_key(urlsplit(canonical_url).hostname or ""),
+            {canonical_url: now},
+        )
+        pipeline.eval(SET_SIZE_SCRIPT, 2, INDEX_SIZES_KEY, STATS_KEY, canonical_url, size)
+        return (await pipeline.execute())[-1]
+
+    return await redis_manager.run(operation)
+
+
+async def remove_from_index(urls: List[str]):
+    """Drop the entries of URLs from the indexes"""
+    canonical_urls = [canonicalize_url(url) for url in urls]
+    if not canonical_urls:
+        return
+
+    async def operation():
+        pipeline = redis_manager.redis_client.pipeline(transaction=False)
+        pipeline.zrem(INDEX_KEY, *canonical_urls)
+        for canonical_url in canonical_urls:
+            pipeline.zrem(
+                get_host_index_key(urlsplit(canonical_url).hostname or ""),
+                canonical_url,
+            )
+        pipeline.eval(REMOVE_SIZES_SCRIPT, 2, INDEX_SIZES_KEY, STATS_KEY, *canonical_urls)
+        return await pipeline.execute()
+
+    await redis_manager.run(operation)
+
+
+async def evict_entries(urls: List[str]):
+    """Delete the cached entries of URLs, everywhere they are held"""
+    metas = await redis_manager.get_many([get_meta_key(url) for url in urls])
+
+    keys = []
+    for url, meta in zip(urls, metas):
+        meta = decode_value(meta)
+        if meta is not None:
+            keys.append(get_result_key(json.loads(meta)["result_id"]))
+        keys += [get_meta_key(url), get_snapshot_key(url)]
+        keys += [get_stage_key(url, stage) for stage in ExtractionStage]
+
+    # Aliases of the evicted URLs are left to expire, they lead to a miss
+    await redis_manager.delete_keys(keys)
+    for key in keys:
+        local_cache.delete(key)
+    await publish_invalidation(*keys)
+    await remove_from_index(urls)
+
+
+async def enforce_memory_budget(total_bytes: int):
+    """
+    Evict entries while the cache is over CACHE_MAX_BYTES.
+
+    Among the oldest entries, the ones that weigh most for their age go
+    first: largest and oldest, by size times age.
+
+    Args:
+        total_bytes: The bytes all entries take.
+    """
+    if not CACHE_MAX_BYTES or total_bytes <= CACHE_MAX_BYTES:
+        return
+
+    target = CACHE_MAX_BYTES * CACHE_EVICTION_TARGET
+    while total_bytes > target:
+
+        async def read_candidates():
+            oldest = await redis_manager.redis_client.zrange(
+                INDEX_KEY, 0, CACHE_EVICTION_SAMPLE - 1, withscores=True
+            )
+            if not oldest:
+                return []
+            members = [member for member, _ in oldest]
+            sizes = await redis_manager.redis_client.hmget(INDEX_SIZES_KEY, members)
+            return [
+                (member.decode("utf-8"), stored_at, int(size or 0))
+                for (member, stored_at), size in zip(oldest, sizes)
+            ]
+
+        candidates = await redis_manager.run(read_candidates, default=[])
+        if not candidates:
+            return
+
+        now = time.time()
+        candidates.sort(key=lambda entry: entry[2] * (now - entry[1]), reverse=True)
+
+        evicted = []
+        for url, _, size in candidates:
+            if total_bytes <= target:
+                break
+            evicted.append(url)
+            total_bytes -= size
+
+        logger.info(f"Cache over its memory budget, evicting {len(evicted)} entries")
+        await evict_entries(evicted)
+
+
+async def prune_index():
+    """
+    Drop the entries that expired from the indexes.
+
+    Every write extends the expiry of all the stages of a URL, so an entry
+    last written more than RESULT_HARD_TTL ago is gone.
+    """
+    cutoff = time.time() - RESULT_HARD_TTL
+    expired = await redis_manager.run(
+        lambda: redis_manager.redis_client.zrangebyscore(INDEX_KEY, "-inf", cutoff),
+        default=[],
+    )
+    await remove_from_index([member.decode("utf-8") for member in expired])
+
+
+async def list_cached_results(limit: int, offset: int, host: Optional[str] = None) -> dict:
+    """
+    List the cached URLs, most recently stored first.
+
+    Args:
+        limit: Maximum number of results to return.
+        offset: Number of results to skip.
+        host: Only list the URLs of this host.
+
+    Returns:
+        A dict matching CachedResultsList.
+    """
+    await prune_index()
+    index_key = get_host_index_key(host) if host else INDEX_KEY
+
+    async def list_page():
+        pipeline = redis_manager.redis_client.pipeline(transaction=False)
+        pipeline.zcard(index_key)
+        pipeline.zrevrange(index_key, offset, offset + limit - 1)
+        return await pipeline.execute()
+
+    total, members = await redis_manager.run(list_page, default=(0, []))
+    urls = [member.decode("utf-8") for member in members]
+
+    results = []
+    if urls:
+
+        async def read_entries():
+            pipeline = redis_manager.redis_client.pipeline(transaction=False)
+            pipeline.mget([get_meta_key(url) for url in urls])
+            pipeline.hmget(INDEX_SIZES_KEY, urls)
+            return await pipeline.execute()
+
+        metas, sizes = await redis_manager.run(
+            read_entries, default=([None] * len(urls), [None] * len(urls))
+        )
+
+        for meta, size in zip(metas, sizes):
+            meta = decode_value(meta)
+            if meta is None:
+                continue  # Evicted since it was listed
+
+            meta = json.loads(meta)
+            results.append(
+                {
+                    "id": meta["result_id"],
+                    "url": meta["url"],
+                    "timestamp": meta["timestamp"],
+                    "stages": sorted(meta["stages"]),
+                    "size": int(size) if size is not None else None,
+                }
+            )
+
+    return {"total": total, "limit": limit, "offset": offset, "results": results}
+
+
+def record_lookup(outcome: str):
+    """Count a cache lookup of this worker: "hits", "stale_hits" or "misses"."""
+    pending_stats[outcome] += 1
+
+
+async def flush_stats():
+    """Add the lookups counted by this worker to the shared counts"""
+    if not pending_stats:
+        return
+
+    counts = dict(pending_stats)
+    pending_stats.clear()
+
+    async def operation():
+        pipeline = redis_manager.redis_client.pipeline(transaction=False)
+        for outcome, count in counts.items():
+            pipeline.hincrby(STATS_KEY, outcome, count)
+        return await pipeline.execute()
+
+    await redis_manager.run(operation)
+
+
+async def flush_stats_periodically():
+    """Flush the lookup counts every CACHE_STATS_FLUSH_INTERVAL, for the lifetime of the application"""
+    while True:
+        await asyncio.sleep(CACHE_STATS_FLUSH_INTERVAL)
+        await flush_stats()
+
+
+async def get_cache_stats() -> dict:
+    """
+    Report the size, hit ratio and age distribution of the cache, from the
+    indexes and counters only.
+
+    Returns:
+        A dict matching CacheStats.
+    """
+    await flush_stats()
+    await prune_index()
+    now = time.time()
+
+    async def operation():
+        pipeline = redis_manager.redis_client.pipeline(transaction=False)
+        pipeline.zcard(INDEX_KEY)
+        pipeline.hgetall(STATS_KEY)
+        for _, age in AGE_BUCKETS:
+            pipeline.zcount(INDEX_KEY, now - age, "+inf")
+        return await pipeline.execute()
+
+    entries, counters, *younger_than = await redis_manager.run(
+        operation, default=[0, {}] + [0] * len(AGE_BUCKETS)
+    )
+    counters = {field.decode("utf-8"): int(value) for field, value in counters.items()}
+
+    # Turn the counts of entries younger than every bound into buckets
+    age_distribution, previous = {}, 0
+    for (bucket, _), count in zip(AGE_BUCKETS, younger_than):
+        age_distribution[bucket] = count - previous
+        previous = count
+    age_distribution["over_7d"] = entries - previous
+
+    hits = counters.get("hits", 0)
+    stale_hits = counters.get("stale_hits", 0)
+    misses = counters.get("misses", 0)
+    lookups = hits + stale_hits + misses
+
+    return {
+        "entries": entries,
+        "total_bytes": counters.get("bytes", 0),
+        "hits": hits,
+        "stale_hits": stale_hits,
+        "misses": misses,
+        "hit_ratio": (hits + stale_hits) / lookups if lookups else None,
+        "age_distribution": age_distribution,
+    }
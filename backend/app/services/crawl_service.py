@@ -0,0 +1,356 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import traceback
+from contextlib import asynccontextmanager, nullcontext
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import validators
+from fastapi.responses import StreamingResponse
+
+from app.root.cpu_pool import cpu_pool
+from app.root.http_client import http_client
+from app.schemas.extractor_schema import (
+    DEFAULT_EXTRACTION_STAGES,
+    CrawlResponse,
+    ExtractionStage,
+)
+from app.services import cache_service, extractor_service
+from app.services.utils import extractor, page_analysis, projection
+from app.services.utils.canonical_url import canonicalize_url
+
+
+logger = logging.getLogger("crawl-service")
+
+# Upper bounds of what a crawl may ask for
+CRAWL_MAX_DEPTH = int(os.environ.get("CRAWL_MAX_DEPTH", 3))
+CRAWL_MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", 50))
+# Pages of a crawl extracted at once
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", 3))
+# Politeness towards the crawled site: requests in flight per host, and the
+# time between the start of two of them
+CRAWL_PER_HOST_CONCURRENCY = int(os.environ.get("CRAWL_PER_HOST_CONCURRENCY", 2))
+CRAWL_HOST_DELAY = float(os.environ.get("CRAWL_HOST_DELAY", 1.0))  # Seconds
+
+
+def get_site_host(url: str) -> str:
+    """The host of a URL, without its www. prefix"""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def is_same_site(url: str, site_host: str) -> bool:
+    """Whether a URL is on a site, or on one of its subdomains"""
+    host = get_site_host(url)
+    return host == site_host or host.endswith(f".{site_host}")
+
+
+class SiteAggregate:
+    """
+    The colors, fonts and assets of the pages of a site, merged, with the
+    number of pages every item was found on.
+    """
+
+    def __init__(self) -> None:
+        self.colors: Dict[str, Dict[str, dict]] = {"from_css": {}, "from_images": {}}
+        self.fonts: Dict[Tuple[str, str], dict] = {}
+        self.assets: Dict[str, Dict[str, int]] = {
+            category: {} for category in projection.ASSET_CATEGORIES
+        }
+        self.blobs: Dict[str, dict] = {}
+
+    @staticmethod
+    def _count(items: Dict, key, item: dict):
+        if key in items:
+            items[key]["pages"] += 1
+        else:
+            items[key] = {**item, "pages": 1}
+
+    def add(self, result: dict):
+        """Merge the result of a page. Items it lists twice count once."""
+        for source, colors in result.get("colors", {}).items():
+            for color in {color["hex"].lower(): color for color in colors}.values():
+                self._count(self.colors[source], color["hex"].lower(), color)
+
+        fonts = {(font["name"], font["type"]): font for font in result.get("fonts", [])}
+        for key, font in fonts.items():
+            self._count(self.fonts, key, font)
+
+        assets = result.get("assets", {})
+        for category in projection.ASSET_CATEGORIES:
+            for url in set(assets.get(category, [])):
+                self.assets[category][url] = self.assets[category].get(url, 0) + 1
+        self.blobs.update(assets.get("blobs", {}))
+
+    def result(self) -> dict:
+        """The merged items, the ones found on most pages first"""
+
+        def by_pages(items):
+            return sorted(items, key=lambda item: item["pages"], reverse=True)
+
+        return {
+            "colors": {
+                source: by_pages(colors.values()) for source, colors in self.colors.items()
+            },
+            "fonts": by_pages(self.fonts.values()),
+            "assets": {
+                **{
+                    category: by_pages(
+                        {"url": url, "pages": pages} for url, pages in urls.items()
+                    )
+                    for category, urls in self.assets.items()
+                },
+                "blobs": self.blobs,
+            },
+        }
+
+
+class SiteCrawl:
+    """
+    Crawls a site from a URL, following same-site links breadth first.
+
+    Every page goes through extract_stages, so cached pages are reused and
+    extracted ones cached. Pages that need a browser share one browser
+    context for the whole crawl. The frontier holds every URL once, by its
+    canonical form, and stops growing at max_pages.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        stages: Set[str],
+        max_depth: int,
+        max_pages: int,
+        force_refresh: bool = False,
+        on_event: Optional[Callable[[dict], None]] = None,
+    ) -> None:
+        self.url = url
+        self.stages = stages
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.force_refresh = force_refresh
+        self.on_event = on_event or (lambda event: None)
+        self.site_host = get_site_host(url)
+
+        self.frontier: asyncio.Queue = asyncio.Queue()
+        self.seen: Set[str] = set()
+        self.pages: List[dict] = []
+        self.aggregate = SiteAggregate()
+        self.browser_context = None
+
+        self.host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.host_next_request: Dict[str, float] = {}
+
+    def _schedule(self, url: str, depth: int) -> bool:
+        canonical_url = canonicalize_url(url)
+        if canonical_url in self.seen or len(self.seen) >= self.max_pages:
+            return False
+
+        self.seen.add(canonical_url)
+        self.frontier.put_nowait((url, depth))
+        return True
+
+    @asynccontextmanager
+    async def _polite(self, url: str):
+        """Hold a request slot of the host of a URL, spaced from the last request"""
+        host = (urlsplit(url).hostname or "").lower()
+        slots = self.host_slots.setdefault(
+            host, asyncio.Semaphore(CRAWL_PER_HOST_CONCURRENCY)
+        )
+        async with slots:
+            now = time.monotonic()
+            start_at = max(now, self.host_next_request.get(host, 0))
+            self.host_next_request[host] = start_at + CRAWL_HOST_DELAY
+            await asyncio.sleep(start_at - now)
+            yield
+
+    async def run(self) -> dict:
+        """
+        Crawl the site.
+
+        Returns:
+            A dict matching CrawlResponse.
+        """
+        browser_context = (
+            extractor.shared_browser_context()
+            if self.stages & extractor.BROWSER_STAGES
+            else nullcontext()
+        )
+
+        async with browser_context as context:
+            self.browser_context = context
+            self._schedule(self.url, 0)
+
+            workers = [
+                asyncio.create_task(self._work()) for _ in range(CRAWL_CONCURRENCY)
+            ]
+            try:
+                await self.frontier.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        return {
+            "url": self.url,
+            "stages": sorted(self.stages),
+            "pages": self.pages,
+            **self.aggregate.result(),
+        }
+
+    async def _work(self):
+        while True:
+            url, depth = await self.frontier.get()
+            try:
+                await self._crawl_page(url, depth)
+            except Exception as e:
+                traceback.print_exc()
+                self._add_page({"url": url, "depth": depth, "error": str(e)})
+            finally:
+                self.frontier.task_done()
+
+    def _add_page(self, page: dict, result: Optional[dict] = None):
+        self.pages.append(page)
+        self.on_event({"event": "page", "page": page, "result": result})
+
+    async def _crawl_page(self, url: str, depth: int):
+        def on_progress(event: dict):
+            # Pages are sent whole, not item by item
+            if event["event"] == "progress":
+                self.on_event({**event, "url": url})
+
+        hit = await extractor_service.lookup_cache(url, self.stages, self.force_refresh)
+        if hit:
+            # Cached pages cost the site nothing, they skip the politeness limits
+            result = json.loads(hit[1])
+            result["cached"] = True
+        else:
+            async with self._polite(url):
+                result = await extractor_service.extract_stages(
+                    url,
+                    self.stages,
+                    self.force_refresh,
+                    on_event=on_progress,
+                    browser_context=self.browser_context,
+                )
+
+        if "error" in result:
+            self._add_page({"url": url, "depth": depth, "error": result["error"]})
+            return
+
+        self.aggregate.add(result)
+        result["counts"] = projection.count_categories(result)
+        self._add_page(
+            {
+                "url": url,
+                "depth": depth,
+                "result_id": result.get("result_id"),
+                "cached": bool(result.get("cached")),
+            },
+            result,
+        )
+
+        if depth < self.max_depth and len(self.seen) < self.max_pages:
+            for link in await self._get_links(result["url"]):
+                if is_same_site(link, self.site_host):
+                    self._schedule(link, depth + 1)
+
+    async def _get_links(self, page_url: str) -> List[str]:
+        """The links of a page, read from its cached snapshot when there is one"""
+        document = await cache_service.get_snapshot(page_url)
+
+        if document is None:
+            try:
+                async with self._polite(page_url):
+                    response = await http_client.get(
+                        page_url, headers=extractor.PAGE_HEADERS, timeout=15.0
+                    )
+                    response.raise_for_status()
+                page_url, document = str(response.url), response.content
+            except Exception as e:
+                logger.warning(f"Could not read the links of {page_url}: {str(e)}")
+                return []
+
+        return await cpu_pool.run(page_analysis.extract_links, page_url, document)
+
+
+async def crawl_site_sse(
+    url: str,
+    max_depth: int,
+    max_pages: int,
+    force_refresh: bool = False,
+    include: Optional[List[ExtractionStage]] = None,
+) -> StreamingResponse:
+    """
+    Crawl a site, streaming every page as it completes and the merged result
+    at the end.
+
+    Args:
+        url: The URL to start from.
+        max_depth: Number of links to follow from the start URL.
+        max_pages: Number of pages to crawl at most.
+        force_refresh: Extract every page even if the cache holds it.
+        include: Stages to extract from every page.
+
+    Returns:
+        The streaming response.
+    """
+    if not validators.url(url):
+        return StreamingResponse(
+            content=extractor_service.stream_error_message("Invalid URL format"),
+            media_type="text/event-stream",
+        )
+
+    crawl = SiteCrawl(
+        url,
+        set(include or DEFAULT_EXTRACTION_STAGES),
+        min(max_depth, CRAWL_MAX_DEPTH),
+        min(max_pages, CRAWL_MAX_PAGES),
+        force_refresh,
+    )
+    return StreamingResponse(content=stream_crawl(crawl), media_type="text/event-stream")
+
+
+async def stream_crawl(crawl: SiteCrawl):
+    """Stream the events of a crawl until it completes"""
+    queue: asyncio.Queue = asyncio.Queue()
+    crawl.on_event = queue.put_nowait
+    crawl_task = None
+
+    try:
+        yield f"data: {json.dumps({'event': 'start', 'url': crawl.url})}\n\n"
+
+        crawl_task = asyncio.create_task(crawl.run())
+        # Queued after the last page, so nothing has to poll for it
+        crawl_task.add_done_callback(queue.put_nowait)
+
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), timeout=extractor_service.SSE_KEEPALIVE_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                # Send a keepalive comment to prevent timeout
+                yield ": keepalive\n\n"
+                continue
+
+            if message is crawl_task:
+                break
+            yield f"data: {json.dumps(message)}\n\n"
+
+        try:
+            result = CrawlResponse(**crawl_task.result())
+            yield f'data: {{"event":"complete","result":{result.model_dump_json()}}}\n\n'
+        except Exception as e:
+            traceback.print_exc()
+            yield f"data: {json.dumps({'event': 'error', 'message': f'Crawl failed: {str(e)}'})}\n\n"
+
+        # Final message indicating stream is closing
+        yield f"data: {json.dumps({'event': 'end'})}\n\n"
+    finally:
+        # The client went away, stop crawling for it
+        if crawl_task and not crawl_task.done():
+            crawl_task.cancel()
@@ -1,153 +1,842 @@
 import asyncio
-from datetime import datetime
 import json
+import os
 import time
 import logging
 import traceback
-import uuid
-from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
+from collections import Counter, OrderedDict, deque
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import validators
 
-from app.root.redis_manager import RedisManager
-from app.schemas.extractor_schema import ExtractorResponse, URLRequest
-
-from app.services.utils import extractor
+from app.root.cpu_pool import cpu_pool
+from app.root.single_flight import SingleFlight, parse_flight_event_id
+from app.schemas.extractor_schema import (
+    DEFAULT_EXTRACTION_STAGES,
+    BatchRequest,
+    CachedResultsList,
+    CacheStats,
+    CpuPoolStats,
+    ExtractionStage,
+    ExtractorResponse,
+    ItemBatchEvent,
+    JobInfo,
+    JobStatus,
+    ProgressStage,
+    URLRequest,
+)
+
+from app.services import cache_service, job_service
+from app.services.utils import extractor, projection
+from app.services.utils.progress import ProgressAggregator
+from app.services.utils.canonical_url import canonicalize_url
 
 
 logger = logging.getLogger("extractor-router")
 
-redis_manager = RedisManager()
+# Extractions run at once by this worker, user requests and refreshes alike
+EXTRACTION_CONCURRENCY = int(os.environ.get("EXTRACTION_CONCURRENCY", 4))
+extraction_slots = asyncio.Semaphore(EXTRACTION_CONCURRENCY)
+
+# Background refreshes by URL and stages, also keeps their tasks referenced
+background_refreshes: Dict[str, asyncio.Task] = {}
+
+# How long past its deadline a request waits for an extraction worker to
+# return its partial result, before answering without it
+JOB_DEADLINE_GRACE = float(os.environ.get("JOB_DEADLINE_GRACE", 2.0))  # Seconds
+
+# URLs of a batch extracted at once, overall and per host
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 8))
+BATCH_PER_HOST_CONCURRENCY = int(os.environ.get("BATCH_PER_HOST_CONCURRENCY", 2))
+
+# Idle time after which an SSE stream sends a comment, so that proxies do not
+# close it while a long stage runs
+SSE_KEEPALIVE_INTERVAL = float(os.environ.get("SSE_KEEPALIVE_INTERVAL", 15))  # Seconds
+# Most items an SSE batch event carries when a whole list is sent at once
+SSE_BATCH_SIZE = int(os.environ.get("SSE_BATCH_SIZE", 200))
+
+
+def get_flight_notice(result: dict) -> dict:
+    """What the leader of an extraction tells the workers following it"""
+    if "error" in result:
+        return {"error": result["error"]}
+    notice = {"url": result["url"], "stages": result["stages"]}
+    if result.get("partial"):
+        notice["unfinished_stages"] = result["unfinished_stages"]
+    return notice
+
+
+async def load_flight_result(notice: dict) -> dict:
+    """
+    Load the result an extraction led by another worker stored. Of a partial
+    result, only the stages that finished were stored.
+    """
+    if "error" in notice:
+        return notice
+
+    unfinished = notice.get("unfinished_stages")
+    if unfinished and not notice["stages"]:
+        return get_deadline_result(notice["url"], unfinished)
+
+    meta, pieces = await cache_service.get_cached_entry(notice["url"], notice["stages"])
+    if meta is None or len(pieces) < len(notice["stages"]):
+        return {"error": "Extraction result is no longer available"}
+
+    result = cache_service.load_result(meta, pieces)
+    result["cached"] = False
+    if unfinished:
+        result["partial"] = True
+        result["unfinished_stages"] = unfinished
+    return result
 
 
-def generate_result_id() -> str:
-    """Generate a unique ID for extraction results"""
-    return str(uuid.uuid4())
+def get_deadline(deadline_ms: Optional[int]) -> Optional[float]:
+    """The epoch time a request with a time budget of deadline_ms must end by"""
+    if deadline_ms is None:
+        return None
+    return time.time() + deadline_ms / 1000
 
 
-def get_result_key(result_id: str) -> str:
+def get_deadline_result(url: str, unfinished_stages) -> dict:
+    """The result of an extraction whose deadline passed before any stage finished"""
+    return {
+        "url": url,
+        "stages": [],
+        "partial": True,
+        "unfinished_stages": sorted(unfinished_stages),
+    }
+
+
+def get_flight_key(url: str, stages: Iterable[str]) -> str:
+    """What extractions of the same stages of a URL are deduplicated on"""
+    return f"{canonicalize_url(url)}|{','.join(sorted(stages))}"
+
+
+extraction_flights = SingleFlight(
+    "extract", to_notice=get_flight_notice, from_notice=load_flight_result
+)
+
+
+async def extract_stages(
+    url: str,
+    stages: set,
+    force_refresh: bool = False,
+    on_event: Optional[Callable[[dict], None]] = None,
+    browser_context=None,
+    deadline: Optional[float] = None,
+) -> dict:
     """
-    Generate a Redis key for the given result ID.
+    Get some stages of a URL, extracting the ones that are missing or stale
+    and caching them next to the others.
+
+    Concurrent requests for the same URL and stages share one extraction,
+    within a worker and across workers, and all receive its progress events.
+    Requests with a deadline only share it with requests with the same one,
+    forced refreshes only with forced refreshes, and requests with a browser
+    context with no one.
+
+    When the deadline passes before every stage is extracted, the result is
+    partial: the stages that finished are cached and returned, and what the
+    others found so far is returned without being cached.
 
     Args:
-        result_id: The result ID to generate a key for.
+        url: The URL to extract.
+        stages: The stages to return.
+        force_refresh: Extract every stage even if the cache holds it.
+        on_event: Receives the progress events of the extraction.
+        browser_context: Browser context to render the page in, instead of
+            launching a browser, see extractor.shared_browser_context.
+        deadline: Epoch time the extraction must end by, if any.
 
     Returns:
-        A string representing the Redis key.
+        The result holding the stages, or a dict with an "error" message.
     """
-    return f"result:{result_id}"
 
+    async def work(emit: Callable[[dict], None]) -> dict:
+        meta, pieces = await cache_service.get_cached_entry(url, stages)
+        stale = cache_service.get_stale_stages(meta, pieces) if meta else set()
+
+        # A flight may have stored these stages while this one was waiting
+        if not force_refresh and set(pieces) == stages and not stale:
+            result = cache_service.load_result(meta, pieces)
+            result["cached"] = True
+            return result
+
+        def progress_callback(stage, data):
+            emit({"event": "progress", "stage": stage, "data": data})
+
+        def items_callback(event, data):
+            emit({"event": event, **data})
+
+        to_extract = set(stages) if force_refresh else (stages - set(pieces)) | stale
+
+        # Cached stages whose inputs did not change are kept, not extracted again
+        revalidated, validators = set(), None
+        held = {
+            stage
+            for stage in to_extract & set(pieces)
+            if cache_service.can_revalidate(meta["stages"][stage])
+        }
+        if held and meta.get("validators"):
+            progress_callback(ProgressStage.REVALIDATING, {"url": url})
+            validators = await extractor.revalidate_page(
+                url, meta["validators"], deadline
+            )
+
+        if validators is not None:
+            for stage in held:
+                previous = meta["stages"][stage].get("validators")
+                if previous and stage not in extractor.get_changed_stages(
+                    previous, validators
+                ):
+                    revalidated.add(stage)
+            to_extract -= revalidated
+
+        kept = {stage: piece for stage, piece in pieces.items() if stage not in to_extract}
+
+        if not to_extract:
+            logger.info(f"{url} did not change, keeping the cached stages")
+            progress_callback(ProgressStage.PAGE_UNCHANGED, {})
+            return await cache_service.store_result(
+                url, meta, kept, {"stages": []}, None, revalidated, validators
+            )
 
-def get_url_key(url: str) -> str:
+        # Stages that need no browser can work from the stored document
+        snapshot = None
+        if not to_extract & extractor.BROWSER_STAGES:
+            snapshot = await cache_service.get_snapshot(
+                meta["url"] if meta else url,
+                validators and validators.get("document_hash"),
+            )
+
+        # Resource events are summarized, a few per second at most
+        progress = ProgressAggregator(progress_callback)
+        async with extraction_slots:
+            start_time = time.time()
+            try:
+                fresh = await extractor.stream_extraction_from_url(
+                    url,
+                    progress.send,
+                    to_extract,
+                    snapshot=snapshot,
+                    browser_context=browser_context,
+                    deadline=deadline,
+                    items_callback=items_callback,
+                )
+            finally:
+                progress.flush()
+            extraction_time = time.time() - start_time
+
+        logger.info(f"Extraction completed in {extraction_time:.2f} seconds")
+
+        # Validate the result to prevent NoneType errors
+        if not fresh:
+            return {"error": "Extraction returned no result"}
+        if "error" in fresh:
+            return fresh
+
+        if snapshot is not None:
+            # The page was not fetched, what it was fetched with stays
+            for field in ("final_url", "validators", "html"):
+                fresh.pop(field, None)
+
+        # Only the stages that finished before the deadline are cached
+        unfinished = fresh.pop("unfinished_stages", [])
+        fresh.pop("partial", None)
+
+        if unfinished and not fresh["stages"] and not kept:
+            result = {"url": url, "stages": []}  # Nothing to store
+        else:
+            # Store next to the cached stages and get ID
+            result = await cache_service.store_result(
+                url, meta, kept, fresh, extraction_time, revalidated, validators
+            )
+
+        if unfinished:
+            for stage in unfinished:
+                cache_service.set_stage_value(
+                    result, stage, cache_service.get_stage_value(fresh, stage)
+                )
+            result["partial"] = True
+            result["unfinished_stages"] = unfinished
+        return result
+
+    if browser_context is not None:
+        # The context belongs to the caller, the extraction must not outlive
+        # it on behalf of callers that joined the flight
+        return await work(on_event or (lambda event: None))
+
+    key = get_flight_key(url, stages)
+    # A flight returns what is cached as soon as it can, forced refreshes
+    # must not join one
+    if force_refresh:
+        key += "|refresh"
+    if deadline is not None:
+        key += f"|{int(deadline)}"
+    return await extraction_flights.run(key, work, on_event)
+
+
+async def run_extraction(
+    url: str,
+    stages: set,
+    force_refresh: bool = False,
+    on_event: Optional[Callable[[dict], None]] = None,
+    deadline: Optional[float] = None,
+) -> dict:
+    """
+    Get some stages of a URL like extract_stages does, on the extraction
+    workers when USE_JOB_QUEUE is set. Runs in this process when it is not,
+    or while the queue is unavailable.
     """
-    Generate a Redis key for the given URL.
+    if job_service.USE_JOB_QUEUE:
+        job_id = await job_service.submit_extraction(
+            url, stages, force_refresh, deadline
+        )
+        if job_id and deadline is None:
+            return await follow_job(job_id, on_event)
+        if job_id:
+            # The worker ends the extraction by the deadline, if one picks
+            # the job up in time
+            try:
+                return await asyncio.wait_for(
+                    follow_job(job_id, on_event),
+                    timeout=extractor.get_remaining(deadline, None) + JOB_DEADLINE_GRACE,
+                )
+            except asyncio.TimeoutError:
+                return get_deadline_result(url, stages)
+
+    return await extract_stages(url, stages, force_refresh, on_event, deadline=deadline)
+
+
+async def follow_job(
+    job_id: str,
+    on_event: Optional[Callable[[dict], None]] = None,
+    last_event_id: Optional[str] = None,
+) -> dict:
+    """Wait for an extraction job and load the result it stored"""
+    notice = await job_service.follow_extraction(job_id, on_event, last_event_id)
+    return await load_flight_result(notice)
+
+
+def refresh_in_background(url: str, stages: set):
+    """
+    Refresh the stale stages of a result without making the request that
+    found them wait.
+
+    The refresh joins any extraction of the same stages in flight, and waits
+    for an extraction slot like user requests do.
+    """
+    # Refreshes of other stages of the URL are other extractions
+    key = get_flight_key(url, stages)
+    if key in background_refreshes:
+        return
+
+    async def refresh():
+        try:
+            if job_service.USE_JOB_QUEUE and await job_service.submit_extraction(
+                url, stages
+            ):
+                return  # An extraction worker refreshes it
+
+            result = await extract_stages(url, set(stages))
+            if "error" in result:
+                logger.warning(f"Refresh of {url} failed: {result['error']}")
+        except Exception as e:
+            logger.error(f"Refresh of {url} failed: {str(e)}")
+        finally:
+            background_refreshes.pop(key, None)
+
+    background_refreshes[key] = asyncio.create_task(refresh())
+
+
+async def lookup_cache(
+    url: str, stages: set, force_refresh: bool = False
+) -> Optional[Tuple[dict, bytes, bool]]:
+    """
+    Look a request up in the cache, counting the lookup and refreshing the
+    stale stages of a hit in the background.
 
     Args:
-        url: The URL to generate a key for.
+        url: The requested URL.
+        stages: The requested stages.
+        force_refresh: The request skips the cache.
 
     Returns:
-        A string representing the Redis key.
+        On a hit, the metadata, the serialized result and whether it is
+        stale. None on a miss.
     """
-    return f"url:{url}"
+    if force_refresh:
+        return None
 
+    meta, pieces = await cache_service.get_cached_entry(url, stages)
+    if meta is None or set(pieces) != stages:
+        cache_service.record_lookup("misses")
+        return None
 
-async def extract_assets(url_request: URLRequest) -> ExtractorResponse:
+    stale = cache_service.get_stale_stages(meta, stages)
+    if stale:
+        refresh_in_background(url, stale)
+    cache_service.record_lookup("stale_hits" if stale else "hits")
 
-    # Validate URL
-    if not validators.url(url_request.url):
-        raise HTTPException(status_code=400, detail="Invalid URL format")
+    return meta, cache_service.assemble_result(meta, pieces), bool(stale)
+
+
+def parse_projection(fields: Optional[str], cursor: Optional[str]):
+    """
+    Validate the projection and pagination parameters of a request.
 
+    Args:
+        fields: The comma separated fields= parameter.
+        cursor: The cursor of the requested page.
+
+    Returns:
+        The parsed fields and the per-category offsets of the cursor.
+    """
     try:
-        # Check if we have cached results for this URL
-        if not url_request.force_refresh:
+        return projection.parse_fields(fields), projection.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            url_key = get_url_key(url_request.url)
-            cached_result = redis_manager.get_cached_json_item(url_key)
 
-            if cached_result:
-                logger.info(f"Using cached result for URL: {url_request.url}")
-                cached_result["cached"] = True
-                return cached_result
+def build_response(
+    result: dict,
+    fields: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    offsets: Optional[Dict[str, int]] = None,
+) -> Union[ExtractorResponse, JSONResponse]:
+    """
+    Build the response for a result.
 
-        # No cache or force refresh url_requested, perform extraction
-        start_time = time.time()
-        result = await extractor.extract_from_url(url_request.url)
-        extraction_time = time.time() - start_time
+    Projected and paginated responses are cut down before serialization and
+    returned as JSON directly, skipping validation of the full model.
+    """
+    if fields is None and limit is None and not offsets:
+        result["counts"] = projection.count_categories(result)
+        return ExtractorResponse(**result)
 
-        logger.info(f"Extraction completed in {extraction_time:.2f} seconds")
+    return JSONResponse(
+        content=projection.project_result(result, fields, limit, offsets)
+    )
 
-        if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
 
-        # Add timestamp to the result
-        result["timestamp"] = datetime.now().isoformat()
+def build_cached_response(
+    serialized: bytes,
+    fields: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    offsets: Optional[Dict[str, int]] = None,
+    zero_copy: bool = True,
+    stale: bool = False,
+) -> Union[ExtractorResponse, JSONResponse, Response]:
+    """
+    Build the response for a cache hit.
 
-        # Store result in cache and get a result_id
-        result_id = generate_result_id()
-        url_key = get_url_key(url_request.url)
+    Unless part of the result was asked for, the bytes assembled from the
+    stored stages are returned as they are, with only the cached and stale
+    flags added: no decoding, validation or encoding happens. zero_copy=False
+    returns a model, for callers that are not HTTP handlers.
+    """
+    if zero_copy and fields is None and limit is None and not offsets:
+        return Response(
+            content=cache_service.mark_cached(serialized, stale),
+            media_type="application/json",
+        )
 
-        result["url"] = url_request.url
-        result["extraction_time"] = extraction_time
-        result["result_id"] = result_id
+    result = json.loads(serialized)
+    result["cached"] = True
+    result["stale"] = stale
+    return build_response(result, fields, limit, offsets)
 
-        redis_manager.cache_json_item(
-            url_key,
-            result,
-            ttl=3600 * 12,
-        )  # Cache the result for 12 hours
 
-        redis_manager.cache_string_item(
-            get_result_key(result_id),
-            url_request.url,
-            ttl=3600 * 12,
-        )  # Cache the result for 12 hours
+async def run_until_disconnect(request: Optional[Request], coroutine):
+    """
+    Await a coroutine on behalf of an HTTP request, cancelling it when the
+    client disconnects first, so that the browser it drives is closed instead
+    of working for nobody.
+
+    Raises:
+        HTTPException: 499 when the client disconnected.
+    """
+    if request is None:
+        return await coroutine
 
-        result["cached"] = False
+    async def wait_for_disconnect():
+        # The body was read already, what comes next is the disconnect
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
 
-        return ExtractorResponse(**result)
+    task = asyncio.ensure_future(coroutine)
+    watcher = asyncio.create_task(wait_for_disconnect())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    if task.cancelled():
+        logger.info("Client disconnected, extraction cancelled")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
+
+async def extract_assets(
+    url_request: URLRequest,
+    fields: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    zero_copy: bool = False,
+    request: Optional[Request] = None,
+) -> Union[ExtractorResponse, JSONResponse, Response]:
+
+    # Validate URL
+    if not validators.url(url_request.url):
+        raise HTTPException(status_code=400, detail="Invalid URL format")
+
+    parsed_fields, offsets = parse_projection(fields, cursor)
+
+    try:
+        stages = set(url_request.include)
+        hit = await lookup_cache(url_request.url, stages, url_request.force_refresh)
+
+        if hit:
+            logger.info(f"Using cached result for URL: {url_request.url}")
+            _, serialized, stale = hit
+            return build_cached_response(
+                serialized, parsed_fields, limit, offsets, zero_copy, stale
+            )
+
+        # No cache, missing stages or force refresh requested, perform extraction
+        result = await run_until_disconnect(
+            request,
+            run_extraction(
+                url_request.url,
+                stages,
+                force_refresh=url_request.force_refresh,
+                deadline=get_deadline(url_request.deadline_ms),
+            ),
+        )
+
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+
+        return build_response(result, parsed_fields, limit, offsets)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Extraction error: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
-async def get_cached_result_by_id(result_id: str) -> ExtractorResponse:
+async def get_cached_result_by_id(
+    result_id: str,
+    fields: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Union[ExtractorResponse, JSONResponse, Response]:
     """
     Get a cached result by its ID.
 
     Args:
         result_id: The unique ID of the cached result.
+        fields: Comma separated fields to return, all of them by default.
+        limit: Maximum number of items per asset category.
+        cursor: Cursor of the page of assets to return.
 
     Returns:
-        The cached result as an ExtractorResponse object.
+        The cached result as an ExtractorResponse object, or its projection.
     """
-    try:
+    parsed_fields, offsets = parse_projection(fields, cursor)
 
-        # Get the cache result key
-        result_key = get_result_key(result_id)
+    try:
 
         # Check if we have a mapping from result_id to URL
-        url = redis_manager.get_cached_string_item(result_key)
+        url = await cache_service.get_result_url(result_id)
+
         if not url:
-            raise HTTPException(status_code=404, detail="Result not found")
+            # The ID may be the one of an extraction job
+            job = await job_service.get_job_info(result_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="Result not found")
+            if job.status == JobStatus.FAILED:
+                raise HTTPException(status_code=400, detail=job.error)
+            if job.status != JobStatus.COMPLETED:
+                return JSONResponse(status_code=202, content=job.model_dump(mode="json"))
+            url = await cache_service.get_result_url(job.result_id)
+            if not url:
+                raise HTTPException(status_code=404, detail="Result not found")
 
         # If found, get the actual result using the url
-        cached_result = redis_manager.get_cached_json_item(get_url_key(url))
+        meta, pieces = await cache_service.get_cached_entry(url)
 
-        if cached_result:
+        if pieces:
             # If found, return the actual result using the ID
-            cached_result["cached"] = True
-            return ExtractorResponse(**cached_result)
+            return build_cached_response(
+                cache_service.assemble_result(meta, pieces),
+                parsed_fields,
+                limit,
+                offsets,
+                stale=bool(cache_service.get_stale_stages(meta, pieces)),
+            )
 
         raise HTTPException(status_code=404, detail="Result not found")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving cached result: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 
+def encode_batch_line(index: int, url: str, **fields) -> bytes:
+    """One line of a batch response, for the URL at index of the batch"""
+    return (json.dumps({"index": index, "url": url, **fields}) + "\n").encode("utf-8")
+
+
+async def extract_batch_item(
+    index: int,
+    url: str,
+    stages: set,
+    force_refresh: bool,
+    deadline_ms: Optional[int] = None,
+) -> bytes:
+    """
+    Get the result of one URL of a batch, as a line of the response. Its
+    time budget starts when the URL does.
+    """
+    try:
+        deadline = get_deadline(deadline_ms)
+        hit = await lookup_cache(url, stages, force_refresh)
+        if hit:
+            # The stored stages are embedded as they are
+            _, serialized, stale = hit
+            return (
+                encode_batch_line(index, url)[:-2]
+                + b',"result":'
+                + cache_service.mark_cached(serialized, stale)
+                + b"}\n"
+            )
+
+        result = await run_extraction(url, stages, force_refresh, deadline=deadline)
+        if "error" in result:
+            return encode_batch_line(index, url, error=result["error"])
+
+        result["counts"] = projection.count_categories(result)
+        return (
+            encode_batch_line(index, url)[:-2]
+            + b',"result":'
+            + ExtractorResponse(**result).model_dump_json().encode("utf-8")
+            + b"}\n"
+        )
+    except Exception as e:
+        logger.error(f"Batch extraction of {url} failed: {str(e)}")
+        traceback.print_exc()
+        return encode_batch_line(index, url, error=f"An error occurred: {str(e)}")
+
+
+async def stream_batch(
+    urls: List[str],
+    stages: set,
+    force_refresh: bool,
+    deadline_ms: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Extract a batch of URLs, yielding every result as soon as it is ready.
+
+    At most BATCH_CONCURRENCY URLs are extracted at once, and at most
+    BATCH_PER_HOST_CONCURRENCY of the same host. Hosts take turns, so a
+    batch dominated by one site does not hold the others back.
+    """
+    pending: "OrderedDict[str, deque]" = OrderedDict()
+    for index, url in enumerate(urls):
+        if not validators.url(url):
+            yield encode_batch_line(index, url, error="Invalid URL format")
+            continue
+        host = (urlsplit(url).hostname or "").lower()
+        pending.setdefault(host, deque()).append((index, url))
+
+    running: Dict[asyncio.Task, str] = {}
+    running_by_host: Counter = Counter()
+
+    def start_next():
+        # One URL per host and round, until the batch runs at capacity
+        started = True
+        while started and len(running) < BATCH_CONCURRENCY:
+            started = False
+            for host in list(pending):
+                if len(running) >= BATCH_CONCURRENCY:
+                    break
+                if running_by_host[host] >= BATCH_PER_HOST_CONCURRENCY:
+                    continue
+
+                index, url = pending[host].popleft()
+                if pending[host]:
+                    pending.move_to_end(host)  # Served, to the back of the line
+                else:
+                    del pending[host]
+
+                task = asyncio.create_task(
+                    extract_batch_item(index, url, stages, force_refresh, deadline_ms)
+                )
+                running[task] = host
+                running_by_host[host] += 1
+                started = True
+
+    try:
+        start_next()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running_by_host[running.pop(task)] -= 1
+                yield task.result()
+            start_next()
+    finally:
+        # The client went away, the results would not reach anyone
+        for task in running:
+            task.cancel()
+
+
+async def extract_batch(batch_request: BatchRequest) -> StreamingResponse:
+    """
+    Extract several URLs, streaming their results as NDJSON.
+
+    Every line holds the index of a URL in the batch, the URL, and either
+    its result or an error, in the order they finish.
+
+    Args:
+        batch_request: The URLs, stages and options to extract with.
+
+    Returns:
+        The streaming response.
+    """
+    return StreamingResponse(
+        content=stream_batch(
+            batch_request.urls,
+            set(batch_request.include),
+            batch_request.force_refresh,
+            batch_request.deadline_ms,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+async def submit_job(url_request: URLRequest) -> JobInfo:
+    """
+    Queue the extraction of a URL for the extraction workers.
+
+    Args:
+        url_request: The URL, stages and options to extract with.
+
+    Returns:
+        The state of the queued job, as a JobInfo object.
+    """
+    if not validators.url(url_request.url):
+        raise HTTPException(status_code=400, detail="Invalid URL format")
+
+    job_id = await job_service.submit_extraction(
+        url_request.url, set(url_request.include), url_request.force_refresh
+    )
+    job = await job_service.get_job_info(job_id) if job_id else None
+    if job is None:
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+    return job
+
+
+async def get_job(job_id: str) -> JobInfo:
+    """
+    Get the state of an extraction job.
+
+    Args:
+        job_id: The ID the job was queued with.
+
+    Returns:
+        The state of the job, as a JobInfo object.
+    """
+    job = await job_service.get_job_info(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def list_cached_results(
+    limit: int, offset: int, host: Optional[str] = None
+) -> CachedResultsList:
+    """
+    List the cached results, most recently stored first.
+
+    Args:
+        limit: Maximum number of results to return.
+        offset: Number of results to skip.
+        host: Only list the results of this host.
+
+    Returns:
+        A page of the cached results as a CachedResultsList object.
+    """
+    try:
+        return CachedResultsList(
+            **await cache_service.list_cached_results(limit, offset, host)
+        )
+    except Exception as e:
+        logger.error(f"Error listing cached results: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=500, detail=f"Failed to list cached results: {str(e)}"
+        )
+
+
+async def get_cache_stats() -> CacheStats:
+    """
+    Get the statistics of the result cache.
+
+    Returns:
+        The statistics as a CacheStats object.
+    """
+    try:
+        return CacheStats(**await cache_service.get_cache_stats())
+    except Exception as e:
+        logger.error(f"Error computing cache statistics: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+def get_cpu_pool_stats() -> CpuPoolStats:
+    """
+    Get the statistics of the CPU pool of this process.
+
+    Returns:
+        The statistics as a CpuPoolStats object.
+    """
+    return CpuPoolStats(**cpu_pool.stats())
+
+
 #### Streaming sse
-async def extract_assets_sse(url: str, force_refresh: bool):
+async def extract_assets_sse(
+    url: Optional[str],
+    force_refresh: bool,
+    include: Optional[List[ExtractionStage]] = None,
+    job_id: Optional[str] = None,
+    deadline_ms: Optional[int] = None,
+    last_event_id: Optional[str] = None,
+):
+    # A client reconnecting to the stream of a job resumes following the job
+    job_id = job_id or job_service.parse_event_id(last_event_id)[0]
+    if job_id:
+        job = await job_service.get_job_info(job_id)
+        if job is None:
+            return StreamingResponse(
+                content=stream_error_message("Job not found"),
+                media_type="text/event-stream",
+            )
+        return StreamingResponse(
+            content=stream_extraction(
+                job.url, set(job.stages), job_id=job_id, last_event_id=last_event_id
+            ),
+            media_type="text/event-stream",
+        )
+
     if not url:
         return StreamingResponse(
             content=stream_error_message("Missing URL parameter"),
@@ -160,33 +849,43 @@ async def extract_assets_sse(url: str, force_refresh: bool):
             media_type="text/event-stream",
         )
 
-    # Check for cached results if not forcing refresh
-    if not force_refresh:
-        url_key = get_url_key(url)
-        cached_result = redis_manager.get_cached_json_item(url_key)
+    stages = set(include or DEFAULT_EXTRACTION_STAGES)
 
-        if cached_result:
-            return StreamingResponse(
-                content=stream_cached_result(cached_result),
-                media_type="text/event-stream",
-            )
+    # Check for cached results if not forcing refresh
+    hit = await lookup_cache(url, stages, force_refresh)
+    if hit:
+        meta, serialized, stale = hit
+        return StreamingResponse(
+            content=stream_cached_result(url, meta["result_id"], serialized, stale),
+            media_type="text/event-stream",
+        )
 
     return StreamingResponse(
-        content=stream_extraction(url), media_type="text/event-stream"
+        content=stream_extraction(
+            url,
+            stages,
+            force_refresh,
+            deadline=get_deadline(deadline_ms),
+            last_event_id=last_event_id,
+        ),
+        media_type="text/event-stream",
     )
 
 
-async def stream_cached_result(result):
+async def stream_cached_result(
+    url: str, result_id: str, serialized: bytes, stale: bool = False
+):
     """Stream a cached result with appropriate events"""
     # Send initial message
-    yield f"data: {json.dumps({'event': 'start', 'url': result.get('url')})}\n\n"
-    yield f"data: {json.dumps({'event': 'cached_result', 'result_id': result.get('result_id')})}\n\n"
-
-    # Small delay to simulate processing
-    await asyncio.sleep(0.5)
-
-    # Send the complete result
-    yield f"data: {json.dumps({'event': 'complete', 'result': result})}\n\n"
+    yield f"data: {json.dumps({'event': 'start', 'url': url})}\n\n"
+    yield f"data: {json.dumps({'event': 'cached_result', 'result_id': result_id})}\n\n"
+
+    result = json.loads(serialized)
+    result["cached"] = True
+    result["stale"] = stale
+    for event in get_missing_batches(result, Counter()):
+        yield format_sse_event(event)
+    yield format_sse_event(get_complete_event(result))
     yield f"data: {json.dumps({'event': 'end'})}\n\n"
 
 
@@ -195,150 +894,159 @@ async def stream_error_message(message):
     yield f"data: {json.dumps({'event': 'error', 'message': message})}\n\n"
 
 
-async def stream_extraction(url):
-    """Stream extraction progress and results"""
+def format_sse_event(message: dict) -> str:
+    """An event as an SSE message, with its ID when it has one"""
+    message = dict(message)
+    event_id = message.pop("id", None)
+    data = f"data: {json.dumps(message)}\n\n"
+    return f"id: {event_id}\n{data}" if event_id is not None else data
+
+
+def get_batch_key(event: dict) -> tuple:
+    """The item list of a result a batch event adds to"""
+    return event["event"], event.get("category") or event.get("source")
+
+
+def get_missing_batches(result: dict, streamed: Counter) -> Iterator[dict]:
+    """
+    The batch events completing what was streamed of a result.
+
+    Lists streamed in full are skipped. The others are sent whole, the first
+    batch replacing what the client holds: stages a flight kept from the
+    cache stream no items, and a resumed stream only counts its own.
+
+    Args:
+        result: The result of the extraction.
+        streamed: Items streamed by batch key, see get_batch_key.
+    """
+    assets = result.get("assets") or {}
+    colors = result.get("colors") or {}
+    lists = [
+        *(
+            ({"event": ItemBatchEvent.ASSET_BATCH, "category": category}, assets.get(category) or [])
+            for category in projection.ASSET_CATEGORIES
+        ),
+        *(
+            ({"event": ItemBatchEvent.COLOR_BATCH, "source": source}, colors.get(source) or [])
+            for source in projection.COLOR_CATEGORIES
+        ),
+        ({"event": ItemBatchEvent.FONT_BATCH}, result.get("fonts") or []),
+    ]
+
+    for header, items in lists:
+        if streamed[get_batch_key(header)] == len(items):
+            continue
+
+        for start in range(0, max(len(items), 1), SSE_BATCH_SIZE):
+            event = {**header, "items": items[start : start + SSE_BATCH_SIZE]}
+            event["replace"] = start == 0
+            if header.get("category") in ("icons", "svgs"):
+                # Stored SVGs are references, resolved with their blobs
+                event["blobs"] = projection.get_blobs(assets, event["items"])
+            yield event
+
+
+def get_complete_event(result: dict) -> dict:
+    """The event ending the stream of a result, the items having been streamed"""
+    return {
+        "event": "complete",
+        "result_id": result.get("result_id"),
+        "summary": projection.summarize_result(result),
+    }
+
+
+def get_final_events(extraction_task: asyncio.Task, streamed: Counter) -> List[dict]:
+    """The events ending the stream of a finished extraction"""
+    event = get_final_event(extraction_task)
+    if event["event"] != "complete":
+        return [event]
+
+    result = event["result"]
+    return [*get_missing_batches(result, streamed), get_complete_event(result)]
+
+
+def get_final_event(extraction_task: asyncio.Task) -> dict:
+    """The event ending the stream of a finished extraction"""
+    try:
+        extraction_result = extraction_task.result()
+    except Exception as e:
+        traceback.print_exc()
+        return {"event": "error", "message": f"Extraction failed: {str(e)}"}
+
+    # Validate the result to prevent NoneType errors
+    if not extraction_result:
+        return {"event": "error", "message": "Extraction returned no result"}
+    if "error" in extraction_result:
+        return {"event": "error", "message": extraction_result["error"]}
+    return {"event": "complete", "result": extraction_result}
+
+
+async def stream_extraction(
+    url,
+    stages,
+    force_refresh=False,
+    job_id=None,
+    deadline=None,
+    last_event_id=None,
+):
+    """
+    Stream extraction progress and results, of an extraction job if job_id is
+    given.
+
+    Events are sent as they are emitted, and the result as soon as the
+    extraction returns. Progress events carry an ID: a client reconnecting
+    with the last one it received (Last-Event-ID) only gets the events after
+    it, of the job it names or of the extraction in flight.
+
+    The items of the result are streamed in asset_batch, color_batch and
+    font_batch events as the extractor finds them. The complete event only
+    carries the ID and a summary of the result.
+    """
     queue = asyncio.Queue()
     extraction_task = None
-    extraction_result = None
+    streamed = Counter()  # Items sent by batch key, see get_missing_batches
 
-    # Callback function to handle progress updates
-    def progress_callback(stage, data):
-        queue.put_nowait({"event": "progress", "stage": stage, "data": data})
+    # Flight events are skipped up to the last one received, if they belong
+    # to the same flight. Job events are resumed from by the job.
+    resume_flight, resume_after = parse_flight_event_id(last_event_id)
 
-    try:
-        # Send initial message
-        yield f"data: {json.dumps({'event': 'start', 'url': url})}\n\n"
+    def on_event(event: dict):
+        flight_id, position = parse_flight_event_id(event.get("id"))
+        if flight_id is None or flight_id != resume_flight or position > resume_after:
+            queue.put_nowait(event)
 
-        # Start extraction in background task
-        extraction_task = asyncio.create_task(
-            extractor.stream_extraction_from_url(url, progress_callback)
-        )
+    try:
+        if last_event_id is None:
+            yield f"data: {json.dumps({'event': 'start', 'url': url})}\n\n"
+
+        # Start extraction in background task, or join the one in flight
+        if job_id:
+            extraction = follow_job(job_id, on_event, last_event_id)
+        else:
+            extraction = run_extraction(
+                url, stages, force_refresh, on_event=on_event, deadline=deadline
+            )
+        extraction_task = asyncio.create_task(extraction)
+        # Queued after the last progress event, so nothing has to poll for it
+        extraction_task.add_done_callback(queue.put_nowait)
 
-        # Stream progress updates
-        # Todo: Use broadcast and redis pub/sub for real-time updates
         while True:
-            # Check if extraction is complete
-            if extraction_task.done():
-                if not extraction_result:
-                    # Get the final result
-                    try:
-                        extraction_result = extraction_task.result()
-
-                        # Validate the result to prevent NoneType errors
-                        if not extraction_result:
-                            queue.put_nowait(
-                                {
-                                    "event": "error",
-                                    "message": "Extraction returned no result",
-                                }
-                            )
-                        elif "error" in extraction_result:
-                            queue.put_nowait(
-                                {
-                                    "event": "error",
-                                    "message": extraction_result["error"],
-                                }
-                            )
-                        else:
-                            # Add timestamp
-                            extraction_result["timestamp"] = datetime.now().isoformat()
-
-                            # Store in cache and get ID
-                            result_id = generate_result_id()
-                            url_key = get_url_key(url)
-
-                            extraction_result["result_id"] = result_id
-                            extraction_result["url"] = url
-                            extraction_result["cached"] = False
-
-                            redis_manager.cache_json_item(
-                                url_key,
-                                extraction_result,
-                                ttl=3600 * 12,
-                            )
-
-                            redis_manager.cache_string_item(
-                                get_result_key(result_id),
-                                url,
-                                ttl=3600 * 12,
-                            )  # Cache the result for 12 hours
-
-                            # Ensure the result has the expected structure
-                            """
-                            safe_result = {
-                                "url": url,
-                                "result_id": result_id,
-                                "timestamp": extraction_result["timestamp"],
-                                "colors": {
-                                    "from_css": extraction_result.get("colors", {}).get(
-                                        "from_css", []
-                                    ),
-                                    "from_images": extraction_result.get(
-                                        "colors", {}
-                                    ).get("from_images", []),
-                                },
-                                "fonts": extraction_result.get("fonts", []),
-                                "assets": {
-                                    "images": extraction_result.get("assets", {}).get(
-                                        "images", []
-                                    ),
-                                    "videos": extraction_result.get("assets", {}).get(
-                                        "videos", []
-                                    ),
-                                    "scripts": extraction_result.get("assets", {}).get(
-                                        "scripts", []
-                                    ),
-                                    "stylesheets": extraction_result.get(
-                                        "assets", {}
-                                    ).get("stylesheets", []),
-                                    "icons": extraction_result.get("assets", {}).get(
-                                        "icons", []
-                                    ),
-                                    "audios": extraction_result.get("assets", {}).get(
-                                        "audios", []
-                                    ),
-                                    "fonts": extraction_result.get("assets", {}).get(
-                                        "fonts", []
-                                    ),
-                                    "others": extraction_result.get("assets", {}).get(
-                                        "others", []
-                                    ),
-                                    "svgs": extraction_result.get("assets", {}).get(
-                                        "svgs", []
-                                    ),
-                                },
-                            }
-                            
-                            """
-                            queue.put_nowait(
-                                {"event": "complete", "result": extraction_result}
-                            )
-                    except Exception as e:
-                        traceback.print_exc()
-                        queue.put_nowait(
-                            {
-                                "event": "error",
-                                "message": f"Extraction failed: {str(e)}",
-                            }
-                        )
-
-            # Get message from queue with timeout
             try:
-                message = await asyncio.wait_for(queue.get(), timeout=0.5)
-                yield f"data: {json.dumps(message)}\n\n"
-
-                # Exit the loop if we've sent the complete result
-                if (
-                    message.get("event") in ["complete", "error"]
-                    and extraction_task.done()
-                ):
-                    break
+                message = await asyncio.wait_for(
+                    queue.get(), timeout=SSE_KEEPALIVE_INTERVAL
+                )
             except asyncio.TimeoutError:
-                # No message in queue, but extraction might be complete
-                if extraction_task.done() and extraction_result:
-                    break
-                # Send a keepalive comment to prevent timeout
                 yield ": keepalive\n\n"
+                continue
+
+            if message is extraction_task:
+                for event in get_final_events(extraction_task, streamed):
+                    yield format_sse_event(event)
+                break
+
+            if message["event"] in list(ItemBatchEvent):
+                streamed[get_batch_key(message)] += len(message["items"])
+            yield format_sse_event(message)
 
     except asyncio.CancelledError:
         if extraction_task and not extraction_task.done():
@@ -0,0 +1,117 @@
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Tuple
+
+from app.root.job_queue import JobQueue
+from app.schemas.extractor_schema import ItemBatchEvent, JobInfo
+
+
+logger = logging.getLogger("job-service")
+
+# Hand extractions to the worker processes (python -m app.worker) instead of
+# running them in the web workers
+USE_JOB_QUEUE = os.environ.get("USE_JOB_QUEUE", "false").lower() in ("1", "true", "yes")
+
+extraction_jobs = JobQueue("extract")
+
+
+async def submit_extraction(
+    url: str,
+    stages: Iterable[str],
+    force_refresh: bool = False,
+    deadline: Optional[float] = None,
+) -> Optional[str]:
+    """
+    Queue the extraction of some stages of a URL.
+
+    Args:
+        url: The URL to extract.
+        stages: The stages to return.
+        force_refresh: Extract every stage even if the cache holds it.
+        deadline: Epoch time the extraction must end by, counted from the
+            request, not from when a worker picks the job up.
+
+    Returns:
+        The ID of the job, None while the queue is unavailable.
+    """
+    return await extraction_jobs.enqueue(
+        {
+            "url": url,
+            "stages": sorted(stages),
+            "force_refresh": force_refresh,
+            "deadline": deadline,
+        }
+    )
+
+
+async def get_job_info(job_id: str) -> Optional[JobInfo]:
+    """The state of an extraction job, None if it does not exist or expired"""
+    job = await extraction_jobs.get_job(job_id)
+    if job is None:
+        return None
+
+    result = job.get("result") or {}
+    return JobInfo(
+        job_id=job_id,
+        status=job["status"],
+        url=job["payload"]["url"],
+        stages=job["payload"]["stages"],
+        attempts=job["attempts"],
+        result_id=result.get("result_id"),
+        error=job.get("error"),
+        created_at=datetime.fromtimestamp(float(job["created_at"])),
+        updated_at=datetime.fromtimestamp(float(job["updated_at"])),
+    )
+
+
+def get_event_id(job_id: str, event_id: str) -> str:
+    """
+    The ID of an event of an extraction job, as sent to SSE clients. It
+    names the job, so that a client reconnecting with it resumes following
+    the job, see parse_event_id.
+    """
+    return f"{job_id}/{event_id}"
+
+
+def parse_event_id(event_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """The job and the position in its events of an event ID, if it has them"""
+    if not event_id or "/" not in event_id:
+        return None, None
+    job_id, _, position = event_id.partition("/")
+    return job_id, position
+
+
+async def follow_extraction(
+    job_id: str,
+    on_event: Optional[Callable[[dict], None]] = None,
+    last_event_id: Optional[str] = None,
+) -> dict:
+    """
+    Wait for an extraction job, from any worker.
+
+    Args:
+        job_id: The job to wait for.
+        on_event: Receives the progress events of the extraction, with their
+            "id".
+        last_event_id: Only pass on the events after this one, when resuming.
+
+    Returns:
+        What the job stored its result as, with the URL and stages of the
+        result, or a dict with an "error" message.
+    """
+    event_job_id, last_id = parse_event_id(last_event_id)
+    if event_job_id != job_id:
+        last_id = None
+    async for event_id, event in extraction_jobs.follow(job_id, last_id or "0-0"):
+        if event["event"] in ("progress", *ItemBatchEvent):
+            if on_event:
+                on_event({**event, "id": get_event_id(job_id, event_id)})
+        elif event["event"] == "retrying":
+            logger.info(f"Job {job_id} failed attempt {event['attempt']}, retrying")
+        elif event["event"] == "completed":
+            return event["result"]
+        elif event["event"] == "failed":
+            return {"error": event["message"] or "Extraction failed"}
+
+    return {"error": "Extraction failed"}
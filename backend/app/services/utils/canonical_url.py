@@ -0,0 +1,71 @@
+import fnmatch
+import os
+from typing import List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# Query parameters that do not change the page, dropped from cache keys.
+# Comma separated, shell-style wildcards allowed.
+CACHE_KEY_STRIP_PARAMS: List[str] = [
+    pattern.strip().lower()
+    for pattern in os.environ.get(
+        "CACHE_KEY_STRIP_PARAMS",
+        "utm_*,fbclid,gclid,dclid,gbraid,wbraid,msclkid,yclid,mc_cid,mc_eid,"
+        "_ga,_gl,igshid,ref_src",
+    ).split(",")
+    if pattern.strip()
+]
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def is_tracking_parameter(name: str) -> bool:
+    """Whether a query parameter matches CACHE_KEY_STRIP_PARAMS"""
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in CACHE_KEY_STRIP_PARAMS)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Reduce a URL to the form results are cached under, so that spellings of
+    the same page share one cache entry.
+
+    The scheme and host are lowercased, default ports, fragments and tracking
+    parameters are dropped, the remaining query parameters are sorted and an
+    empty path becomes "/".
+
+    Args:
+        url: The URL as requested.
+
+    Returns:
+        The canonical URL. URLs that cannot be parsed are returned stripped.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+
+    netloc = host
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        netloc = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo = f"{userinfo}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not is_tracking_parameter(name)
+        )
+    )
+
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
@@ -1,29 +1,61 @@
 import traceback
 import requests
-from bs4 import BeautifulSoup
-import re
 import json
-import extcolors
-from io import BytesIO
-from PIL import Image
-import cssutils
-import logging
-import httpx
-from urllib.parse import urljoin, urlparse, unquote
-import webcolors
+from urllib.parse import urljoin, urlparse
 import asyncio
 from playwright.async_api import (
     async_playwright,
     TimeoutError as PlaywrightTimeoutError,
 )
-import base64
-from typing import Optional, Callable, Dict, Any
-import html
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Callable, Dict, Any, Iterable, List, Set
+
+from app.root.cpu_pool import cpu_pool
+from app.root.http_client import http_client
+from app.schemas.extractor_schema import (
+    DEFAULT_EXTRACTION_STAGES,
+    ExtractionStage,
+    ItemBatchEvent,
+    ProgressStage,
+)
+from app.services.utils import page_analysis
+
+# External SVG fetching
+SVG_FETCH_CONCURRENCY = int(os.environ.get("SVG_FETCH_CONCURRENCY", 8))
+SVG_FETCH_DEADLINE = float(os.environ.get("SVG_FETCH_DEADLINE", 20.0))  # Seconds
+SVG_CACHE_MAX_ENTRIES = int(os.environ.get("SVG_CACHE_MAX_ENTRIES", 2048))
+SVG_CACHE_FRESH_FOR = int(os.environ.get("SVG_CACHE_FRESH_FOR", 3600))  # Seconds
+
+# Processed external SVGs shared by every extraction in this process, keyed by URL.
+# Entries keep the response validators so stale ones are revalidated, not refetched.
+_svg_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Stages that read computed styles, and so need the page rendered in Chromium
+BROWSER_STAGES = {ExtractionStage.CSS_COLORS, ExtractionStage.FONTS}
+
+# Stages that work from the discovered assets (images to sample, stylesheets to read)
+ASSET_DISCOVERY_STAGES = {
+    ExtractionStage.ASSETS,
+    ExtractionStage.IMAGE_COLORS,
+    ExtractionStage.FONTS,
+}
 
-from app.schemas.extractor_schema import ProgressStage
+BROWSER_VIEWPORT = {"width": 1280, "height": 800}
 
-# Suppress cssutils log messages
-cssutils.log.setLevel(logging.CRITICAL)
+PAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# The part of the page validators each stage is extracted from
+STAGE_INPUTS = {
+    ExtractionStage.ASSETS: "assets_hash",
+    ExtractionStage.IMAGE_COLORS: "assets_hash",
+    ExtractionStage.CSS_COLORS: "styles_hash",
+    ExtractionStage.FONTS: "styles_hash",
+}
 
 
 class WebAssetExtractor:
@@ -31,14 +63,21 @@ class WebAssetExtractor:
         self,
         url,
         progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        stages: Optional[Iterable[ExtractionStage]] = None,
+        snapshot: Optional[bytes] = None,
+        browser_context=None,
+        deadline: Optional[float] = None,
+        items_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
     ):
         self.url = url
+        self.deadline = deadline  # Epoch time the extraction must end by, if any
+        self.snapshot = snapshot  # The document as served earlier, instead of fetching it
+        self.browser_context = browser_context  # Shared with other extractions, see shared_browser_context
+        self.stages = set(stages or DEFAULT_EXTRACTION_STAGES)
         self.parsed_url = urlparse(url)
         self.base_url = f"{self.parsed_url.scheme}://{self.parsed_url.netloc}"
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        self.soup = None
+        self.headers = dict(PAGE_HEADERS)
+        self.analysis = {}  # What the page markup references, see page_analysis.analyze_document
         self.content = None
         self.css_colors = []
         self.image_colors = []
@@ -52,8 +91,15 @@ class WebAssetExtractor:
             "svgs": [],  # For regular SVGs
         }
         self.page_resources = []
+        self.svg_sprites = {}  # Sprite URL -> {symbol id: standalone SVG markup}
+        self.validators = None  # What the fetched document looked like, see page_analysis.build_page_validators
+        self.final_url = None  # Where redirects, if any, led
+        self.document = None  # The document as served, before scripts run
         self.progress_callback = progress_callback
+        self.items_callback = items_callback  # Receives the items of the result as they are found
+        self.sent_assets = {}  # Asset category -> the items sent through items_callback
         self.extraction_complete = False
+        self.finished_stages = set()  # Stages extracted before the deadline
 
     def _send_progress(self, stage: str, data: Dict[str, Any] = None):
         """Send progress update via callback if available"""
@@ -62,179 +108,90 @@ class WebAssetExtractor:
                 data = {}
             self.progress_callback(stage.__str__(), data)
 
+    def _send_items(self, event: str, data: Dict[str, Any]):
+        """Send a batch of items of the result via callback if available"""
+        if self.items_callback and data["items"]:
+            self.items_callback(event.__str__(), data)
+
+    def _send_new_assets(self, categories: Iterable[str]):
+        """Send the assets of some categories that were not sent yet"""
+        if ExtractionStage.ASSETS not in self.stages:
+            return  # Discovered for other stages, not part of the result
+
+        for category in categories:
+            sent = self.sent_assets.setdefault(category, set())
+            items = [item for item in self.assets[category] if item not in sent]
+            sent.update(items)
+            self._send_items(
+                ItemBatchEvent.ASSET_BATCH, {"category": category, "items": items}
+            )
+
+    def _add_fonts(self, fonts: Iterable[Dict[str, Any]]):
+        """Append fonts to the result, skipping the ones it lists, and send the new ones"""
+        added = []
+        for font_info in fonts:
+            if font_info not in self.fonts:
+                self.fonts.append(font_info)
+                added.append(font_info)
+        self._send_items(ItemBatchEvent.FONT_BATCH, {"items": added})
+
+    def _remaining(self, cap: Optional[float]) -> Optional[float]:
+        """Seconds a step may take, see get_remaining"""
+        return get_remaining(self.deadline, cap)
+
+    def _remaining_ms(self, cap_ms: int) -> int:
+        """_remaining in milliseconds, for Playwright"""
+        return max(1, int(self._remaining(cap_ms / 1000) * 1000))
+
+    def _deadline_passed(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def _finish_stage(self, stage: ExtractionStage):
+        """
+        Count a stage as extracted, unless the deadline passed. Stages catch
+        the timeouts of their steps, and the steps time out at the deadline,
+        so a stage returning after it may have been cut short: it stays
+        unfinished, and is not cached.
+        """
+        if not self._deadline_passed():
+            self.finished_stages.add(stage)
+
+    @asynccontextmanager
+    async def _open_browser_context(self):
+        """
+        The shared browser context if there is one, else one in a browser
+        launched for this extraction, closed on the way out, cancellation
+        included.
+        """
+        if self.browser_context is not None:
+            yield self.browser_context
+            return
+
+        async with launch_browser_context(self.headers["User-Agent"]) as context:
+            yield context
+
+    @asynccontextmanager
+    async def _new_page(self):
+        """A browser page, closed on the way out, cancellation included"""
+        async with self._open_browser_context() as context:
+            page = await context.new_page()
+            try:
+                yield page
+            finally:
+                await asyncio.shield(page.close())
+
     async def fetch_page(self):
         """Fetch the webpage content using Playwright to handle JavaScript rendering"""
         self._send_progress(ProgressStage.FETCHING_PAGE, {"url": self.url})
 
         try:
-            async with async_playwright() as p:
-                # Launch browser with more generous timeout settings
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context(
-                    viewport={"width": 1280, "height": 800},
-                    user_agent=self.headers["User-Agent"],
-                )
-
-                # Enable request interception to capture all loaded resources
-                page = await context.new_page()
-
-                # Track all resources loaded by the page
-                async def on_response(response):
-                    if response.ok:
-                        content_type = response.headers.get("content-type", "")
-                        url = response.url
-                        if not url.startswith("data:"):
-                            resource_type = response.request.resource_type
-                            self.page_resources.append(
-                                {
-                                    "url": url,
-                                    "type": resource_type,
-                                    "contentType": content_type,
-                                }
-                            )
-
-                            # Send progress update for important resources
-                            if resource_type in ["image", "media", "stylesheet"]:
-                                self._send_progress(
-                                    ProgressStage.RESOURCE_LOADED,
-                                    {"type": resource_type, "url": url},
-                                )
+            async with self._open_browser_context() as context:
+                await self._render_page(context)
 
-                page.on("response", on_response)
-
-                # Try multiple page load strategies if one fails
-                try:
-                    # First attempt with networkidle
-                    self._send_progress(
-                        ProgressStage.LOADING_PAGE, {"strategy": "networkidle"}
-                    )
-                    await page.goto(self.url, wait_until="networkidle", timeout=45000)
-                except PlaywrightTimeoutError:
-                    traceback.print_exc()
-                    # Fallback to domcontentloaded which is less strict
-                    self._send_progress(
-                        ProgressStage.LOADING_PAGE,
-                        {
-                            "strategy": "domcontentloaded",
-                            "note": "networkidle timed out",
-                        },
-                    )
-                    try:
-                        # Navigate with a more forgiving strategy
-                        await page.goto(
-                            self.url, wait_until="domcontentloaded", timeout=30000
-                        )
-                        # Wait a bit more for additional resources to load
-                        await page.wait_for_timeout(5000)
-                    except PlaywrightTimeoutError:
-                        traceback.print_exc()
-                        # Last resort: just load and wait a fixed time
-                        self._send_progress(
-                            ProgressStage.LOADING_PAGE,
-                            {"strategy": "load", "note": "domcontentloaded timed out"},
-                        )
-                        await page.goto(self.url, wait_until="load", timeout=20000)
-                        await page.wait_for_timeout(3000)
-
-                # Wait a bit more to ensure dynamic content is loaded
-                self._send_progress(
-                    ProgressStage.PAGE_LOADED,
-                    {"waiting_for_content": True},
-                )
-                await page.wait_for_timeout(2000)
-
-                # Get the page content after JavaScript execution
-                self.content = await page.content()
-                self.soup = BeautifulSoup(self.content, "lxml")
-                self._send_progress(
-                    ProgressStage.PARSING_CONTENT,
-                    {
-                        "content_length": len(self.content),
-                    },
-                )
-
-                # Execute some JavaScript to find hidden resources
-                self._send_progress(ProgressStage.EXTRACTING_JS_RESOURCES, {})
-                resources_from_js = await page.evaluate(
-                    """() => {
-                    // Look for React props that might contain media URLs
-                    const mediaUrls = [];
-                    
-                    // Function to extract URLs from text
-                    const extractUrls = (text) => {
-                        const urlRegex = /(https?:\/\/[^\s"'<>]+\.(jpg|jpeg|png|gif|webp|mp4|webm|ogg|mov))/gi;
-                        return text.match(urlRegex) || [];
-                    };
-                    
-                    // Scan all script tags for potential media URLs
-                    document.querySelectorAll('script').forEach(script => {
-                        if (script.textContent) {
-                            const urls = extractUrls(script.textContent);
-                            urls.forEach(url => mediaUrls.push(url));
-                        }
-                    });
-                    
-                    // Look for React components with media
-                    if (window.__INITIAL_STATE__ || window.__PRELOADED_STATE__) {
-                        const state = JSON.stringify(window.__INITIAL_STATE__ || window.__PRELOADED_STATE__);
-                        const urls = extractUrls(state);
-                        urls.forEach(url => mediaUrls.push(url));
-                    }
-                    
-                    // Try to find video elements that might be added dynamically
-                    const videoSources = [];
-                    document.querySelectorAll('video').forEach(video => {
-                        if (video.src) videoSources.push(video.src);
-                        video.querySelectorAll('source').forEach(source => {
-                            if (source.src) videoSources.push(source.src);
-                        });
-                    });
-                    
-                    return {
-                        mediaUrls: [...new Set(mediaUrls)],
-                        videoSources: [...new Set(videoSources)],
-                        lazyImages: Array.from(document.querySelectorAll('[data-src], [data-lazy], [data-lazy-src], [data-original]'))
-                            .map(img => ({
-                                src: img.src,
-                                dataSrc: img.dataset.src || img.dataset.lazy || img.dataset.lazySrc || img.dataset.original
-                            }))
-                            .filter(img => img.dataSrc)
-                    };
-                }"""
-                )
-
-                # Add the discovered resources
-                for url in resources_from_js.get("mediaUrls", []):
-                    if any(
-                        url.endswith(ext)
-                        for ext in [".jpg", ".jpeg", ".png", ".gif", ".webp"]
-                    ):
-                        if url not in self.assets["images"]:
-                            self.assets["images"].append(url)
-                    elif any(
-                        url.endswith(ext) for ext in [".mp4", ".webm", ".ogg", ".mov"]
-                    ):
-                        if url not in self.assets["videos"]:
-                            self.assets["videos"].append(url)
-
-                # Add video sources
-                for url in resources_from_js.get("videoSources", []):
-                    if url not in self.assets["videos"]:
-                        self.assets["videos"].append(url)
-
-                # Add lazy-loaded images
-                for img_data in resources_from_js.get("lazyImages", []):
-                    if img_data.get("dataSrc"):
-                        full_url = self._normalize_url(img_data["dataSrc"])
-                        if full_url and full_url not in self.assets["images"]:
-                            self.assets["images"].append(full_url)
-
-                # Close the browser
-                await browser.close()
-                self._send_progress(
-                    ProgressStage.PAGE_FETCH_COMPLETE, {"status": "success"}
-                )
-                return True
+            self._send_progress(
+                ProgressStage.PAGE_FETCH_COMPLETE, {"status": "success"}
+            )
+            return True
 
         except Exception as e:
             traceback.print_exc()
@@ -248,17 +205,11 @@ class WebAssetExtractor:
             # Fallback to simple httpx request
             try:
                 self._send_progress(ProgressStage.FALLBACK_REQUEST, {"method": "httpx"})
-                async with httpx.AsyncClient(
-                    follow_redirects=True, timeout=30.0
-                ) as client:
-                    response = await client.get(self.url, headers=self.headers)
-                    response.raise_for_status()
-                    self.content = response.text
-                    self.soup = BeautifulSoup(self.content, "lxml")
-                    self._send_progress(
-                        ProgressStage.FALLBACK_COMPLETE, {"status": "success"}
-                    )
-                    return True
+                await self._fetch_with_httpx()
+                self._send_progress(
+                    ProgressStage.FALLBACK_COMPLETE, {"status": "success"}
+                )
+                return True
             except Exception as inner_e:
                 inner_error = str(inner_e)
                 traceback.print_exc()
@@ -268,290 +219,391 @@ class WebAssetExtractor:
                 print(f"Fallback request also failed: {inner_error}")
                 return False
 
-    def _normalize_url(self, url):
-        """Convert relative URLs to absolute URLs with improved handling"""
-        if not url:
-            return None
-        if url.startswith("data:"):
-            return url
+    async def _render_page(self, context):
+        """Load the page in a browser context and read what it rendered"""
+        # Enable request interception to capture all loaded resources
+        page = await context.new_page()
 
-        # Handle special cases
-        url = url.strip()
+        try:
+            # Track all resources loaded by the page
+            async def on_response(response):
+                if response.ok:
+                    content_type = response.headers.get("content-type", "")
+                    url = response.url
+                    if not url.startswith("data:"):
+                        resource_type = response.request.resource_type
+                        self.page_resources.append(
+                            {
+                                "url": url,
+                                "type": resource_type,
+                                "contentType": content_type,
+                            }
+                        )
 
-        # Remove URL encoded characters
-        url = unquote(url)
+                        # Send progress update for important resources
+                        if resource_type in ["image", "media", "stylesheet"]:
+                            self._send_progress(
+                                ProgressStage.RESOURCE_LOADED,
+                                {"type": resource_type, "url": url},
+                            )
 
-        # Handle protocol-relative URLs (//example.com/image.jpg)
-        if url.startswith("//"):
-            return f"{self.parsed_url.scheme}:{url}"
+            page.on("response", on_response)
 
-        # Regular URL joining
-        full_url = urljoin(self.base_url, url)
+            # Try multiple page load strategies if one fails
+            try:
+                # First attempt with networkidle
+                self._send_progress(
+                    ProgressStage.LOADING_PAGE, {"strategy": "networkidle"}
+                )
+                navigation = await page.goto(
+                    self.url, wait_until="networkidle", timeout=self._remaining_ms(45000)
+                )
+            except PlaywrightTimeoutError:
+                traceback.print_exc()
+                # Fallback to domcontentloaded which is less strict
+                self._send_progress(
+                    ProgressStage.LOADING_PAGE,
+                    {
+                        "strategy": "domcontentloaded",
+                        "note": "networkidle timed out",
+                    },
+                )
+                try:
+                    # Navigate with a more forgiving strategy
+                    navigation = await page.goto(
+                        self.url, wait_until="domcontentloaded", timeout=self._remaining_ms(30000)
+                    )
+                    # Wait a bit more for additional resources to load
+                    await page.wait_for_timeout(self._remaining_ms(5000))
+                except PlaywrightTimeoutError:
+                    traceback.print_exc()
+                    # Last resort: just load and wait a fixed time
+                    self._send_progress(
+                        ProgressStage.LOADING_PAGE,
+                        {"strategy": "load", "note": "domcontentloaded timed out"},
+                    )
+                    navigation = await page.goto(
+                        self.url, wait_until="load", timeout=self._remaining_ms(20000)
+                    )
+                    await page.wait_for_timeout(self._remaining_ms(3000))
 
-        # Clean up any unnecessary query parameters that might affect caching
-        parsed = urlparse(full_url)
-        clean_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+            # Wait a bit more to ensure dynamic content is loaded
+            self._send_progress(
+                ProgressStage.PAGE_LOADED,
+                {"waiting_for_content": True},
+            )
+            await page.wait_for_timeout(self._remaining_ms(2000))
 
-        # Keep query parameters for dynamic assets
-        if parsed.query and not any(
-            clean_url.endswith(ext)
-            for ext in [".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg"]
-        ):
-            clean_url += f"?{parsed.query}"
+            # Validators come from the document as served, before scripts run.
+            # So does the final URL: scripts may change page.url with
+            # history.pushState, which is not a redirect.
+            self.final_url = navigation.url if navigation else page.url
+            if navigation:
+                try:
+                    self.document = await navigation.body()
+                    self.validators = await cpu_pool.run(
+                        page_analysis.build_page_validators,
+                        navigation.url,
+                        self.document,
+                        _validator_headers(await navigation.all_headers()),
+                    )
+                except Exception as e:
+                    print(f"Error reading the document response: {str(e)}")
 
-        return clean_url
+            # Get the page content after JavaScript execution
+            self.content = await page.content()
+            self._send_progress(
+                ProgressStage.PARSING_CONTENT,
+                {
+                    "content_length": len(self.content),
+                },
+            )
 
-    def _get_closest_color_name(self, rgb):
-        """Get the closest color name for an RGB value"""
-        try:
-            hex_color = "#{:02x}{:02x}{:02x}".format(rgb[0], rgb[1], rgb[2])
-            color_name = webcolors.hex_to_name(hex_color)
-            return {"name": color_name, "hex": hex_color, "rgb": rgb}
-        except ValueError:
-            min_distance = float("inf")
-            closest_name = "Unknown"
-            for name, hex in webcolors.CSS3_NAMES_TO_HEX.items():
-                try:
-                    css_rgb = webcolors.hex_to_rgb(hex)
-                    distance = sum((abs(c1 - c2) for c1, c2 in zip(rgb, css_rgb)))
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_name = name
-                except ValueError:
-                    continue
-            hex_color = "#{:02x}{:02x}{:02x}".format(rgb[0], rgb[1], rgb[2])
-            return {"name": closest_name, "hex": hex_color, "rgb": rgb}
-
-    def _clean_svg(self, svg_str: str) -> str:
-        """Clean and format SVG content for better compatibility"""
-        # Remove unnecessary whitespace and formatting
-        svg_str = re.sub(r"\s+", " ", svg_str)
-        svg_str = re.sub(r"> <", "><", svg_str)
-
-        # Fix case sensitivity issues - convert viewbox to viewBox
-        svg_str = re.sub(r"\bviewbox\s*=", "viewBox=", svg_str)
-
-        # Find all viewBox attributes and their values
-        viewbox_matches = re.findall(r'viewBox\s*=\s*["\']([^"\']+)["\']', svg_str)
-
-        # If multiple viewBox attributes or invalid ones, fix them
-        if viewbox_matches:
-            # Remove all viewBox attributes
-            svg_str = re.sub(r'viewBox\s*=\s*["\'][^"\']+["\']', "", svg_str)
-
-            # Find the first valid viewBox (non-zero width and height)
-            valid_viewbox = None
-            for viewbox in viewbox_matches:
-                parts = viewbox.split()
-                if len(parts) == 4:
-                    try:
-                        x, y, width, height = [float(p) for p in parts]
-                        # Check for valid dimensions (non-zero)
-                        if width > 0 and height > 0:
-                            valid_viewbox = viewbox
-                            break
-                    except (ValueError, IndexError):
-                        continue
-
-            # If no valid viewBox found, try to create one from width/height
-            if not valid_viewbox:
-                width_match = re.search(r'width\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
-                height_match = re.search(r'height\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
-
-                if width_match and height_match:
-                    width = width_match.group(1)
-                    height = height_match.group(1)
-                    valid_viewbox = f"0 0 {width} {height}"
-                else:
-                    # Default viewBox for small icons
-                    valid_viewbox = "0 0 24 24"
-
-            # Add the valid viewBox back to the SVG
-            svg_str = svg_str.replace("<svg ", f'<svg viewBox="{valid_viewbox}" ')
-        else:
-            # No viewBox found, add one based on width/height or default
-            width_match = re.search(r'width\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
-            height_match = re.search(r'height\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
-
-            if width_match and height_match:
-                width = width_match.group(1)
-                height = height_match.group(1)
-                svg_str = svg_str.replace(
-                    "<svg ", f'<svg viewBox="0 0 {width} {height}" '
-                )
-            else:
-                # Add default viewBox and dimensions
-                svg_str = svg_str.replace("<svg ", '<svg viewBox="0 0 24 24" ')
-
-        # Ensure SVG has proper namespace
-        if not "xmlns=" in svg_str:
-            svg_str = svg_str.replace(
-                "<svg ", '<svg xmlns="http://www.w3.org/2000/svg" '
+            # Execute some JavaScript to find hidden resources
+            self._send_progress(ProgressStage.EXTRACTING_JS_RESOURCES, {})
+            resources_from_js = await page.evaluate(
+                """() => {
+                // Look for React props that might contain media URLs
+                const mediaUrls = [];
+
+                // Function to extract URLs from text
+                const extractUrls = (text) => {
+                    const urlRegex = /(https?:\/\/[^\s"'<>]+\.(jpg|jpeg|png|gif|webp|mp4|webm|ogg|mov))/gi;
+                    return text.match(urlRegex) || [];
+                };
+
+                // Scan all script tags for potential media URLs
+                document.querySelectorAll('script').forEach(script => {
+                    if (script.textContent) {
+                        const urls = extractUrls(script.textContent);
+                        urls.forEach(url => mediaUrls.push(url));
+                    }
+                });
+
+                // Look for React components with media
+                if (window.__INITIAL_STATE__ || window.__PRELOADED_STATE__) {
+                    const state = JSON.stringify(window.__INITIAL_STATE__ || window.__PRELOADED_STATE__);
+                    const urls = extractUrls(state);
+                    urls.forEach(url => mediaUrls.push(url));
+                }
+
+                // Try to find video elements that might be added dynamically
+                const videoSources = [];
+                document.querySelectorAll('video').forEach(video => {
+                    if (video.src) videoSources.push(video.src);
+                    video.querySelectorAll('source').forEach(source => {
+                        if (source.src) videoSources.push(source.src);
+                    });
+                });
+
+                return {
+                    mediaUrls: [...new Set(mediaUrls)],
+                    videoSources: [...new Set(videoSources)],
+                    lazyImages: Array.from(document.querySelectorAll('[data-src], [data-lazy], [data-lazy-src], [data-original]'))
+                        .map(img => ({
+                            src: img.src,
+                            dataSrc: img.dataset.src || img.dataset.lazy || img.dataset.lazySrc || img.dataset.original
+                        }))
+                        .filter(img => img.dataSrc)
+                };
+            }"""
             )
 
-        # Add default width/height if missing
-        if not "width=" in svg_str:
-            width = re.search(
-                r'viewBox\s*=\s*["\'][^"\']*\s+[^"\']*\s+([^"\']+)', svg_str
+            # Add the discovered resources
+            for url in resources_from_js.get("mediaUrls", []):
+                if any(
+                    url.endswith(ext)
+                    for ext in [".jpg", ".jpeg", ".png", ".gif", ".webp"]
+                ):
+                    if url not in self.assets["images"]:
+                        self.assets["images"].append(url)
+                elif any(
+                    url.endswith(ext) for ext in [".mp4", ".webm", ".ogg", ".mov"]
+                ):
+                    if url not in self.assets["videos"]:
+                        self.assets["videos"].append(url)
+
+            # Add video sources
+            for url in resources_from_js.get("videoSources", []):
+                if url not in self.assets["videos"]:
+                    self.assets["videos"].append(url)
+
+            # Add lazy-loaded images
+            for img_data in resources_from_js.get("lazyImages", []):
+                if img_data.get("dataSrc"):
+                    full_url = self._normalize_url(img_data["dataSrc"])
+                    if full_url and full_url not in self.assets["images"]:
+                        self.assets["images"].append(full_url)
+        finally:
+            await asyncio.shield(page.close())
+
+    async def _fetch_with_httpx(self):
+        """Fetch the raw HTML of the webpage without rendering it"""
+        response = await http_client.get(
+            self.url, headers=self.headers, timeout=self._remaining(30.0)
+        )
+        response.raise_for_status()
+        self.content = response.text
+        self.final_url = str(response.url)
+        self.document = response.content
+        self.validators = await cpu_pool.run(
+            page_analysis.build_page_validators,
+            str(response.url),
+            response.content,
+            _validator_headers(response.headers),
+        )
+
+    async def fetch_static_page(self):
+        """Fetch the webpage without a browser, for stages that only need its HTML"""
+        if self.snapshot is not None:
+            self._send_progress(
+                ProgressStage.FETCHING_PAGE, {"url": self.url, "method": "snapshot"}
             )
-            if width:
-                svg_str = svg_str.replace("<svg ", f'<svg width="{width.group(1)}" ')
-            else:
-                svg_str = svg_str.replace("<svg ", '<svg width="24" ')
-
-        if not "height=" in svg_str:
-            height = re.search(
-                r'viewBox\s*=\s*["\'][^"\']*\s+[^"\']*\s+[^"\']+\s+([^"\']+)', svg_str
+            self.document = self.snapshot
+            self.content = self.snapshot.decode("utf-8", errors="replace")
+            self._send_progress(
+                ProgressStage.PAGE_FETCH_COMPLETE, {"status": "success"}
             )
-            if height:
-                svg_str = svg_str.replace("<svg ", f'<svg height="{height.group(1)}" ')
-            else:
-                svg_str = svg_str.replace("<svg ", '<svg height="24" ')
-
-        # Fix issue with SVG containing HTML entities
-        svg_str = svg_str.replace("&nbsp;", " ")
-        svg_str = re.sub(
-            r"&([a-zA-Z]+);", lambda m: html.unescape(f"&{m.group(1)};"), svg_str
-        )
+            return True
 
-        return svg_str
+        self._send_progress(
+            ProgressStage.FETCHING_PAGE, {"url": self.url, "method": "httpx"}
+        )
 
-    def _svg_to_data_uri(self, svg_str: str) -> str:
-        """Convert SVG string to a data URI with improved encoding and path handling"""
         try:
-            # Clean the SVG first
-            svg_str = self._clean_svg(svg_str)
+            await self._fetch_with_httpx()
+        except Exception as e:
+            traceback.print_exc()
+            self._send_progress(ProgressStage.PAGE_FETCH_ERROR, {"error": str(e)})
+            print(f"Error fetching page: {str(e)}")
+            return False
 
-            # Add default attributes if missing to improve compatibility
-            if not "width" in svg_str and not "height" in svg_str:
-                svg_str = svg_str.replace("<svg", '<svg width="24" height="24"')
+        self._send_progress(ProgressStage.PAGE_FETCH_COMPLETE, {"status": "success"})
+        return True
+
+    def _normalize_url(self, url):
+        """Convert relative URLs to absolute URLs, see page_analysis.normalize_url"""
+        return page_analysis.normalize_url(url, self.base_url)
 
-            # Make sure paths have proper attributes
-            svg_str = self._fix_svg_paths(svg_str)
+    async def _load_svg_sprite(self, sprite_url: str) -> Dict[str, str]:
+        """Fetch and index an external sprite, at most once per extraction"""
+        if sprite_url in self.svg_sprites:
+            return self.svg_sprites[sprite_url]
 
-            # Base64 encoding - better compatibility for all browsers
-            encoded_svg = base64.b64encode(svg_str.encode("utf-8")).decode("utf-8")
-            return f"data:image/svg+xml;base64,{encoded_svg}"
+        symbols = {}
+        try:
+            response = await http_client.get(
+                sprite_url, headers=self.headers, timeout=self._remaining(10.0)
+            )
+            if response.status_code == 200:
+                symbols = await cpu_pool.run(page_analysis.index_sprite, response.text)
         except Exception as e:
-            print(f"Error converting SVG to data URI: {e}")
-            return ""
-
-    def _fix_svg_paths(self, svg_str: str) -> str:
-        """Ensure SVG paths have necessary attributes for proper rendering"""
-        # Find paths without fill or stroke
-        path_regex = r"<path([^>]*)>"
-        paths = re.findall(path_regex, svg_str)
-
-        for path_attrs in paths:
-            if "fill" not in path_attrs and "stroke" not in path_attrs:
-                # Add default fill to ensure path is visible
-                new_path_attrs = path_attrs + ' fill="currentColor"'
-                svg_str = svg_str.replace(
-                    f"<path{path_attrs}>", f"<path{new_path_attrs}>"
-                )
+            print(f"Error fetching SVG sprite {sprite_url}: {str(e)}")
 
-        # Also fix rect, circle, and polygon elements without fill
-        for tag in ["rect", "circle", "ellipse", "polygon", "polyline"]:
-            tag_regex = f"<{tag}([^>]*)>"
-            elements = re.findall(tag_regex, svg_str)
+        # Failed fetches are cached too, so a broken sprite is only tried once
+        self.svg_sprites[sprite_url] = symbols
+        return symbols
 
-            for elem_attrs in elements:
-                if "fill" not in elem_attrs and "stroke" not in elem_attrs:
-                    new_attrs = elem_attrs + ' fill="currentColor"'
-                    svg_str = svg_str.replace(
-                        f"<{tag}{elem_attrs}>", f"<{tag}{new_attrs}>"
-                    )
+    async def _gather_bounded(self, coroutines: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run coroutines keyed by URL with at most SVG_FETCH_CONCURRENCY in flight.
 
-        return svg_str
+        Whatever has not finished after SVG_FETCH_DEADLINE seconds, or by the
+        deadline of the extraction, is cancelled and left out of the returned
+        results.
+        """
+        if not coroutines:
+            return {}
 
-    def _is_svg_icon(self, svg_str: str) -> bool:
-        """Determine if an SVG is likely an icon based on its attributes and content"""
-        # Check for common icon indicators in the SVG string
-        icon_indicators = ["icon", "logo", "glyph", "symbol", "button", "arrow", "menu"]
-        if any(indicator in svg_str.lower() for indicator in icon_indicators):
-            return True
+        semaphore = asyncio.Semaphore(SVG_FETCH_CONCURRENCY)
+
+        async def run(key, coroutine):
+            async with semaphore:
+                return key, await coroutine
 
-        # Check if it has a small viewBox or width/height
-        viewbox_match = re.search(
-            r'viewBox=["\']0 0 (\d+(?:\.\d+)?) (\d+(?:\.\d+)?)["\']', svg_str
+        tasks = [asyncio.create_task(run(key, c)) for key, c in coroutines.items()]
+        try:
+            done, pending = await asyncio.wait(
+                tasks, timeout=self._remaining(SVG_FETCH_DEADLINE)
+            )
+        finally:
+            # Also when the extraction is cancelled, so no request outlives it
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Coroutines still waiting on the semaphore never started
+            for coroutine in coroutines.values():
+                coroutine.close()
+        if pending:
+            print(f"SVG fetch deadline reached, skipped {len(pending)} resources")
+
+        results = {}
+        for task in done:
+            if not task.cancelled() and task.exception() is None:
+                key, value = task.result()
+                results[key] = value
+        return results
+
+    async def _load_svg_sprites(self, sprite_urls: Iterable[str]):
+        """Fetch and index every external sprite concurrently"""
+        await self._gather_bounded(
+            {url: self._load_svg_sprite(url) for url in sprite_urls}
         )
-        if viewbox_match:
-            width = float(viewbox_match.group(1))
-            height = float(viewbox_match.group(2))
-            # If smaller than 100x100, likely an icon
-            if width <= 100 and height <= 100:
-                return True
 
-        # Check explicit width/height attributes
-        width_match = re.search(r'width=["\'](\d+(?:\.\d+)?)', svg_str)
-        height_match = re.search(r'height=["\'](\d+(?:\.\d+)?)', svg_str)
-        if width_match and height_match:
-            width = float(width_match.group(1))
-            height = float(height_match.group(1))
-            # If smaller than 100x100, likely an icon
-            if width <= 100 and height <= 100:
-                return True
+    async def _fetch_external_svg(self, svg_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch and normalize an external SVG through the process-wide SVG cache.
+
+        Fresh cache entries are used as they are; older ones are revalidated
+        with their ETag / Last-Modified so an unchanged file is not downloaded
+        or cleaned again.
+        """
+        cached = _svg_cache.get(svg_url)
+        if cached and time.monotonic() - cached["checked_at"] < SVG_CACHE_FRESH_FOR:
+            _svg_cache.move_to_end(svg_url)
+            return cached
+
+        headers = dict(self.headers)
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
 
-        # Check if it has a single path and simple structure (common for icons)
-        path_count = svg_str.count("<path")
-        if path_count > 0 and path_count < 10 and svg_str.count("<") < 30:
-            return True
+        try:
+            response = await http_client.get(
+                svg_url, headers=headers, timeout=self._remaining(10.0)
+            )
+        except Exception as e:
+            print(f"Error fetching external SVG {svg_url}: {str(e)}")
+            return None
 
-        # Check for specific attributes commonly used in icons
-        if "stroke-width=" in svg_str and 'fill="none"' in svg_str:
-            return True
+        if response.status_code == 304 and cached:
+            cached["checked_at"] = time.monotonic()
+            _svg_cache.move_to_end(svg_url)
+            return cached
 
-        return False
+        if response.status_code != 200:
+            return None
 
-    def _prepare_svg_for_frontend(self, svg_str: str) -> str:
-        """Prepare SVG content for frontend display (without base64 encoding)"""
-        try:
-            # Clean and fix paths in the SVG
-            svg_str = self._clean_svg(svg_str)
-            svg_str = self._fix_svg_paths(svg_str)
+        [(markup, is_icon)] = await cpu_pool.run(
+            page_analysis.process_svgs, [response.text]
+        )
+        entry = {
+            "markup": markup,
+            "is_icon": is_icon,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "checked_at": time.monotonic(),
+        }
 
-            return svg_str
-        except Exception as e:
-            print(f"Error preparing SVG for frontend: {e}")
-            return ""
+        _svg_cache[svg_url] = entry
+        _svg_cache.move_to_end(svg_url)
+        while len(_svg_cache) > SVG_CACHE_MAX_ENTRIES:
+            _svg_cache.popitem(last=False)
+
+        return entry
+
+    async def _fetch_external_svgs(
+        self, svg_urls: Iterable[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch external SVGs concurrently, returning the successful ones by URL"""
+        results = await self._gather_bounded(
+            {url: self._fetch_external_svg(url) for url in svg_urls}
+        )
+        return {url: entry for url, entry in results.items() if entry}
+
+    def _add_assets(self, category: str, items: Iterable[str]):
+        """Append items to an asset category, skipping the ones it lists"""
+        known = set(self.assets[category])
+        for item in items:
+            if item and item not in known:
+                known.add(item)
+                self.assets[category].append(item)
+
+    async def _add_svg_assets(self, svgs: List[str]):
+        """Clean SVGs and file them under icons or regular SVGs"""
+        if not svgs:
+            return
+
+        processed = await cpu_pool.run(page_analysis.process_svgs, svgs)
+        for processed_svg, is_icon in processed:
+            if processed_svg:
+                self._add_assets("icons" if is_icon else "svgs", [processed_svg])
 
     async def extract_css_colors(self):
         """Extract colors from CSS files and inline styles"""
         self._send_progress(ProgressStage.EXTRACTING_COLORS, {"stage": "css"})
-        # Dictionary to track color frequency
-        color_frequency = {}
-
-        # Get colors from style tags
-        for style in self.soup.find_all("style"):
-            if style.string:
-                css = cssutils.parseString(style.string)
-                for rule in css:
-                    if rule.type == rule.STYLE_RULE:
-                        for property in rule.style:
-                            if (
-                                "color" in property.name
-                                or "background" in property.name
-                            ):
-                                # Extract colors from the property value
-                                color_values = re.findall(
-                                    r"#(?:[0-9a-fA-F]{3}){1,2}|rgb\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*\)|rgba\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*,\s*[\d.]+\s*\)",
-                                    property.value,
-                                )
-                                for color in color_values:
-                                    if color in color_frequency:
-                                        color_frequency[color] += 1
-                                    else:
-                                        color_frequency[color] = 1
+        # Colors of the style tags by frequency, read when the page was analyzed
+        color_frequency = dict(self.analysis.get("style_colors", {}))
 
         # Get colors from computed styles (React and dynamically generated CSS)
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context(
-                    viewport={"width": 1280, "height": 800}
+            async with self._new_page() as page:
+                await page.goto(
+                    self.url,
+                    wait_until="networkidle",
+                    timeout=self._remaining_ms(30000),
                 )
-                page = await context.new_page()
-                await page.goto(self.url, wait_until="networkidle")
 
                 # Extract colors from computed styles of elements
                 colors_from_computed = await page.evaluate(
@@ -583,51 +635,17 @@ class WebAssetExtractor:
                         color_frequency[color] += 1
                     else:
                         color_frequency[color] = 1
-
-                await browser.close()
         except Exception as e:
             traceback.print_exc()
             print(f"Error extracting computed styles: {str(e)}")
 
-        # Process the colors
-        processed_colors = []
-        for color, count in color_frequency.items():
-            if color.startswith("#"):
-                # Convert hex to RGB
-                if len(color) == 4:  # Short form (#RGB)
-                    r = int(color[1] + color[1], 16)
-                    g = int(color[2] + color[2], 16)
-                    b = int(color[3] + color[3], 16)
-                else:  # Normal form (#RRGGBB)
-                    r = int(color[1:3], 16)
-                    g = int(color[3:5], 16)
-                    b = int(color[5:7], 16)
-                color_info = self._get_closest_color_name((r, g, b))
-                color_info["count"] = count
-                color_info["percentage"] = (
-                    None  # CSS colors don't have a meaningful percentage
-                )
-                processed_colors.append(color_info)
-            elif color.startswith("rgb(") or color.startswith("rgba("):
-                # Extract RGB values
-                rgb_values = re.findall(r"\d+", color)[:3]
-                if len(rgb_values) == 3:
-                    rgb = tuple(int(v) for v in rgb_values)
-                    color_info = self._get_closest_color_name(rgb)
-                    color_info["count"] = count
-                    color_info["percentage"] = None
-                    processed_colors.append(color_info)
-
-        # Remove duplicates and sort by frequency (count)
-        unique_colors = []
-        seen_hex = set()
-        for color in processed_colors:
-            if color["hex"] not in seen_hex:
-                seen_hex.add(color["hex"])
-                unique_colors.append(color)
-
-        # Sort colors by count (frequency) in descending order
-        self.css_colors = sorted(unique_colors, key=lambda x: x["count"], reverse=True)
+        # Name the colors and sort them by count (frequency) in descending order
+        self.css_colors = await cpu_pool.run(
+            page_analysis.summarize_css_colors, color_frequency
+        )
+        self._send_items(
+            ItemBatchEvent.COLOR_BATCH, {"source": "from_css", "items": self.css_colors}
+        )
         self._send_progress(
             ProgressStage.COLORS_EXTRACTED,
             {"count": len(self.css_colors), "source": "css"},
@@ -643,57 +661,33 @@ class WebAssetExtractor:
             {"stage": "images", "count": len(image_urls)},
         )
 
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-            for img_url in image_urls:
-                try:
-                    if not img_url.startswith(("http://", "https://")):
-                        img_url = urljoin(self.base_url, img_url)
+        for img_url in image_urls:
+            try:
+                if not img_url.startswith(("http://", "https://")):
+                    img_url = urljoin(self.base_url, img_url)
 
-                    if img_url.startswith("data:"):
-                        continue  # Skip data URLs
+                if img_url.startswith("data:"):
+                    continue  # Skip data URLs
 
-                    response = await client.get(
-                        img_url, headers=self.headers, timeout=10.0
+                response = await http_client.get(
+                    img_url, headers=self.headers, timeout=self._remaining(10.0)
+                )
+                if response.status_code == 200:
+                    # Decoding and quantizing the image is the slow part
+                    colors = await cpu_pool.run(
+                        page_analysis.get_image_colors,
+                        response.content,
+                        img_url,
                     )
-                    if response.status_code == 200:
-                        img = Image.open(BytesIO(response.content))
-
-                        # Resize image to speed up processing
-                        max_size = (150, 150)
-                        img.thumbnail(max_size, Image.LANCZOS)
-
-                        # Convert to RGB if needed (handles PNG with transparency)
-                        if img.mode != "RGB":
-                            img = img.convert("RGB")
-
-                        # Extract colors with a minimum area of 0.5%
-                        colors = extcolors.extract_from_image(
-                            img, tolerance=12, limit=5
-                        )
-                        total_pixels = img.width * img.height
-
-                        for color, count in colors[0]:
-                            # Skip colors that are too common (likely white/black backgrounds)
-                            color_info = self._get_closest_color_name(color)
-                            color_info["count"] = count
-                            color_info["percentage"] = round(
-                                (count / total_pixels) * 100, 2
-                            )
-                            color_info["source"] = img_url
-
-                            # Skip near-white or near-black colors
-                            is_near_white = all(c > 240 for c in color)
-                            is_near_black = all(c < 15 for c in color)
-
-                            if (
-                                not (is_near_white or is_near_black)
-                                or color_info["percentage"] > 80
-                            ):
-                                self.image_colors.append(color_info)
-                except Exception as e:
-                    # traceback.print_exc()
-                    print(f"Error processing image {img_url}: {str(e)}")
-                    continue
+                    self.image_colors.extend(colors)
+                    self._send_items(
+                        ItemBatchEvent.COLOR_BATCH,
+                        {"source": "from_images", "items": colors},
+                    )
+            except Exception as e:
+                # traceback.print_exc()
+                print(f"Error processing image {img_url}: {str(e)}")
+                continue
 
         # Sort the image colors by percentage/count in descending order
         self.image_colors = sorted(
@@ -709,92 +703,17 @@ class WebAssetExtractor:
     async def extract_fonts(self):
         """Extract fonts from the webpage"""
         self._send_progress(ProgressStage.EXTRACTING_FONTS, {})
-        # Check for Google Fonts
-        google_fonts_links = self.soup.find_all(
-            "link", href=re.compile("fonts.googleapis.com")
-        )
-        for link in google_fonts_links:
-            href = link.get("href", "")
-            # Extract font family names from Google Fonts URL
-            font_families = re.findall(r"family=([^&:]+)", href)
-            for family in font_families:
-                family_name = family.replace("+", " ")
-                if {
-                    "name": family_name,
-                    "type": "Google Font",
-                    "url": href,
-                } not in self.fonts:
-                    self.fonts.append(
-                        {"name": family_name, "type": "Google Font", "url": href}
-                    )
-
-        # Check for Adobe Fonts (Typekit)
-        typekit_links = self.soup.find_all(
-            "link", href=re.compile("use.typekit.net|use.edgefonts.net")
-        )
-        for link in typekit_links:
-            href = link.get("href", "")
-            if {"name": "Adobe Font", "type": "Typekit", "url": href} not in self.fonts:
-                self.fonts.append(
-                    {"name": "Adobe Font", "type": "Typekit", "url": href}
-                )
-
-        # Extract @font-face declarations from style tags
-        for style in self.soup.find_all("style"):
-            if style.string:
-                font_face_blocks = re.findall(r"@font-face\s*{[^}]+}", style.string)
-                for block in font_face_blocks:
-                    font_family = re.search(
-                        r'font-family:\s*[\'"]?([^\'";}]+)[\'"]?', block
-                    )
-                    font_url = re.search(
-                        r'src:\s*url\([\'"]?([^\'"()]+)[\'"]?\)', block
-                    )
-
-                    if font_family:
-                        family_name = font_family.group(1).strip()
-                        url = font_url.group(1) if font_url else None
-                        if url:
-                            url = self._normalize_url(url)
-
-                        font_info = {
-                            "name": family_name,
-                            "type": "@font-face",
-                            "url": url,
-                        }
-                        if font_info not in self.fonts:
-                            self.fonts.append(font_info)
-
-        # Extract fonts from inline styles
-        all_elements = self.soup.find_all(style=True)
-        for element in all_elements:
-            style_attr = element.get("style", "")
-            font_family = re.search(r"font-family:\s*([^;]+)", style_attr)
-            if font_family:
-                families = [
-                    f.strip().strip("\"'") for f in font_family.group(1).split(",")
-                ]
-                for family in families:
-                    if family.lower() not in [
-                        "serif",
-                        "sans-serif",
-                        "monospace",
-                        "cursive",
-                        "fantasy",
-                    ]:
-                        font_info = {"name": family, "type": "inline", "url": None}
-                        if font_info not in self.fonts:
-                            self.fonts.append(font_info)
+        # Fonts the markup loads or names, read when the page was analyzed
+        self._add_fonts(self.analysis.get("fonts", []))
 
         # Try to extract fonts using Playwright's computed styles
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context(
-                    viewport={"width": 1280, "height": 800}
+            async with self._new_page() as page:
+                await page.goto(
+                    self.url,
+                    wait_until="networkidle",
+                    timeout=self._remaining_ms(30000),
                 )
-                page = await context.new_page()
-                await page.goto(self.url, wait_until="networkidle")
 
                 # Get computed font families from all elements
                 fonts_from_computed = await page.evaluate(
@@ -822,88 +741,52 @@ class WebAssetExtractor:
                 }"""
                 )
 
-                for font in fonts_from_computed:
-                    font_info = {"name": font, "type": "computed", "url": None}
-                    if not any(f["name"] == font for f in self.fonts):
-                        self.fonts.append(font_info)
-
-                await browser.close()
+                named = {f["name"] for f in self.fonts}
+                self._add_fonts(
+                    {"name": font, "type": "computed", "url": None}
+                    for font in fonts_from_computed
+                    if font not in named
+                )
         except Exception as e:
             traceback.print_exc()
             print(f"Error extracting fonts with Playwright: {str(e)}")
 
         # Get fonts from external CSS files
         stylesheets = self.assets["stylesheets"]
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-            for css_url in stylesheets:
-                try:
-                    if not css_url.startswith(("http://", "https://")):
-                        css_url = urljoin(self.base_url, css_url)
-
-                    if css_url.startswith("data:"):
-                        continue
+        for css_url in stylesheets:
+            try:
+                if not css_url.startswith(("http://", "https://")):
+                    css_url = urljoin(self.base_url, css_url)
 
-                    response = await client.get(
-                        css_url, headers=self.headers, timeout=10.0
-                    )
-                    if response.status_code == 200:
-                        # Extract @font-face declarations
-                        font_face_blocks = re.findall(
-                            r"@font-face\s*{[^}]+}", response.text
-                        )
-                        for block in font_face_blocks:
-                            font_family = re.search(
-                                r'font-family:\s*[\'"]?([^\'";}]+)[\'"]?', block
-                            )
-                            font_url = re.search(
-                                r'src:\s*url\([\'"]?([^\'"()]+)[\'"]?\)', block
-                            )
+                if css_url.startswith("data:"):
+                    continue
 
-                            if font_family:
-                                family_name = font_family.group(1).strip()
-                                url = font_url.group(1) if font_url else None
-                                if url:
-                                    url = self._normalize_url(url)
-
-                                font_info = {
-                                    "name": family_name,
-                                    "type": "@font-face (external)",
-                                    "url": url,
-                                }
-                                if font_info not in self.fonts:
-                                    self.fonts.append(font_info)
-
-                        # Extract font-family properties
-                        font_families = re.findall(
-                            r"font-family:\s*([^;]+)", response.text
+                response = await http_client.get(
+                    css_url, headers=self.headers, timeout=self._remaining(10.0)
+                )
+                if response.status_code == 200:
+                    self._add_fonts(
+                        await cpu_pool.run(
+                            page_analysis.parse_stylesheet_fonts,
+                            response.text,
+                            css_url,
+                            self.base_url,
                         )
-                        for families in font_families:
-                            for family in [
-                                f.strip().strip("\"'") for f in families.split(",")
-                            ]:
-                                if family.lower() not in [
-                                    "serif",
-                                    "sans-serif",
-                                    "monospace",
-                                    "cursive",
-                                    "fantasy",
-                                ]:
-                                    font_info = {
-                                        "name": family,
-                                        "type": "CSS",
-                                        "url": css_url,
-                                    }
-                                    if font_info not in self.fonts:
-                                        self.fonts.append(font_info)
-                except Exception as e:
-                    traceback.print_exc()
-                    print(f"Error processing CSS file {css_url}: {str(e)}")
-                    continue
+                    )
+            except Exception as e:
+                traceback.print_exc()
+                print(f"Error processing CSS file {css_url}: {str(e)}")
+                continue
 
         self._send_progress(ProgressStage.FONTS_EXTRACTED, {"count": len(self.fonts)})
 
-    async def extract_assets(self):
-        """Extract all assets from the webpage with improved detection"""
+    async def extract_assets(self, resolve_svgs: bool = True):
+        """
+        Extract all assets from the webpage with improved detection.
+
+        resolve_svgs=False skips downloading external SVGs and sprites, for
+        stages that only need the asset URLs.
+        """
         self._send_progress(ProgressStage.EXTRACTING_ASSETS, {"stage": "starting"})
         print("Extracting assets")
 
@@ -936,282 +819,52 @@ class WebAssetExtractor:
             ):
                 self.assets["stylesheets"].append(url)
 
-        # Extract image URLs - standard img tags
-        for img in self.soup.find_all("img", src=True):
-            img_url = self._normalize_url(img.get("src"))
-            if img_url and img_url not in self.assets["images"]:
-                self.assets["images"].append(img_url)
-
-            # Check for srcset attribute
-            if img.has_attr("srcset"):
-                srcset = img["srcset"]
-                urls = re.findall(r"([^\s,]+)(?:\s+\d+[wx])?(?:,|$)", srcset)
-                for src_url in urls:
-                    full_url = self._normalize_url(src_url)
-                    if full_url and full_url not in self.assets["images"]:
-                        self.assets["images"].append(full_url)
+        # Assets the markup references, read when the page was analyzed
+        found = self.analysis.get("assets", {})
+        for category in self.assets:
+            self._add_assets(category, found.get(category, []))
+        # (sprite URL, symbol id) -> None, for icons drawn from external sprites
+        sprite_refs = {tuple(ref): None for ref in found.get("sprite_refs", [])}
 
-        # Check for lazy-loaded images
-        for img in self.soup.find_all(["img", "div", "span"]):
-            for attr in [
-                "data-src",
-                "data-original",
-                "data-lazy",
-                "data-srcset",
-                "data-bg",
-            ]:
-                if img.has_attr(attr):
-                    attr_value = img[attr]
-                    if attr == "data-srcset":
-                        # Handle srcset format
-                        urls = re.findall(
-                            r"([^\s,]+)(?:\s+\d+[wx])?(?:,|$)", attr_value
-                        )
-                        for url in urls:
-                            full_url = self._normalize_url(url)
-                            if full_url and full_url not in self.assets["images"]:
-                                self.assets["images"].append(full_url)
-                    else:
-                        full_url = self._normalize_url(attr_value)
-                        if full_url and full_url not in self.assets["images"]:
-                            self.assets["images"].append(full_url)
-
-        # Extract inline SVG
-        for svg in self.soup.find_all("svg"):
-            svg_str = str(svg)
-            if svg_str:
-                # Convert inline SVG to data URI
-                svg_data = base64.b64encode(svg_str.encode("utf-8")).decode("utf-8")
-                data_uri = f"data:image/svg+xml;base64,{svg_data}"
-                if data_uri not in self.assets["images"]:
-                    self.assets["images"].append(data_uri)
-
-        # Extract inline SVG elements more thoroughly
-        svg_elements = self.soup.find_all("svg")
-        for svg in svg_elements:
-            try:
-                svg_str = str(svg)
-                if svg_str:
-                    # Debug info
-                    print(f"Processing SVG: {svg_str[:100]}...")
-
-                    # Clean and prepare the SVG for frontend
-                    processed_svg = self._prepare_svg_for_frontend(svg_str)
-                    if not processed_svg:
-                        continue
-
-                    # Determine if it's an icon or regular SVG
-                    is_icon = self._is_svg_icon(svg_str)
-
-                    if is_icon:
-                        print(f"Identified as icon: {processed_svg[:50]}...")
-                        if processed_svg not in self.assets["icons"]:
-                            self.assets["icons"].append(processed_svg)
-                    else:
-                        print(f"Identified as regular SVG: {processed_svg[:50]}...")
-                        if processed_svg not in self.assets["svgs"]:
-                            self.assets["svgs"].append(processed_svg)
-            except Exception as e:
-                print(f"Error processing inline SVG: {str(e)}")
-
-        # Also check for SVG content in HTML attributes like aria-label, title, etc.
-        for elem in self.soup.find_all(attrs={"aria-label": True}):
-            aria_label = elem.get("aria-label", "")
-            if aria_label.lower() in ["icon", "logo", "svg icon"]:
-                if elem.name == "div" and elem.get("class"):
-                    # This might be an SVG icon wrapped in a div
-                    try:
-                        # Try to get innerHTML
-                        inner_html = str(elem)
-                        if "<svg" in inner_html:
-                            svg_match = re.search(
-                                r"(<svg[^>]*>.*?</svg>)", inner_html, re.DOTALL
-                            )
-                            if svg_match:
-                                svg_str = svg_match.group(1)
-                                processed_svg = self._prepare_svg_for_frontend(svg_str)
-                                if (
-                                    processed_svg
-                                    and processed_svg not in self.assets["icons"]
-                                ):
-                                    self.assets["icons"].append(processed_svg)
-                    except Exception as e:
-                        print(f"Error processing potential SVG in div: {str(e)}")
-
-        # Look for SVG references in <img> and <object> tags
-        for tag in self.soup.find_all(["img", "object"]):
-            src = tag.get("src") or tag.get("data")
-            if src and src.endswith(".svg"):
-                try:
-                    svg_url = self._normalize_url(src)
-                    if svg_url:
-                        # For now, add to SVGs list - we'll process it later
-                        if svg_url not in self.assets["svgs"]:
-                            self.assets["svgs"].append(svg_url)
-                except Exception as e:
-                    print(f"Error processing SVG reference: {str(e)}")
+        # SVGs are sent once external ones are swapped for their markup
+        self._send_new_assets(
+            category for category in self.assets if category != "svgs"
+        )
 
-        # Process external SVG references
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-            for svg_url in list(
-                self.assets["svgs"]
-            ):  # Create a copy to avoid modification during iteration
-                if svg_url.startswith("<svg"):
-                    continue  # Skip SVG markup that's already processed
+        # Process external SVG references concurrently
+        external_svgs = [
+            svg_url
+            for svg_url in self.assets["svgs"]
+            if not svg_url.startswith("<svg") and svg_url.endswith(".svg")
+        ]
+        if not resolve_svgs:
+            external_svgs, sprite_refs = [], {}
+        fetched_svgs, _ = await run_together(
+            self._fetch_external_svgs(external_svgs),
+            self._load_svg_sprites({url for url, _ in sprite_refs}),
+        )
 
-                try:
-                    if svg_url.endswith(".svg"):
-                        response = await client.get(
-                            svg_url, headers=self.headers, timeout=10.0
-                        )
-                        if response.status_code == 200:
-                            svg_content = response.text
-                            # Remove the URL and add the processed SVG
-                            self.assets["svgs"].remove(svg_url)
-
-                            # Process SVG content
-                            processed_svg = self._prepare_svg_for_frontend(svg_content)
-
-                            # Determine if it's an icon or regular SVG
-                            is_icon = self._is_svg_icon(svg_content)
-                            if is_icon:
-                                if processed_svg not in self.assets["icons"]:
-                                    self.assets["icons"].append(processed_svg)
-                            else:
-                                if processed_svg not in self.assets["svgs"]:
-                                    self.assets["svgs"].append(processed_svg)
-                except Exception as e:
-                    print(f"Error fetching external SVG {svg_url}: {str(e)}")
-
-        # Extract video sources - standard video tags
-        for video in self.soup.find_all("video"):
-            # Check video src attribute
-            if video.has_attr("src"):
-                video_url = self._normalize_url(video.get("src"))
-                if video_url and video_url not in self.assets["videos"]:
-                    self.assets["videos"].append(video_url)
-
-            # Check source tags inside video
-            for source in video.find_all("source", src=True):
-                source_url = self._normalize_url(source.get("src"))
-                if source_url and source_url not in self.assets["videos"]:
-                    self.assets["videos"].append(source_url)
-
-            # Check poster attribute (thumbnail)
-            if video.has_attr("poster"):
-                poster_url = self._normalize_url(video.get("poster"))
-                if poster_url and poster_url not in self.assets["images"]:
-                    self.assets["images"].append(poster_url)
-
-        # Check for video in iframes (YouTube, Vimeo, etc.)
-        for iframe in self.soup.find_all("iframe", src=True):
-            iframe_src = iframe.get("src", "")
-            video_platforms = [
-                "youtube.com/embed/",
-                "player.vimeo.com",
-                "dailymotion.com/embed",
-                "facebook.com/plugins/video",
-                "instagram.com/tv/",
+        # Swap the fetched URLs for their processed markup in one pass
+        if fetched_svgs:
+            self.assets["svgs"] = [
+                svg for svg in self.assets["svgs"] if svg not in fetched_svgs
+            ]
+            for svg_url in external_svgs:
+                entry = fetched_svgs.get(svg_url)
+                if entry and entry["markup"]:
+                    category = "icons" if entry["is_icon"] else "svgs"
+                    self._add_assets(category, [entry["markup"]])
+
+        # Materialize icons referenced from external sprites
+        await self._add_svg_assets(
+            [
+                self.svg_sprites[sprite_url][symbol_id]
+                for sprite_url, symbol_id in sprite_refs
+                if symbol_id in self.svg_sprites.get(sprite_url, {})
             ]
-
-            if any(platform in iframe_src for platform in video_platforms):
-                if iframe_src not in self.assets["videos"]:
-                    self.assets["videos"].append(iframe_src)
-
-        # Look for custom video players
-        video_players = self.soup.find_all(
-            ["div", "span"],
-            class_=lambda c: c
-            and any(
-                cls in c
-                for cls in [
-                    "video-player",
-                    "video-container",
-                    "player",
-                    "jwplayer",
-                    "video-js",
-                ]
-            ),
         )
 
-        for player in video_players:
-            # Look for data attributes that might contain video URLs
-            for attr in player.attrs:
-                if attr.startswith("data-") and isinstance(player[attr], str):
-                    value = player[attr]
-                    if any(ext in value for ext in [".mp4", ".webm", ".ogg", ".mov"]):
-                        video_url = self._normalize_url(value)
-                        if video_url and video_url not in self.assets["videos"]:
-                            self.assets["videos"].append(video_url)
-
-        # Extract JavaScript files
-        for script in self.soup.find_all("script", src=True):
-            script_url = self._normalize_url(script.get("src"))
-            if script_url and script_url not in self.assets["scripts"]:
-                self.assets["scripts"].append(script_url)
-
-        # Extract CSS files
-        for link in self.soup.find_all("link", rel="stylesheet"):
-            if link.has_attr("href"):
-                css_url = self._normalize_url(link.get("href"))
-                if css_url and css_url not in self.assets["stylesheets"]:
-                    self.assets["stylesheets"].append(css_url)
-
-        # Look for background images in inline styles - improved detection
-        for elem in self.soup.find_all(style=True):
-            style = elem.get("style", "")
-            urls = re.findall(
-                r'background(?:-image)?:\s*url\([\'"]?([^\'"()]+)[\'"]?\)', style
-            )
-            for url in urls:
-                full_url = self._normalize_url(url)
-                if full_url and full_url not in self.assets["images"]:
-                    self.assets["images"].append(full_url)
-
-        # Look for backgroundImage in style attribute (React style) - Fixed to handle None values
-        try:
-            # Safer implementation that handles None values properly
-            for elem in self.soup.find_all():
-                for attr_name, attr_value in elem.attrs.items():
-                    if (
-                        "style" in attr_name
-                        and attr_value
-                        and isinstance(attr_value, str)
-                    ):
-                        if (
-                            "backgroundImage" in attr_value
-                            or "background-image" in attr_value
-                        ):
-                            urls = re.findall(
-                                r'url\([\'"]?([^\'"()]+)[\'"]?\)', attr_value
-                            )
-                            for url in urls:
-                                full_url = self._normalize_url(url)
-                                if full_url and full_url not in self.assets["images"]:
-                                    self.assets["images"].append(full_url)
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error extracting background images from style attributes: {str(e)}")
-
-        # Additional search for React inline styles with object notation
-        try:
-            if self.soup:
-                scripts = self.soup.find_all("script")
-                for script in scripts:
-                    if script.string:
-                        # Look for image URLs in background/backgroundImage style objects
-                        bg_urls = re.findall(
-                            r'[\'"]?(?:background|backgroundImage)[\'"]?\s*:\s*[\'"]url\([\'"]?([^\'"()]+)[\'"]?\)[\'"]',
-                            script.string,
-                        )
-                        for url in bg_urls:
-                            full_url = self._normalize_url(url)
-                            if full_url and full_url not in self.assets["images"]:
-                                self.assets["images"].append(full_url)
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error extracting background images from scripts: {str(e)}")
-
+        self._send_new_assets(["icons", "svgs"])
         print("Assets extraction complete.")
 
         self._send_progress(
@@ -1227,45 +880,253 @@ class WebAssetExtractor:
         )
 
     async def extract_all(self):
-        """Extract all information from the webpage"""
-        success = await self.fetch_page()
-        if not success:
+        """
+        Extract the requested stages from the webpage.
+
+        Only the work those stages need is planned: Chromium is skipped
+        entirely when no stage reads computed styles, and assets are only
+        discovered when a stage uses them.
+
+        When the deadline passes first, the stages still running are
+        cancelled and what was extracted is returned, flagged as partial.
+        Only the stages that finished are listed in its stages.
+        """
+        extraction = self._extract_stages()
+        if self.deadline is not None:
+            extraction = asyncio.wait_for(extraction, timeout=self._remaining(None))
+
+        try:
+            error = await extraction
+        except asyncio.TimeoutError:
+            error = None
+
+        unfinished = self.stages - self.finished_stages
+        if error and not self._deadline_passed():
+            self._send_progress(ProgressStage.EXTRACTION_FAILED, {"error": error})
+            return {"error": error}
+
+        if unfinished:
+            print(f"Deadline reached, unfinished stages: {sorted(unfinished)}")
             self._send_progress(
-                ProgressStage.EXTRACTION_FAILED,
-                {"error": "Failed to fetch the webpage"},
+                ProgressStage.DEADLINE_REACHED, {"unfinished_stages": sorted(unfinished)}
             )
-            return {"error": "Failed to fetch the webpage"}
+        else:
+            # Mark extraction as complete
+            self.extraction_complete = True
+            self._send_progress(ProgressStage.EXTRACTION_COMPLETE, {})
+
+        result = {
+            "url": self.url,
+            "final_url": self.final_url or self.url,
+            "stages": sorted(self.finished_stages),
+            "colors": {"from_css": self.css_colors, "from_images": self.image_colors},
+            "fonts": self.fonts,
+            "assets": (
+                self.assets
+                if ExtractionStage.ASSETS in self.stages
+                else {category: [] for category in self.assets}
+            ),
+            "validators": self.validators,
+            "html": self.document,
+        }
+        if unfinished:
+            result["partial"] = True
+            result["unfinished_stages"] = sorted(unfinished)
+        return result
+
+    async def _extract_stages(self) -> Optional[str]:
+        """Fetch the page and extract the stages, returning an error message on failure"""
+        if self.stages & BROWSER_STAGES:
+            success = await self.fetch_page()
+        else:
+            success = await self.fetch_static_page()
+
+        if not success:
+            return "Failed to fetch the webpage"
 
         print("Page fetched successfully, starting extraction...")
 
-        await self.extract_assets()
+        # Parse the page once, in the CPU pool, for every stage that reads it
+        parts = set()
+        if self.stages & ASSET_DISCOVERY_STAGES:
+            parts.add("assets")
+        if ExtractionStage.FONTS in self.stages:
+            parts.add("fonts")
+        if ExtractionStage.CSS_COLORS in self.stages:
+            parts.add("style_colors")
+        if parts:
+            self.analysis = await cpu_pool.run(
+                page_analysis.analyze_document, self.content, self.base_url, sorted(parts)
+            )
+
+        if self.stages & ASSET_DISCOVERY_STAGES:
+            await self.extract_assets(
+                resolve_svgs=ExtractionStage.ASSETS in self.stages
+            )
+            if ExtractionStage.ASSETS in self.stages:
+                self._finish_stage(ExtractionStage.ASSETS)
+
+        async def extract_stage(stage: ExtractionStage, extraction):
+            await extraction
+            self._finish_stage(stage)
 
         # Process data in parallel for better performance
-        await asyncio.gather(
-            self.extract_css_colors(),
-            # self.extract_dominant_image_colors(),
-            self.extract_fonts(),
+        tasks = []
+        if ExtractionStage.CSS_COLORS in self.stages:
+            tasks.append(
+                extract_stage(ExtractionStage.CSS_COLORS, self.extract_css_colors())
+            )
+        if ExtractionStage.IMAGE_COLORS in self.stages:
+            tasks.append(
+                extract_stage(
+                    ExtractionStage.IMAGE_COLORS, self.extract_dominant_image_colors()
+                )
+            )
+        if ExtractionStage.FONTS in self.stages:
+            tasks.append(extract_stage(ExtractionStage.FONTS, self.extract_fonts()))
+        await run_together(*tasks)
+        return None
+
+
+async def run_together(*coroutines) -> list:
+    """
+    Run coroutines concurrently, like asyncio.gather. When one of them fails,
+    or the caller is cancelled, the others are cancelled and waited for, so
+    that the browsers and connections they hold are released before this
+    returns.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def get_remaining(deadline: Optional[float], cap: Optional[float]) -> Optional[float]:
+    """
+    Seconds a step may take: cap, or what is left before a deadline if that
+    is less. Never 0, which httpx and Playwright take as no timeout at all.
+
+    Args:
+        deadline: Epoch time the work must end by, None for no deadline.
+        cap: The usual timeout of the step, None for none.
+    """
+    if deadline is None:
+        return cap
+    remaining = max(0.001, deadline - time.time())
+    return remaining if cap is None else min(cap, remaining)
+
+
+def _validator_headers(headers) -> Dict[str, str]:
+    """The response headers page validators read, by lowercase name"""
+    return {
+        name: headers.get(name)
+        for name in ("etag", "last-modified")
+        if headers.get(name)
+    }
+
+
+def get_changed_stages(previous: Dict[str, Any], current: Dict[str, Any]) -> Set[str]:
+    """The stages whose inputs differ between two sets of page validators"""
+    if previous.get("document_hash") == current.get("document_hash"):
+        return set()
+
+    return {
+        stage
+        for stage, field in STAGE_INPUTS.items()
+        if previous.get(field) != current.get(field)
+    }
+
+
+async def revalidate_page(
+    url: str, previous: Dict[str, Any], deadline: Optional[float] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Check a page against the validators of its last extraction with a
+    conditional GET, without rendering it, before the deadline if one is given.
+
+    Returns:
+        The current validators (the previous ones when the server answered
+        304 Not Modified), or None if the page could not be fetched.
+    """
+    headers = dict(PAGE_HEADERS)
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    try:
+        response = await http_client.get(
+            url, headers=headers, timeout=get_remaining(deadline, 15.0)
         )
+    except Exception as e:
+        print(f"Error revalidating {url}: {str(e)}")
+        return None
+
+    if response.status_code == 304:
+        return previous
+
+    if response.status_code != 200:
+        return None
+
+    return await cpu_pool.run(
+        page_analysis.build_page_validators,
+        str(response.url),
+        response.content,
+        _validator_headers(response.headers),
+    )
+
+
+@asynccontextmanager
+async def launch_browser_context(user_agent: str = PAGE_HEADERS["User-Agent"]):
+    """
+    Launch Chromium and open a browser context in it. The browser is closed
+    on the way out, even when the caller is cancelled: the close is shielded,
+    and stopping Playwright kills what a second cancellation leaves running.
+    """
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            yield await browser.new_context(
+                viewport=BROWSER_VIEWPORT, user_agent=user_agent
+            )
+        finally:
+            await asyncio.shield(browser.close())
 
-        # Mark extraction as complete
-        self.extraction_complete = True
-        self._send_progress(ProgressStage.EXTRACTION_COMPLETE, {})
 
-        return {
-            "url": self.url,
-            "colors": {"from_css": self.css_colors, "from_images": self.image_colors},
-            "fonts": self.fonts,
-            "assets": self.assets,
-        }
+def shared_browser_context():
+    """
+    A browser context for several extractions to render their pages in, so
+    that they share one Chromium and its cache instead of launching their own.
+    """
+    return launch_browser_context()
 
 
-async def extract_from_url(url):
+async def extract_from_url(url, stages=None, deadline=None):
     """Utility function to extract assets from a URL"""
-    extractor = WebAssetExtractor(url)
+    extractor = WebAssetExtractor(url, stages=stages, deadline=deadline)
     return await extractor.extract_all()
 
 
-async def stream_extraction_from_url(url, progress_callback):
+async def stream_extraction_from_url(
+    url,
+    progress_callback,
+    stages=None,
+    snapshot=None,
+    browser_context=None,
+    deadline=None,
+    items_callback=None,
+):
     """Utility function to extract assets from a URL with progress updates"""
-    extractor = WebAssetExtractor(url, progress_callback)
+    extractor = WebAssetExtractor(
+        url,
+        progress_callback,
+        stages=stages,
+        snapshot=snapshot,
+        browser_context=browser_context,
+        deadline=deadline,
+        items_callback=items_callback,
+    )
     return await extractor.extract_all()
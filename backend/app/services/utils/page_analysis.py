@@ -0,0 +1,773 @@
+"""
+The CPU-bound parts of an extraction: parsing documents, SVGs, stylesheets
+and images. Every function here is pure and module level, so that it can run
+in the CPU pool (app/root/cpu_pool.py), and takes and returns plain values.
+"""
+
+import base64
+import hashlib
+import html
+import logging
+import re
+import traceback
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlparse
+
+import cssutils
+import extcolors
+import webcolors
+from bs4 import BeautifulSoup
+from PIL import Image
+
+# Suppress cssutils log messages, in the pool processes too
+cssutils.log.setLevel(logging.CRITICAL)
+
+# Markup the assets and image colors are read from
+ASSET_TAGS = ["img", "source", "video", "picture", "svg", "link", "script", "meta"]
+# Attributes that change on every response without changing the page
+VOLATILE_ATTRIBUTES = {"nonce", "integrity"}
+
+GENERIC_FONT_FAMILIES = ["serif", "sans-serif", "monospace", "cursive", "fantasy"]
+
+COLOR_PATTERN = r"#(?:[0-9a-fA-F]{3}){1,2}|rgb\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*\)|rgba\(\s*\d+\s*,\s*\d+\s*,\s*\d+\s*,\s*[\d.]+\s*\)"
+SRCSET_PATTERN = r"([^\s,]+)(?:\s+\d+[wx])?(?:,|$)"
+FONT_FACE_PATTERN = r"@font-face\s*{[^}]+}"
+FONT_FACE_FAMILY_PATTERN = r'font-family:\s*[\'"]?([^\'";}]+)[\'"]?'
+FONT_FACE_URL_PATTERN = r'src:\s*url\([\'"]?([^\'"()]+)[\'"]?\)'
+
+
+def normalize_url(url: Optional[str], base_url: str) -> Optional[str]:
+    """Convert relative URLs to absolute URLs with improved handling"""
+    if not url:
+        return None
+    if url.startswith("data:"):
+        return url
+
+    # Handle special cases
+    url = url.strip()
+
+    # Remove URL encoded characters
+    url = unquote(url)
+
+    # Handle protocol-relative URLs (//example.com/image.jpg)
+    if url.startswith("//"):
+        return f"{urlparse(base_url).scheme}:{url}"
+
+    # Regular URL joining
+    full_url = urljoin(base_url, url)
+
+    # Clean up any unnecessary query parameters that might affect caching
+    parsed = urlparse(full_url)
+    clean_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+    # Keep query parameters for dynamic assets
+    if parsed.query and not any(
+        clean_url.endswith(ext)
+        for ext in [".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg"]
+    ):
+        clean_url += f"?{parsed.query}"
+
+    return clean_url
+
+
+def get_closest_color_name(rgb) -> Dict[str, Any]:
+    """Get the closest color name for an RGB value"""
+    try:
+        hex_color = "#{:02x}{:02x}{:02x}".format(rgb[0], rgb[1], rgb[2])
+        color_name = webcolors.hex_to_name(hex_color)
+        return {"name": color_name, "hex": hex_color, "rgb": rgb}
+    except ValueError:
+        min_distance = float("inf")
+        closest_name = "Unknown"
+        for name, hex in webcolors.CSS3_NAMES_TO_HEX.items():
+            try:
+                css_rgb = webcolors.hex_to_rgb(hex)
+                distance = sum((abs(c1 - c2) for c1, c2 in zip(rgb, css_rgb)))
+                if distance < min_distance:
+                    min_distance = distance
+                    closest_name = name
+            except ValueError:
+                continue
+        hex_color = "#{:02x}{:02x}{:02x}".format(rgb[0], rgb[1], rgb[2])
+        return {"name": closest_name, "hex": hex_color, "rgb": rgb}
+
+
+def clean_svg(svg_str: str) -> str:
+    """Clean and format SVG content for better compatibility"""
+    # Remove unnecessary whitespace and formatting
+    svg_str = re.sub(r"\s+", " ", svg_str)
+    svg_str = re.sub(r"> <", "><", svg_str)
+
+    # Fix case sensitivity issues - convert viewbox to viewBox
+    svg_str = re.sub(r"\bviewbox\s*=", "viewBox=", svg_str)
+
+    # Find all viewBox attributes and their values
+    viewbox_matches = re.findall(r'viewBox\s*=\s*["\']([^"\']+)["\']', svg_str)
+
+    # If multiple viewBox attributes or invalid ones, fix them
+    if viewbox_matches:
+        # Remove all viewBox attributes
+        svg_str = re.sub(r'viewBox\s*=\s*["\'][^"\']+["\']', "", svg_str)
+
+        # Find the first valid viewBox (non-zero width and height)
+        valid_viewbox = None
+        for viewbox in viewbox_matches:
+            parts = viewbox.split()
+            if len(parts) == 4:
+                try:
+                    x, y, width, height = [float(p) for p in parts]
+                    # Check for valid dimensions (non-zero)
+                    if width > 0 and height > 0:
+                        valid_viewbox = viewbox
+                        break
+                except (ValueError, IndexError):
+                    continue
+
+        # If no valid viewBox found, try to create one from width/height
+        if not valid_viewbox:
+            width_match = re.search(r'width\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
+            height_match = re.search(r'height\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
+
+            if width_match and height_match:
+                width = width_match.group(1)
+                height = height_match.group(1)
+                valid_viewbox = f"0 0 {width} {height}"
+            else:
+                # Default viewBox for small icons
+                valid_viewbox = "0 0 24 24"
+
+        # Add the valid viewBox back to the SVG
+        svg_str = svg_str.replace("<svg ", f'<svg viewBox="{valid_viewbox}" ')
+    else:
+        # No viewBox found, add one based on width/height or default
+        width_match = re.search(r'width\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
+        height_match = re.search(r'height\s*=\s*["\'](\d+(?:\.\d+)?)', svg_str)
+
+        if width_match and height_match:
+            width = width_match.group(1)
+            height = height_match.group(1)
+            svg_str = svg_str.replace("<svg ", f'<svg viewBox="0 0 {width} {height}" ')
+        else:
+            # Add default viewBox and dimensions
+            svg_str = svg_str.replace("<svg ", '<svg viewBox="0 0 24 24" ')
+
+    # Ensure SVG has proper namespace
+    if not "xmlns=" in svg_str:
+        svg_str = svg_str.replace("<svg ", '<svg xmlns="http://www.w3.org/2000/svg" ')
+
+    # Add default width/height if missing
+    if not "width=" in svg_str:
+        width = re.search(r'viewBox\s*=\s*["\'][^"\']*\s+[^"\']*\s+([^"\']+)', svg_str)
+        if width:
+            svg_str = svg_str.replace("<svg ", f'<svg width="{width.group(1)}" ')
+        else:
+            svg_str = svg_str.replace("<svg ", '<svg width="24" ')
+
+    if not "height=" in svg_str:
+        height = re.search(
+            r'viewBox\s*=\s*["\'][^"\']*\s+[^"\']*\s+[^"\']+\s+([^"\']+)', svg_str
+        )
+        if height:
+            svg_str = svg_str.replace("<svg ", f'<svg height="{height.group(1)}" ')
+        else:
+            svg_str = svg_str.replace("<svg ", '<svg height="24" ')
+
+    # Fix issue with SVG containing HTML entities
+    svg_str = svg_str.replace("&nbsp;", " ")
+    svg_str = re.sub(
+        r"&([a-zA-Z]+);", lambda m: html.unescape(f"&{m.group(1)};"), svg_str
+    )
+
+    return svg_str
+
+
+def fix_svg_paths(svg_str: str) -> str:
+    """Ensure SVG paths have necessary attributes for proper rendering"""
+    # Find paths without fill or stroke
+    path_regex = r"<path([^>]*)>"
+    paths = re.findall(path_regex, svg_str)
+
+    for path_attrs in paths:
+        if "fill" not in path_attrs and "stroke" not in path_attrs:
+            # Add default fill to ensure path is visible
+            new_path_attrs = path_attrs + ' fill="currentColor"'
+            svg_str = svg_str.replace(f"<path{path_attrs}>", f"<path{new_path_attrs}>")
+
+    # Also fix rect, circle, and polygon elements without fill
+    for tag in ["rect", "circle", "ellipse", "polygon", "polyline"]:
+        tag_regex = f"<{tag}([^>]*)>"
+        elements = re.findall(tag_regex, svg_str)
+
+        for elem_attrs in elements:
+            if "fill" not in elem_attrs and "stroke" not in elem_attrs:
+                new_attrs = elem_attrs + ' fill="currentColor"'
+                svg_str = svg_str.replace(f"<{tag}{elem_attrs}>", f"<{tag}{new_attrs}>")
+
+    return svg_str
+
+
+def is_svg_icon(svg_str: str) -> bool:
+    """Determine if an SVG is likely an icon based on its attributes and content"""
+    # Check for common icon indicators in the SVG string
+    icon_indicators = ["icon", "logo", "glyph", "symbol", "button", "arrow", "menu"]
+    if any(indicator in svg_str.lower() for indicator in icon_indicators):
+        return True
+
+    # Check if it has a small viewBox or width/height
+    viewbox_match = re.search(
+        r'viewBox=["\']0 0 (\d+(?:\.\d+)?) (\d+(?:\.\d+)?)["\']', svg_str
+    )
+    if viewbox_match:
+        width = float(viewbox_match.group(1))
+        height = float(viewbox_match.group(2))
+        # If smaller than 100x100, likely an icon
+        if width <= 100 and height <= 100:
+            return True
+
+    # Check explicit width/height attributes
+    width_match = re.search(r'width=["\'](\d+(?:\.\d+)?)', svg_str)
+    height_match = re.search(r'height=["\'](\d+(?:\.\d+)?)', svg_str)
+    if width_match and height_match:
+        width = float(width_match.group(1))
+        height = float(height_match.group(1))
+        # If smaller than 100x100, likely an icon
+        if width <= 100 and height <= 100:
+            return True
+
+    # Check if it has a single path and simple structure (common for icons)
+    path_count = svg_str.count("<path")
+    if path_count > 0 and path_count < 10 and svg_str.count("<") < 30:
+        return True
+
+    # Check for specific attributes commonly used in icons
+    if "stroke-width=" in svg_str and 'fill="none"' in svg_str:
+        return True
+
+    return False
+
+
+def prepare_svg_for_frontend(svg_str: str) -> str:
+    """Prepare SVG content for frontend display (without base64 encoding)"""
+    try:
+        # Clean and fix paths in the SVG
+        svg_str = clean_svg(svg_str)
+        svg_str = fix_svg_paths(svg_str)
+
+        return svg_str
+    except Exception as e:
+        print(f"Error preparing SVG for frontend: {e}")
+        return ""
+
+
+def process_svgs(svgs: List[str]) -> List[Tuple[str, bool]]:
+    """
+    Prepare SVGs for the frontend and tell icons apart, in one pool task.
+
+    Returns:
+        The processed markup of every SVG, empty if it could not be
+        processed, and whether it is an icon.
+    """
+    return [(prepare_svg_for_frontend(svg), is_svg_icon(svg)) for svg in svgs]
+
+
+def index_sprite_symbols(soup) -> Dict[str, str]:
+    """Index the <symbol> elements of a sprite by id as standalone SVG markup"""
+    symbols = {}
+    for symbol in soup.find_all("symbol", id=True):
+        attrs = ""
+        viewbox = symbol.get("viewbox") or symbol.get("viewBox")
+        if viewbox:
+            attrs += f' viewBox="{viewbox}"'
+        aspect_ratio = symbol.get("preserveaspectratio") or symbol.get(
+            "preserveAspectRatio"
+        )
+        if aspect_ratio:
+            attrs += f' preserveAspectRatio="{aspect_ratio}"'
+
+        symbols[symbol["id"]] = (
+            f'<svg xmlns="http://www.w3.org/2000/svg"{attrs}>'
+            f"{symbol.decode_contents()}</svg>"
+        )
+    return symbols
+
+
+def index_sprite(markup: str) -> Dict[str, str]:
+    """Index the symbols of a sprite fetched as markup"""
+    return index_sprite_symbols(BeautifulSoup(markup, "lxml"))
+
+
+def is_sprite_sheet(svg) -> bool:
+    """A sprite sheet only defines symbols, it does not draw anything itself"""
+    return svg.find("symbol") is not None and svg.find("use") is None
+
+
+def split_sprite_reference(href: Optional[str], base_url: str):
+    """Split a sprite reference into (sprite URL or None for inline, symbol id)"""
+    if not href or "#" not in href:
+        return None
+
+    sprite, _, symbol_id = href.partition("#")
+    if not symbol_id:
+        return None
+
+    if not sprite:
+        return None, symbol_id
+
+    sprite_url = normalize_url(sprite, base_url)
+    return (sprite_url, symbol_id) if sprite_url else None
+
+
+def _add(items: List, item):
+    if item and item not in items:
+        items.append(item)
+
+
+def _find_assets(soup, base_url: str) -> Dict[str, Any]:
+    """
+    The assets the markup of a page references, by category, in document
+    order. External SVGs are listed by URL among the svgs, and icons drawn
+    from external sprites as (sprite URL, symbol id) sprite_refs: fetching
+    them is up to the caller.
+    """
+    assets = {
+        "images": [],
+        "videos": [],
+        "scripts": [],
+        "stylesheets": [],
+        "icons": [],
+        "svgs": [],
+    }
+    images = assets["images"]
+
+    # Extract image URLs - standard img tags
+    for img in soup.find_all("img", src=True):
+        _add(images, normalize_url(img.get("src"), base_url))
+
+        # Check for srcset attribute
+        if img.has_attr("srcset"):
+            for src_url in re.findall(SRCSET_PATTERN, img["srcset"]):
+                _add(images, normalize_url(src_url, base_url))
+
+    # Check for lazy-loaded images
+    for img in soup.find_all(["img", "div", "span"]):
+        for attr in ["data-src", "data-original", "data-lazy", "data-srcset", "data-bg"]:
+            if img.has_attr(attr):
+                attr_value = img[attr]
+                if attr == "data-srcset":
+                    # Handle srcset format
+                    for url in re.findall(SRCSET_PATTERN, attr_value):
+                        _add(images, normalize_url(url, base_url))
+                else:
+                    _add(images, normalize_url(attr_value, base_url))
+
+    # Index inline sprite symbols once so <use href="#id"> can be resolved
+    inline_symbols = index_sprite_symbols(soup)
+    sprite_refs = {}  # (sprite URL, symbol id) -> None, for external sprites
+
+    # Extract inline SVG
+    svg_elements = soup.find_all("svg")
+    for svg in svg_elements:
+        if is_sprite_sheet(svg):
+            continue  # Its symbols are materialized where they are used
+
+        svg_str = str(svg)
+        if svg_str:
+            # Convert inline SVG to data URI
+            svg_data = base64.b64encode(svg_str.encode("utf-8")).decode("utf-8")
+            _add(images, f"data:image/svg+xml;base64,{svg_data}")
+
+    # Extract inline SVG elements more thoroughly
+    for svg in svg_elements:
+        try:
+            if is_sprite_sheet(svg):
+                continue
+
+            svg_str = str(svg)
+
+            # Icons drawn through <use> are replaced by the referenced symbol
+            use = svg.find("use")
+            if use:
+                ref = split_sprite_reference(
+                    use.get("href") or use.get("xlink:href"), base_url
+                )
+                if ref and ref[0]:
+                    sprite_refs[ref] = None
+                    continue  # Materialized once the sprite is fetched
+                if ref and ref[1] in inline_symbols:
+                    svg_str = inline_symbols[ref[1]]
+
+            if svg_str:
+                # Clean and prepare the SVG for frontend
+                processed_svg = prepare_svg_for_frontend(svg_str)
+                if not processed_svg:
+                    continue
+
+                # Determine if it's an icon or regular SVG
+                category = "icons" if is_svg_icon(svg_str) else "svgs"
+                _add(assets[category], processed_svg)
+        except Exception as e:
+            print(f"Error processing inline SVG: {str(e)}")
+
+    # Also check for SVG content in HTML attributes like aria-label, title, etc.
+    for elem in soup.find_all(attrs={"aria-label": True}):
+        aria_label = elem.get("aria-label", "")
+        if aria_label.lower() in ["icon", "logo", "svg icon"]:
+            if elem.name == "div" and elem.get("class"):
+                # This might be an SVG icon wrapped in a div
+                try:
+                    inner_html = str(elem)
+                    if "<svg" in inner_html:
+                        svg_match = re.search(r"(<svg[^>]*>.*?</svg>)", inner_html, re.DOTALL)
+                        if svg_match:
+                            _add(assets["icons"], prepare_svg_for_frontend(svg_match.group(1)))
+                except Exception as e:
+                    print(f"Error processing potential SVG in div: {str(e)}")
+
+    # Look for SVG references in <img> and <object> tags
+    for tag in soup.find_all(["img", "object"]):
+        src = tag.get("src") or tag.get("data")
+        if src and ".svg#" in src:
+            # Icon referenced from an external sprite (sprite.svg#id)
+            ref = split_sprite_reference(src, base_url)
+            if ref and ref[0]:
+                sprite_refs[ref] = None
+        elif src and src.endswith(".svg"):
+            # Fetched and swapped for its markup by the caller
+            _add(assets["svgs"], normalize_url(src, base_url))
+
+    assets["sprite_refs"] = [list(ref) for ref in sprite_refs]
+
+    # Extract video sources - standard video tags
+    for video in soup.find_all("video"):
+        # Check video src attribute
+        if video.has_attr("src"):
+            _add(assets["videos"], normalize_url(video.get("src"), base_url))
+
+        # Check source tags inside video
+        for source in video.find_all("source", src=True):
+            _add(assets["videos"], normalize_url(source.get("src"), base_url))
+
+        # Check poster attribute (thumbnail)
+        if video.has_attr("poster"):
+            _add(images, normalize_url(video.get("poster"), base_url))
+
+    # Check for video in iframes (YouTube, Vimeo, etc.)
+    video_platforms = [
+        "youtube.com/embed/",
+        "player.vimeo.com",
+        "dailymotion.com/embed",
+        "facebook.com/plugins/video",
+        "instagram.com/tv/",
+    ]
+    for iframe in soup.find_all("iframe", src=True):
+        iframe_src = iframe.get("src", "")
+        if any(platform in iframe_src for platform in video_platforms):
+            _add(assets["videos"], iframe_src)
+
+    # Look for custom video players
+    video_players = soup.find_all(
+        ["div", "span"],
+        class_=lambda c: c
+        and any(
+            cls in c
+            for cls in ["video-player", "video-container", "player", "jwplayer", "video-js"]
+        ),
+    )
+    for player in video_players:
+        # Look for data attributes that might contain video URLs
+        for attr in player.attrs:
+            if attr.startswith("data-") and isinstance(player[attr], str):
+                value = player[attr]
+                if any(ext in value for ext in [".mp4", ".webm", ".ogg", ".mov"]):
+                    _add(assets["videos"], normalize_url(value, base_url))
+
+    # Extract JavaScript files
+    for script in soup.find_all("script", src=True):
+        _add(assets["scripts"], normalize_url(script.get("src"), base_url))
+
+    # Extract CSS files
+    for link in soup.find_all("link", rel="stylesheet"):
+        if link.has_attr("href"):
+            _add(assets["stylesheets"], normalize_url(link.get("href"), base_url))
+
+    # Look for background images in inline styles - improved detection
+    for elem in soup.find_all(style=True):
+        style = elem.get("style", "")
+        urls = re.findall(r'background(?:-image)?:\s*url\([\'"]?([^\'"()]+)[\'"]?\)', style)
+        for url in urls:
+            _add(images, normalize_url(url, base_url))
+
+    # Look for backgroundImage in style attribute (React style)
+    try:
+        for elem in soup.find_all():
+            for attr_name, attr_value in elem.attrs.items():
+                if "style" in attr_name and attr_value and isinstance(attr_value, str):
+                    if "backgroundImage" in attr_value or "background-image" in attr_value:
+                        for url in re.findall(r'url\([\'"]?([^\'"()]+)[\'"]?\)', attr_value):
+                            _add(images, normalize_url(url, base_url))
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error extracting background images from style attributes: {str(e)}")
+
+    # Additional search for React inline styles with object notation
+    try:
+        for script in soup.find_all("script"):
+            if script.string:
+                # Look for image URLs in background/backgroundImage style objects
+                bg_urls = re.findall(
+                    r'[\'"]?(?:background|backgroundImage)[\'"]?\s*:\s*[\'"]url\([\'"]?([^\'"()]+)[\'"]?\)[\'"]',
+                    script.string,
+                )
+                for url in bg_urls:
+                    _add(images, normalize_url(url, base_url))
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error extracting background images from scripts: {str(e)}")
+
+    return assets
+
+
+def _find_style_colors(soup) -> Dict[str, int]:
+    """How often every color appears in the color and background rules of the style tags"""
+    color_frequency = {}
+    for style in soup.find_all("style"):
+        if style.string:
+            css = cssutils.parseString(style.string)
+            for rule in css:
+                if rule.type == rule.STYLE_RULE:
+                    for property in rule.style:
+                        if "color" in property.name or "background" in property.name:
+                            for color in re.findall(COLOR_PATTERN, property.value):
+                                color_frequency[color] = color_frequency.get(color, 0) + 1
+    return color_frequency
+
+
+def _find_font_faces(css_text: str, font_type: str, base_url: str) -> List[Dict[str, Any]]:
+    fonts = []
+    for block in re.findall(FONT_FACE_PATTERN, css_text):
+        font_family = re.search(FONT_FACE_FAMILY_PATTERN, block)
+        font_url = re.search(FONT_FACE_URL_PATTERN, block)
+
+        if font_family:
+            url = font_url.group(1) if font_url else None
+            if url:
+                url = normalize_url(url, base_url)
+            _add(fonts, {"name": font_family.group(1).strip(), "type": font_type, "url": url})
+    return fonts
+
+
+def _find_fonts(soup, base_url: str) -> List[Dict[str, Any]]:
+    """The fonts the markup of a page loads or names"""
+    fonts = []
+
+    # Check for Google Fonts
+    for link in soup.find_all("link", href=re.compile("fonts.googleapis.com")):
+        href = link.get("href", "")
+        # Extract font family names from Google Fonts URL
+        for family in re.findall(r"family=([^&:]+)", href):
+            _add(fonts, {"name": family.replace("+", " "), "type": "Google Font", "url": href})
+
+    # Check for Adobe Fonts (Typekit)
+    for link in soup.find_all("link", href=re.compile("use.typekit.net|use.edgefonts.net")):
+        _add(fonts, {"name": "Adobe Font", "type": "Typekit", "url": link.get("href", "")})
+
+    # Extract @font-face declarations from style tags
+    for style in soup.find_all("style"):
+        if style.string:
+            for font_info in _find_font_faces(style.string, "@font-face", base_url):
+                _add(fonts, font_info)
+
+    # Extract fonts from inline styles
+    for element in soup.find_all(style=True):
+        font_family = re.search(r"font-family:\s*([^;]+)", element.get("style", ""))
+        if font_family:
+            for family in [f.strip().strip("\"'") for f in font_family.group(1).split(",")]:
+                if family.lower() not in GENERIC_FONT_FAMILIES:
+                    _add(fonts, {"name": family, "type": "inline", "url": None})
+
+    return fonts
+
+
+def analyze_document(content: str, base_url: str, parts: Iterable[str]) -> Dict[str, Any]:
+    """
+    Parse a page once and read what the extraction needs from it.
+
+    Args:
+        content: The page markup.
+        base_url: What relative URLs are resolved against.
+        parts: What to read: "assets", "fonts" and/or "style_colors".
+
+    Returns:
+        A dict with the requested parts, see _find_assets, _find_fonts and
+        _find_style_colors.
+    """
+    soup = BeautifulSoup(content, "lxml")
+    parts = set(parts)
+
+    analysis = {}
+    if "assets" in parts:
+        analysis["assets"] = _find_assets(soup, base_url)
+    if "fonts" in parts:
+        analysis["fonts"] = _find_fonts(soup, base_url)
+    if "style_colors" in parts:
+        analysis["style_colors"] = _find_style_colors(soup)
+    return analysis
+
+
+def parse_stylesheet_fonts(css_text: str, css_url: str, base_url: str) -> List[Dict[str, Any]]:
+    """The fonts an external stylesheet declares or names"""
+    fonts = _find_font_faces(css_text, "@font-face (external)", base_url)
+
+    # Extract font-family properties
+    for families in re.findall(r"font-family:\s*([^;]+)", css_text):
+        for family in [f.strip().strip("\"'") for f in families.split(",")]:
+            if family.lower() not in GENERIC_FONT_FAMILIES:
+                _add(fonts, {"name": family, "type": "CSS", "url": css_url})
+    return fonts
+
+
+def summarize_css_colors(color_frequency: Dict[str, int]) -> List[Dict[str, Any]]:
+    """Name the CSS colors found and sort them by frequency, without duplicates"""
+    processed_colors = []
+    for color, count in color_frequency.items():
+        if color.startswith("#"):
+            # Convert hex to RGB
+            if len(color) == 4:  # Short form (#RGB)
+                r = int(color[1] + color[1], 16)
+                g = int(color[2] + color[2], 16)
+                b = int(color[3] + color[3], 16)
+            else:  # Normal form (#RRGGBB)
+                r = int(color[1:3], 16)
+                g = int(color[3:5], 16)
+                b = int(color[5:7], 16)
+            color_info = get_closest_color_name((r, g, b))
+            color_info["count"] = count
+            color_info["percentage"] = None  # CSS colors don't have a meaningful percentage
+            processed_colors.append(color_info)
+        elif color.startswith("rgb(") or color.startswith("rgba("):
+            # Extract RGB values
+            rgb_values = re.findall(r"\d+", color)[:3]
+            if len(rgb_values) == 3:
+                rgb = tuple(int(v) for v in rgb_values)
+                color_info = get_closest_color_name(rgb)
+                color_info["count"] = count
+                color_info["percentage"] = None
+                processed_colors.append(color_info)
+
+    # Remove duplicates and sort by frequency (count)
+    unique_colors = []
+    seen_hex = set()
+    for color in processed_colors:
+        if color["hex"] not in seen_hex:
+            seen_hex.add(color["hex"])
+            unique_colors.append(color)
+
+    return sorted(unique_colors, key=lambda x: x["count"], reverse=True)
+
+
+def get_image_colors(content: bytes, img_url: str) -> List[Dict[str, Any]]:
+    """The dominant colors of an image, without near-white or near-black backgrounds"""
+    img = Image.open(BytesIO(content))
+
+    # Resize image to speed up processing
+    img.thumbnail((150, 150), Image.LANCZOS)
+
+    # Convert to RGB if needed (handles PNG with transparency)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    colors = extcolors.extract_from_image(img, tolerance=12, limit=5)
+    total_pixels = img.width * img.height
+
+    image_colors = []
+    for color, count in colors[0]:
+        color_info = get_closest_color_name(color)
+        color_info["count"] = count
+        color_info["percentage"] = round((count / total_pixels) * 100, 2)
+        color_info["source"] = img_url
+
+        # Skip near-white or near-black colors
+        is_near_white = all(c > 240 for c in color)
+        is_near_black = all(c < 15 for c in color)
+
+        if not (is_near_white or is_near_black) or color_info["percentage"] > 80:
+            image_colors.append(color_info)
+    return image_colors
+
+
+def _hash_parts(parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _tag_signature(tag) -> str:
+    """A tag and its attributes, minus the ones that change on every response"""
+    attributes = sorted(
+        (name, " ".join(value) if isinstance(value, list) else str(value))
+        for name, value in tag.attrs.items()
+        if name not in VOLATILE_ATTRIBUTES
+    )
+    # Inline SVGs are assets themselves, other tags only point to them
+    if tag.name == "svg":
+        return f"{tag.name}{attributes}{tag.decode_contents()}"
+    return f"{tag.name}{attributes}"
+
+
+def build_page_validators(url: str, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Describe a fetched document well enough to tell later whether it changed.
+
+    Besides the HTTP validators and a hash of the whole document, the markup
+    each stage reads is hashed separately (see STAGE_INPUTS in extractor.py),
+    so a change to the text of a page does not invalidate its colors, fonts
+    or assets.
+
+    Args:
+        url: Where the document was served from.
+        body: The document as served.
+        headers: The response headers, by lowercase name.
+    """
+    soup = BeautifulSoup(body, "lxml")
+
+    stylesheets = sorted(
+        {
+            urljoin(url, link["href"])
+            for link in soup.find_all("link", href=True)
+            if "stylesheet" in (link.get("rel") or [])
+        }
+    )
+    styles = [style.get_text() for style in soup.find_all("style")]
+    styles += [tag["style"] for tag in soup.find_all(style=True)]
+    # Scripts set styles too, and bundles are renamed when they change
+    scripts = sorted(
+        {urljoin(url, script["src"]) for script in soup.find_all("script", src=True)}
+    )
+
+    return {
+        "etag": headers.get("etag"),
+        "last_modified": headers.get("last-modified"),
+        "document_hash": hashlib.sha256(body).hexdigest(),
+        "stylesheets": stylesheets,
+        "styles_hash": _hash_parts(stylesheets + scripts + styles),
+        "assets_hash": _hash_parts(_tag_signature(tag) for tag in soup.find_all(ASSET_TAGS)),
+    }
+
+
+def extract_links(url: str, body: bytes) -> List[str]:
+    """
+    The pages a document links to, as absolute http(s) URLs without their
+    fragment, in document order and without duplicates.
+    """
+    soup = BeautifulSoup(body, "lxml")
+
+    links = OrderedDict()
+    for anchor in soup.find_all("a", href=True):
+        link = urljoin(url, anchor["href"].strip()).split("#", 1)[0]
+        if urlparse(link).scheme in ("http", "https"):
+            links[link] = None
+    return list(links)
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+from app.schemas.extractor_schema import ProgressStage
+
+
+# Shortest time between two summaries of high-frequency progress events
+PROGRESS_SUMMARY_INTERVAL = float(os.environ.get("PROGRESS_SUMMARY_INTERVAL", 0.5))  # Seconds
+
+# Stages reported once per resource, coalesced into summaries
+COALESCED_STAGES = {ProgressStage.RESOURCE_LOADED}
+
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class ProgressAggregator:
+    """
+    Sits between an extractor and whoever follows its progress, so that a
+    page loading hundreds of resources does not send an event for each.
+
+    Events of the coalesced stages are counted and sent as one summary at
+    most every interval: how many resources loaded since the last summary,
+    of which types, how many in total, and the last one. Any other stage
+    is a transition and goes out at once, after the summary of what came
+    before it, so events keep their order.
+    """
+
+    def __init__(
+        self, callback: ProgressCallback, interval: float = PROGRESS_SUMMARY_INTERVAL
+    ) -> None:
+        """
+        Args:
+            callback: Receives the stage and data of the events sent on.
+            interval: Seconds between two summaries, 0 to send every event.
+        """
+        self.callback = callback
+        self.interval = interval
+        self.pending: Dict[str, Counter] = {}
+        self.last: Dict[str, Dict[str, Any]] = {}
+        self.totals: Counter = Counter()
+        self.last_sent = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def send(self, stage: str, data: Dict[str, Any]):
+        """Take an event from the extractor, a progress callback itself"""
+        if stage not in COALESCED_STAGES or self.interval <= 0:
+            self.flush()
+            self.callback(stage, data)
+            return
+
+        self.pending.setdefault(stage, Counter())[data.get("type")] += 1
+        self.last[stage] = data
+        self.totals[stage] += 1
+
+        wait = self.last_sent + self.interval - time.monotonic()
+        if wait <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(wait, self.flush)
+
+    def flush(self):
+        """Send the summaries of the events counted since the last ones"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        for stage, types in self.pending.items():
+            self.callback(
+                stage,
+                {
+                    **self.last[stage],
+                    "count": sum(types.values()),
+                    "types": dict(types),
+                    "total": self.totals[stage],
+                },
+            )
+        if self.pending:
+            self.pending = {}
+            self.last_sent = time.monotonic()
@@ -0,0 +1,181 @@
+import base64
+import json
+from typing import Dict, List, Optional
+
+
+ASSET_CATEGORIES = ("images", "videos", "scripts", "stylesheets", "icons", "svgs")
+COLOR_CATEGORIES = ("from_css", "from_images")
+
+# Fields clients may ask for through the fields= parameter
+PROJECTABLE_FIELDS = (
+    {"url", "result_id", "stages", "timestamp", "cached", "stale", "fonts", "counts"}
+    | {"colors", "assets"}
+    | {f"colors.{category}" for category in COLOR_CATEGORIES}
+    | {f"assets.{category}" for category in ASSET_CATEGORIES}
+)
+
+# Fields every projected response carries, so it can still be identified
+ALWAYS_INCLUDED_FIELDS = ("url", "result_id", "stages", "cached", "stale")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma separated fields= parameter.
+
+    Args:
+        fields: The raw parameter, e.g. "colors.from_css,fonts".
+
+    Returns:
+        The list of requested fields, or None when no projection was requested.
+
+    Raises:
+        ValueError: If a field is not projectable.
+    """
+    if not fields:
+        return None
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    return requested
+
+
+def encode_cursor(offsets: Dict[str, int]) -> str:
+    """Encode per-category offsets as an opaque cursor"""
+    payload = json.dumps(offsets, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Dict[str, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if not cursor:
+        return {}
+
+    try:
+        offsets = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(offsets, dict) or not all(
+        category in ASSET_CATEGORIES and isinstance(offset, int) and offset >= 0
+        for category, offset in offsets.items()
+    ):
+        raise ValueError("Invalid cursor")
+
+    return offsets
+
+
+def count_categories(result: dict) -> Dict[str, int]:
+    """Count the items of every asset, color and font list of a result"""
+    assets = result.get("assets", {})
+    colors = result.get("colors", {})
+
+    counts = {category: len(assets.get(category, [])) for category in ASSET_CATEGORIES}
+    for category in COLOR_CATEGORIES:
+        counts[f"colors_{category}"] = len(colors.get(category, []))
+    counts["fonts"] = len(result.get("fonts", []))
+
+    return counts
+
+
+def summarize_result(result: dict) -> dict:
+    """A result without its items: what identifies it, and its counts"""
+    summary = {field: result.get(field) for field in ALWAYS_INCLUDED_FIELDS}
+    summary["timestamp"] = result.get("timestamp")
+    summary["counts"] = count_categories(result)
+    summary["partial"] = bool(result.get("partial"))
+    summary["unfinished_stages"] = result.get("unfinished_stages", [])
+    return summary
+
+
+def get_blobs(assets: dict, references: List[str]) -> dict:
+    """The blob metadata of some asset references"""
+    blobs = assets.get("blobs", {})
+    hashes = {reference.rsplit("/", 1)[-1] for reference in references}
+    return {blob_hash: blobs[blob_hash] for blob_hash in hashes if blob_hash in blobs}
+
+
+def _is_requested(fields: Optional[List[str]], path: str) -> bool:
+    """Whether a field, or a parent of it, is part of the projection"""
+    if fields is None:
+        return True
+
+    parent = path.split(".")[0]
+    return path in fields or parent in fields
+
+
+def project_result(
+    result: dict,
+    fields: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    offsets: Optional[Dict[str, int]] = None,
+) -> dict:
+    """
+    Build the response for a stored result, keeping only the requested fields
+    and one page of every asset list.
+
+    Args:
+        result: The stored extraction result.
+        fields: The parsed fields= parameter, None for every field.
+        limit: Maximum number of items per asset category, None for all of them.
+        offsets: Per-category offsets decoded from the request cursor.
+
+    Returns:
+        A JSON-ready dict with per-category counts and, when any asset list
+        was cut short, the cursor of the next page.
+    """
+    offsets = offsets or {}
+    projected = {field: result.get(field) for field in ALWAYS_INCLUDED_FIELDS}
+
+    if _is_requested(fields, "timestamp"):
+        projected["timestamp"] = result.get("timestamp")
+
+    if _is_requested(fields, "fonts"):
+        projected["fonts"] = result.get("fonts", [])
+
+    colors = result.get("colors", {})
+    projected_colors = {
+        category: colors.get(category, [])
+        for category in COLOR_CATEGORIES
+        if _is_requested(fields, f"colors.{category}")
+    }
+    if projected_colors:
+        projected["colors"] = projected_colors
+
+    assets = result.get("assets", {})
+    projected_assets = {}
+    next_offsets = {}
+    for category in ASSET_CATEGORIES:
+        if not _is_requested(fields, f"assets.{category}"):
+            continue
+
+        if offsets and category not in offsets:
+            projected_assets[category] = []  # Exhausted on an earlier page
+            continue
+
+        items = assets.get(category, [])
+        start = offsets.get(category, 0)
+        end = len(items) if limit is None else start + limit
+
+        projected_assets[category] = items[start:end]
+        if end < len(items):
+            next_offsets[category] = end
+
+    if projected_assets:
+        # Only ship the blob metadata of the references on this page
+        projected_assets["blobs"] = get_blobs(
+            assets, [reference for items in projected_assets.values() for reference in items]
+        )
+        projected["assets"] = projected_assets
+
+    projected["counts"] = count_categories(result)
+    projected["next_cursor"] = encode_cursor(next_offsets) if next_offsets else None
+
+    return projected
@@ -0,0 +1,155 @@
+"""
+Extraction worker: runs the extraction jobs the API queues, see
+app/root/job_queue.py. Scale it separately from the API:
+
+    python -m app.worker
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+import traceback
+
+import redis
+
+from app.root.cpu_pool import cpu_pool
+from app.root.http_client import http_client
+from app.root.job_queue import JOB_VISIBILITY_TIMEOUT, Claim
+from app.root.local_cache import listen_for_invalidations
+from app.root.redis_manager import REDIS_RETRY_AFTER, close_redis
+from app.services import extractor_service
+from app.services.job_service import extraction_jobs
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+logger = logging.getLogger("extraction-worker")
+
+# Jobs a worker process runs at once
+WORKER_CONCURRENCY = int(
+    os.environ.get("WORKER_CONCURRENCY", extractor_service.EXTRACTION_CONCURRENCY)
+)
+
+# Name of this worker in the consumer group, unique per process
+CONSUMER_NAME = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def publish_events(job_id: str, outbox: asyncio.Queue):
+    """Append the events of a job to its log in order, until None is queued"""
+    while True:
+        event = await outbox.get()
+        if event is None:
+            return
+        await extraction_jobs.emit(job_id, event)
+
+
+async def renew_claim(claim: Claim):
+    """Keep a running job claimed, however long it takes"""
+    while True:
+        await asyncio.sleep(JOB_VISIBILITY_TIMEOUT / 3)
+        await extraction_jobs.renew(claim, CONSUMER_NAME)
+
+
+async def run_job(claim: Claim):
+    """Run one claimed extraction job, and record how it went"""
+    job = await extraction_jobs.start(claim)
+    if job is None:
+        return
+
+    job_id, payload = job["job_id"], job["payload"]
+    logger.info(f"Job {job_id}: extracting {payload['url']} (attempt {job['attempts']})")
+
+    outbox: asyncio.Queue = asyncio.Queue()
+    publisher = asyncio.create_task(publish_events(job_id, outbox))
+    renewal = asyncio.create_task(renew_claim(claim))
+
+    try:
+        result = await extractor_service.extract_stages(
+            payload["url"],
+            set(payload["stages"]),
+            payload["force_refresh"],
+            on_event=outbox.put_nowait,
+            deadline=payload.get("deadline"),
+        )
+        error = result.get("error") if result else "Extraction returned no result"
+    except Exception as e:
+        traceback.print_exc()
+        error = f"Extraction failed: {str(e)}"
+    finally:
+        renewal.cancel()
+        outbox.put_nowait(None)
+        await publisher
+
+    if error:
+        await extraction_jobs.fail(claim, error, job["attempts"])
+        return
+
+    await extraction_jobs.complete(
+        claim,
+        {**extractor_service.get_flight_notice(result), "result_id": result["result_id"]},
+    )
+
+
+async def main():
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    # Keep the local cache coherent with the API and the other workers
+    listener = asyncio.create_task(listen_for_invalidations())
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    running = set()
+    group_ready = False
+
+    def done(task: asyncio.Task):
+        running.discard(task)
+        slots.release()
+
+    logger.info(f"Worker {CONSUMER_NAME} started, running up to {WORKER_CONCURRENCY} jobs")
+
+    while not stopping.is_set():
+        await slots.acquire()
+        if stopping.is_set():
+            slots.release()
+            break
+
+        try:
+            if not group_ready:
+                await extraction_jobs.ensure_group()
+                group_ready = True
+            claims = await extraction_jobs.claim(CONSUMER_NAME)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Job queue unavailable: {str(e)}")
+            group_ready = False  # The stream may have been lost with Redis
+            slots.release()
+            await asyncio.sleep(REDIS_RETRY_AFTER)
+            continue
+
+        if not claims:
+            slots.release()
+            continue
+
+        task = asyncio.create_task(run_job(claims[0]))
+        running.add(task)
+        task.add_done_callback(done)
+
+    # Let the jobs in progress finish. Jobs of a worker killed before they
+    # finish are claimed again by the others after the visibility timeout.
+    logger.info(f"Worker {CONSUMER_NAME} stopping, waiting for {len(running)} jobs")
+    await asyncio.gather(*running, return_exceptions=True)
+
+    listener.cancel()
+    await close_redis()
+    await http_client.close()
+    cpu_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Compare the two ways of serving a cache hit, without Redis in the loop:
+
+- decode: json.loads, validation against ExtractorResponse and re-encoding,
+  what hits used to cost on top of the Redis read
+- zero copy: the stored stages spliced together, with the cached flag added
+
+Run from the backend directory:
+
+    python -m benchmarks.cache_hit_benchmark
+"""
+
+import json
+import timeit
+
+from app.schemas.extractor_schema import ExtractionStage, ExtractorResponse
+from app.services import cache_service
+from app.services.utils import projection
+
+
+ITEMS_PER_CATEGORY = 500
+RUNS = 200
+
+
+def build_result() -> dict:
+    """A large synthetic result, shaped like the stored ones"""
+    blobs = {}
+    svgs = []
+    for i in range(ITEMS_PER_CATEGORY):
+        blob_hash = f"{i:064x}"
+        blobs[blob_hash] = {
+            "hash": blob_hash,
+            "media_type": "image/svg+xml",
+            "size": 900,
+            "preview": f'<svg viewBox="0 0 24 24"><path d="M{i} 0L24 {i}Z"/></svg>',
+        }
+        svgs.append(f"/api/assets/{blob_hash}")
+
+    result = {
+        "url": "https://example.com",
+        "result_id": "00000000-0000-0000-0000-000000000000",
+        "stages": [
+            ExtractionStage.ASSETS,
+            ExtractionStage.CSS_COLORS,
+            ExtractionStage.FONTS,
+        ],
+        "timestamp": "2026-01-01T00:00:00",
+        "extraction_time": 4.2,
+        "colors": {
+            "from_css": [
+                {
+                    "name": f"Color {i}",
+                    "hex": f"#{i:06x}",
+                    "rgb": [(i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF],
+                    "count": ITEMS_PER_CATEGORY - i,
+                }
+                for i in range(ITEMS_PER_CATEGORY)
+            ],
+            "from_images": [],
+        },
+        "fonts": [
+            {"name": f"Font {i}", "type": "@font-face", "url": None}
+            for i in range(ITEMS_PER_CATEGORY // 10)
+        ],
+        "assets": {
+            category: [
+                f"https://example.com/{category}/{i}" for i in range(ITEMS_PER_CATEGORY)
+            ]
+            for category in projection.ASSET_CATEGORIES
+            if category != "svgs"
+        },
+    }
+    result["assets"]["svgs"] = svgs
+    result["assets"]["blobs"] = blobs
+    return result
+
+
+def build_entry(result: dict):
+    """The metadata and stage pieces the result is cached as"""
+    pieces, records = {}, {}
+    for stage in result["stages"]:
+        value = cache_service.get_stage_value(result, stage)
+        pieces[stage] = cache_service.serialize_value(value)
+        records[stage] = {
+            "stored_at": 0,
+            "validators": None,
+            "counts": cache_service.count_stage(stage, value),
+        }
+
+    meta = {key: result[key] for key in ("url", "result_id", "timestamp", "extraction_time")}
+    meta["stages"] = records
+    return meta, pieces
+
+
+def serve_decoded(entry) -> bytes:
+    result = json.loads(cache_service.assemble_result(*entry))
+    result["cached"] = True
+    return ExtractorResponse(**result).model_dump_json().encode("utf-8")
+
+
+def serve_zero_copy(entry) -> bytes:
+    return cache_service.mark_cached(cache_service.assemble_result(*entry))
+
+
+def main():
+    entry = build_entry(build_result())
+    size = sum(len(piece) for piece in entry[1].values())
+    print(f"Stored stages: {size / 1024:.0f} KiB")
+
+    # Both paths must produce the same document
+    assert json.loads(serve_zero_copy(entry))["cached"] is True
+    assert json.loads(serve_decoded(entry))["cached"] is True
+
+    timings = {}
+    for name, serve in (("decode", serve_decoded), ("zero copy", serve_zero_copy)):
+        seconds = timeit.timeit(lambda: serve(entry), number=RUNS)
+        timings[name] = seconds / RUNS * 1000
+        print(f"{name:>10}: {timings[name]:.3f} ms per hit")
+
+    print(f"   speedup: {timings['decode'] / timings['zero copy']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+A client disconnecting from an extraction must not leave Chromium behind.
+
+Playwright is replaced by a stub that counts the browsers, contexts and
+pages it opens, and hangs navigations until they are cancelled.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.extractor_schema import ExtractionStage
+from app.services import extractor_service
+from app.services.utils import extractor
+
+
+class StubBrowserManager:
+    """Stands for async_playwright(), keeping track of what is left open"""
+
+    def __init__(self, hang: bool = True) -> None:
+        self.hang = hang
+        self.running = False
+        self.browsers = set()
+        self.contexts = set()
+        self.pages = set()
+        self.navigating = asyncio.Event()
+        self.chromium = self
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        self.running = True
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Stopping Playwright kills whatever Chromium is still running
+        self.running = False
+
+    async def launch(self, **options):
+        return StubBrowser(self)
+
+    def open(self) -> dict:
+        return {
+            "running": self.running,
+            "browsers": len(self.browsers),
+            "contexts": len(self.contexts),
+            "pages": len(self.pages),
+        }
+
+
+class StubBrowser:
+    def __init__(self, manager: StubBrowserManager) -> None:
+        self.manager = manager
+        manager.browsers.add(self)
+
+    async def new_context(self, **options):
+        return StubContext(self.manager)
+
+    async def close(self):
+        await asyncio.sleep(0)
+        self.manager.contexts.clear()
+        self.manager.pages.clear()
+        self.manager.browsers.discard(self)
+
+
+class StubContext:
+    def __init__(self, manager: StubBrowserManager) -> None:
+        self.manager = manager
+        manager.contexts.add(self)
+
+    async def new_page(self):
+        return StubPage(self.manager)
+
+
+class StubPage:
+    url = "https://example.com/"
+
+    def __init__(self, manager: StubBrowserManager) -> None:
+        self.manager = manager
+        manager.pages.add(self)
+
+    def on(self, event, callback):
+        pass
+
+    async def goto(self, url, **options):
+        self.manager.navigating.set()
+        if self.manager.hang:
+            await asyncio.Event().wait()
+        return None
+
+    async def wait_for_timeout(self, timeout):
+        await asyncio.sleep(0)
+
+    async def content(self):
+        return "<html><body></body></html>"
+
+    async def evaluate(self, script, *args):
+        return []
+
+    async def close(self):
+        self.manager.pages.discard(self)
+
+
+class StubRequest:
+    """The ASGI side of a request whose client disconnects on demand"""
+
+    def __init__(self) -> None:
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+
+@pytest.fixture
+def browser_manager(monkeypatch):
+    manager = StubBrowserManager()
+    monkeypatch.setattr(extractor, "async_playwright", manager)
+    return manager
+
+
+def test_disconnect_closes_the_browser(browser_manager):
+    async def scenario():
+        request = StubRequest()
+        web_extractor = extractor.WebAssetExtractor(
+            "https://example.com", stages=[ExtractionStage.FONTS]
+        )
+        extraction = asyncio.ensure_future(
+            extractor_service.run_until_disconnect(request, web_extractor.extract_all())
+        )
+
+        await asyncio.wait_for(browser_manager.navigating.wait(), timeout=5)
+        assert browser_manager.open() == {
+            "running": True,
+            "browsers": 1,
+            "contexts": 1,
+            "pages": 1,
+        }
+
+        request.disconnected.set()
+        with pytest.raises(HTTPException) as error:
+            await asyncio.wait_for(extraction, timeout=5)
+        return error.value
+
+    error = asyncio.run(scenario())
+
+    assert error.status_code == 499
+    assert browser_manager.open() == {
+        "running": False,
+        "browsers": 0,
+        "contexts": 0,
+        "pages": 0,
+    }
+
+
+def test_disconnect_during_a_shared_context_closes_the_page(browser_manager):
+    async def scenario():
+        request = StubRequest()
+        async with extractor.shared_browser_context() as context:
+            web_extractor = extractor.WebAssetExtractor(
+                "https://example.com",
+                stages=[ExtractionStage.FONTS],
+                browser_context=context,
+            )
+            extraction = asyncio.ensure_future(
+                extractor_service.run_until_disconnect(
+                    request, web_extractor.extract_all()
+                )
+            )
+            await asyncio.wait_for(browser_manager.navigating.wait(), timeout=5)
+
+            request.disconnected.set()
+            with pytest.raises(HTTPException):
+                await asyncio.wait_for(extraction, timeout=5)
+
+            # The context belongs to whoever shared it, only the page goes
+            shared = browser_manager.open()
+
+        return shared
+
+    shared = asyncio.run(scenario())
+
+    assert shared == {"running": True, "browsers": 1, "contexts": 1, "pages": 0}
+    assert browser_manager.open()["browsers"] == 0
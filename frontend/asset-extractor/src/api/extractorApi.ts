@@ -14,6 +14,13 @@ export interface FontInfo {
   type: string;
 }
 
+export interface AssetBlobInfo {
+  hash: string;
+  media_type: string;
+  size: number;
+  preview?: string | null; // Only sent for small assets
+}
+
 export interface AssetCollection {
   images: string[];
   videos: string[];
@@ -21,6 +28,7 @@ export interface AssetCollection {
   stylesheets: string[];
   icons: string[]; // SVG icons
   svgs: string[]; // Regular SVGs
+  blobs?: Record<string, AssetBlobInfo>; // Inline assets served from /api/assets
 }
 
 export interface ColorCollection {
@@ -34,6 +42,8 @@ export interface ExtractorResponse {
   fonts: FontInfo[];
   assets: AssetCollection;
   result_id?: string;
+  partial?: boolean; // The deadline passed before every stage finished
+  unfinished_stages?: string[];
 }
 
 export interface ErrorResponse {
@@ -45,13 +55,104 @@ export interface ProgressEvent {
   stage?: string;
   data?: any;
   message?: string;
-  result?: ExtractorResponse;
+  result?: ExtractorResponse; // Assembled from the batches, on complete
   url?: string;
- 
+  found?: FoundCounts; // Items received so far
+}
+
+export interface FoundCounts {
+  colors: number;
+  fonts: number;
+  assets: number;
+}
+
+// Items of the result, streamed as the extractor finds them
+interface ItemBatchEvent {
+  event: 'asset_batch' | 'color_batch' | 'font_batch';
+  category?: keyof Omit<AssetCollection, 'blobs'>;
+  source?: keyof ColorCollection;
+  items: any[];
+  replace?: boolean; // The batch starts the list over
+  blobs?: Record<string, AssetBlobInfo>;
+}
+
+function emptyResult(url: string): ExtractorResponse {
+  return {
+    url,
+    colors: { from_css: [], from_images: [] },
+    fonts: [],
+    assets: { images: [], videos: [], scripts: [], stylesheets: [], icons: [], svgs: [], blobs: {} },
+  };
+}
+
+function addBatch(result: ExtractorResponse, batch: ItemBatchEvent) {
+  const append = <T,>(list: T[]): T[] => (batch.replace ? batch.items : [...list, ...batch.items]);
+
+  if (batch.event === 'asset_batch' && batch.category) {
+    result.assets[batch.category] = append(result.assets[batch.category]);
+    result.assets.blobs = { ...result.assets.blobs, ...batch.blobs };
+  } else if (batch.event === 'color_batch' && batch.source) {
+    result.colors[batch.source] = append(result.colors[batch.source]);
+  } else if (batch.event === 'font_batch') {
+    result.fonts = append(result.fonts);
+  }
+}
+
+function countFound(result: ExtractorResponse): FoundCounts {
+  const { images, videos, scripts, stylesheets, icons, svgs } = result.assets;
+  return {
+    colors: result.colors.from_css.length + result.colors.from_images.length,
+    fonts: result.fonts.length,
+    assets: [images, videos, scripts, stylesheets, icons, svgs].reduce((total, items) => total + items.length, 0),
+  };
 }
 
 export type ProgressCallback = (progressEvent: ProgressEvent) => void;
 
+const ASSET_URL_PREFIX = '/api/assets/';
+
+/**
+ * Resolve the /api/assets references of a result back into SVG markup,
+ * using the inlined preview when there is one. Assets are immutable, so
+ * the browser cache serves repeated fetches.
+ */
+export async function hydrateAssetBlobs(result: ExtractorResponse): Promise<ExtractorResponse> {
+  const blobs = result.assets.blobs || {};
+
+  const resolveSvg = async (asset: string): Promise<string | null> => {
+    if (!asset.startsWith(ASSET_URL_PREFIX)) {
+      return asset;
+    }
+
+    const blob = blobs[asset.slice(ASSET_URL_PREFIX.length)];
+    if (blob?.preview) {
+      return blob.preview;
+    }
+
+    try {
+      const response = await fetch(asset);
+      return response.ok ? await response.text() : null;
+    } catch (error) {
+      console.error('Error fetching asset:', error);
+      return null;
+    }
+  };
+
+  const resolveAll = async (assets: string[] = []): Promise<string[]> =>
+    (await Promise.all(assets.map(resolveSvg))).filter((asset): asset is string => !!asset);
+
+  return {
+    ...result,
+    assets: {
+      ...result.assets,
+      // Inline images used to be data URIs, which the gallery never displayed
+      images: (result.assets.images || []).filter(img => !img.startsWith(ASSET_URL_PREFIX)),
+      icons: await resolveAll(result.assets.icons),
+      svgs: await resolveAll(result.assets.svgs),
+    },
+  };
+}
+
 export async function extractFromUrl(url: string): Promise<ExtractorResponse> {
   try {
     console.log('Sending request to extract assets from:', url);
@@ -75,7 +176,7 @@ export async function extractFromUrl(url: string): Promise<ExtractorResponse> {
       throw new Error(errorMessage);
     }
 
-    return data as ExtractorResponse;
+    return hydrateAssetBlobs(data as ExtractorResponse);
   } catch (error) {
     console.error('Error extracting assets:', error);
     if (error instanceof Error) {
@@ -99,7 +200,7 @@ export async function fetchCachedResult(resultId: string): Promise<ExtractorResp
     }
     
     const data = await response.json();
-    return data as ExtractorResponse;
+    return hydrateAssetBlobs(data as ExtractorResponse);
   } catch (error) {
     console.error('Error fetching cached results:', error);
     if (error instanceof Error) {
@@ -109,13 +210,30 @@ export async function fetchCachedResult(resultId: string): Promise<ExtractorResp
   }
 }
 
+// Reconnections of a progress stream in a row before giving up
+const MAX_SSE_RECONNECTS = 3;
+
 export function extractFromUrlWithProgress(url: string, onProgress: ProgressCallback): () => void {
   const eventSource = new EventSource(`/api/extract/sse?url=${encodeURIComponent(url)}`);
+  let reconnects = 0;
+  const result = emptyResult(url);
   
   eventSource.onmessage = (event) => {
+    reconnects = 0;
     try {
       const data = JSON.parse(event.data);
-      onProgress(data);
+
+      if (data.event === 'asset_batch' || data.event === 'color_batch' || data.event === 'font_batch') {
+        addBatch(result, data as ItemBatchEvent);
+        return;
+      }
+
+      if (data.event === 'complete') {
+        // The batches carried the items, the complete event only what identifies them
+        result.colors.from_images.sort((a, b) => (b.percentage || 0) - (a.percentage || 0));
+        data.result = { ...result, ...data.summary, result_id: data.result_id };
+      }
+      onProgress({ ...data, found: countFound(result) });
       
       // Show error toast if the event indicates an error
       if (data.event === 'error') {
@@ -133,6 +251,12 @@ export function extractFromUrlWithProgress(url: string, onProgress: ProgressCall
   };
   
   eventSource.onerror = () => {
+    // The browser reconnects by itself, sending the ID of the last event it
+    // received, and the server resumes the stream after it
+    if (eventSource.readyState === EventSource.CONNECTING && reconnects++ < MAX_SSE_RECONNECTS) {
+      return;
+    }
+
     const errorMessage = 'Connection to the server was lost. Please try again.';
     onProgress({
       event: 'error',
@@ -11,6 +11,7 @@ const ExtractionProgress = ({ currentProgress }: ExtractionProgressProps) => {
   // Calculate overall progress percentage based on stage
   const getProgressPercentage = () => {
     const stages = [
+      'revalidating',
       'fetching_page',
       'loading_page',
       'page_loaded',
@@ -37,10 +38,16 @@ const ExtractionProgress = ({ currentProgress }: ExtractionProgressProps) => {
   
   const getStageLabel = () => {
     switch (currentProgress.stage) {
+      case 'revalidating':
+        return 'Checking whether the page changed...';
+      case 'page_unchanged':
+        return 'Page unchanged, reusing the previous results';
       case 'fetching_page':
         return 'Fetching webpage...';
       case 'loading_page':
         return `Loading page content (${currentProgress.data?.strategy || 'standard'})...`;
+      case 'resource_loaded':
+        return `Loading page content (${currentProgress.data?.total || 0} resources loaded)...`;
       case 'page_loaded':
         return 'Page loaded, analyzing...';
       case 'parsing_content':
@@ -103,6 +110,11 @@ const ExtractionProgress = ({ currentProgress }: ExtractionProgressProps) => {
           ></div>
         </div>
         <div className="progress-percentage">{progressPercent}%</div>
+        {currentProgress.found && (
+          <p className="progress-found">
+            Found so far: {currentProgress.found.colors} colors, {currentProgress.found.fonts} fonts, {currentProgress.found.assets} assets
+          </p>
+        )}
       </div>
     );
   }
@@ -4,7 +4,7 @@ import { Helmet } from 'react-helmet-async';
 import Navbar from '../components/Navbar';
 import ResultsDisplay from '../components/ResultsDisplay';
 import Footer from '../components/Footer';
-import { ExtractorResponse, fetchCachedResult } from '../api/extractorApi';
+import { ExtractorResponse, fetchCachedResult, hydrateAssetBlobs } from '../api/extractorApi';
 import './ResultsPage.css';
 
 const ResultsPage = () => {
@@ -15,19 +15,22 @@ const ResultsPage = () => {
   // Try to get results from navigation state first
   const passedResults = location.state?.results as ExtractorResponse | undefined;
   
-  const [results, setResults] = useState<ExtractorResponse | null>(passedResults || null);
-  const [loading, setLoading] = useState<boolean>(!passedResults);
+  const [results, setResults] = useState<ExtractorResponse | null>(null);
+  const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
   
   useEffect(() => {
-    // Skip API call if we already have results from navigation state
-    if (passedResults || !resultId) return;
+    if (!resultId) return;
     
     const fetchResults = async () => {
       try {
         setLoading(true);
         setError(null);
-        const data = await fetchCachedResult(resultId);
+        // Skip API call if we already have results from navigation state,
+        // those only need their asset references resolved
+        const data = passedResults
+          ? await hydrateAssetBlobs(passedResults)
+          : await fetchCachedResult(resultId);
         setResults(data);
         setLoading(false);
       } catch (err) {